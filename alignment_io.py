@@ -0,0 +1,398 @@
+#!/usr/bin/env python
+
+"""Open alignment and read files whether they are plain text, gzip,
+   BGZF-compressed or BAM, as an iterator of text lines
+   usage: python alignment_io.py alignments.bam > alignments.sam
+
+   Compressed input is decompressed by a read-ahead thread feeding the
+   parser through a bounded queue, so that decompression and parsing
+   overlap and the file is never decompressed to disk. BGZF blocks (as
+   written by bgzip and samtools) are decompressed by a pool of threads.
+   BAM records are decoded into SAM lines, header lines first, so the
+   scripts parsing SAM files read BAM files unchanged.
+"""
+
+import struct
+import sys
+import threading
+import zlib
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from Queue import Queue, Full
+
+import click
+
+
+GZIP_MAGIC = '\x1f\x8b'
+BAM_MAGIC = 'BAM\x01'
+
+# bytes of compressed input read at a time
+_READ_SIZE = 1 << 20
+# BGZF blocks (up to 64 KB each once decompressed) decompressed per batch
+_BGZF_BATCH_BLOCKS = 64
+# decompressed chunks waiting for the parser
+_READ_AHEAD_CHUNKS = 8
+
+_DEFAULT_THREADS = min(4, cpu_count())
+
+
+def input_format(fp):
+    """Detect the format of a file from its first bytes
+
+       Parameters:
+       -----------
+       fp : string
+          filepath
+
+       Returns:
+       --------
+       format : string
+          'text', 'gzip', 'bgzf' (BGZF-compressed text), 'bam' or
+          'raw_bam' (uncompressed BAM)
+    """
+    with open(fp, 'rb') as f:
+        magic = f.read(4)
+        if magic == BAM_MAGIC:
+            return 'raw_bam'
+        if not magic.startswith(GZIP_MAGIC):
+            return 'text'
+        f.seek(0)
+        try:
+            block = next(_bgzf_blocks(f), None)
+        except ValueError:
+            return 'gzip'
+    if block is None:
+        return 'gzip'
+    return 'bam' if _inflate_block(block).startswith(BAM_MAGIC) else 'bgzf'
+
+
+def open_input(fp, threads=None):
+    """Open a text, gzip, BGZF or BAM file for reading its lines
+
+       Parameters:
+       -----------
+       fp : string
+          filepath
+       threads : integer, optional
+          number of threads decompressing BGZF blocks (default: up to 4)
+
+       Returns:
+       --------
+       lines : file-like
+          iterator of lines ending with a newline, usable in a with
+          statement; BAM records are returned as SAM lines
+    """
+    file_format = input_format(fp)
+    if file_format == 'text':
+        return open(fp, 'U')
+    if threads is None:
+        threads = _DEFAULT_THREADS
+    f = open(fp, 'rb')
+    if file_format == 'gzip':
+        chunks = _gzip_chunks(f)
+    elif file_format == 'raw_bam':
+        chunks = iter(lambda: f.read(_READ_SIZE), '')
+    else:
+        chunks = _bgzf_chunks(f, threads)
+    return _Input(f, chunks, bam=file_format in ('bam', 'raw_bam'))
+
+
+def _gzip_chunks(f):
+    """Decompress a gzip file, including files of several gzip members"""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for data in iter(lambda: f.read(_READ_SIZE), ''):
+        while data:
+            chunk = decompressor.decompress(data)
+            if chunk:
+                yield chunk
+            # input past the end of a member starts the next one
+            data = decompressor.unused_data
+            if data:
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    chunk = decompressor.flush()
+    if chunk:
+        yield chunk
+
+
+def _bgzf_blocks(f):
+    """Yield the raw deflate data and decompressed size of each BGZF block"""
+    while True:
+        header = f.read(12)
+        if not header:
+            return
+        if len(header) < 12 or not header.startswith(GZIP_MAGIC) or \
+                not ord(header[3]) & 4:
+            raise ValueError("not a BGZF block at offset %d" %
+                             (f.tell() - len(header)))
+        extra_length = struct.unpack('<H', header[10:12])[0]
+        extra = f.read(extra_length)
+        block_size = None
+        i = 0
+        while i + 4 <= len(extra):
+            subfield_length = struct.unpack('<H', extra[i + 2:i + 4])[0]
+            if extra[i:i + 2] == 'BC' and subfield_length == 2:
+                block_size = struct.unpack('<H', extra[i + 4:i + 6])[0] + 1
+            i += 4 + subfield_length
+        if block_size is None:
+            raise ValueError("gzip member without a BGZF block size")
+        data = f.read(block_size - 12 - extra_length)
+        if len(data) != block_size - 12 - extra_length:
+            raise ValueError("truncated BGZF block")
+        # the last 8 bytes are the CRC32 and decompressed size
+        yield data[:-8], struct.unpack('<I', data[-4:])[0]
+
+
+def _inflate_block(block):
+    data, size = block
+    chunk = zlib.decompress(data, -zlib.MAX_WBITS)
+    if len(chunk) != size:
+        raise ValueError("corrupt BGZF block")
+    return chunk
+
+
+def _bgzf_chunks(f, threads):
+    """Decompress batches of BGZF blocks, in threads (zlib releases the GIL)"""
+    pool = ThreadPool(threads) if threads > 1 else None
+    inflate = pool.map if pool is not None else map
+    try:
+        batch = []
+        for block in _bgzf_blocks(f):
+            batch.append(block)
+            if len(batch) == _BGZF_BATCH_BLOCKS:
+                yield ''.join(inflate(_inflate_block, batch))
+                batch = []
+        if batch:
+            yield ''.join(inflate(_inflate_block, batch))
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+class _ReadAhead(object):
+    """Run an iterator of chunks in a thread, keeping at most
+       _READ_AHEAD_CHUNKS of its chunks ahead of the consumer
+    """
+
+    _END = object()
+
+    def __init__(self, chunks):
+        self._queue = Queue(maxsize=_READ_AHEAD_CHUNKS)
+        self._closed = False
+        self._thread = threading.Thread(target=self._fill, args=(chunks,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._closed:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def _fill(self, chunks):
+        try:
+            for chunk in chunks:
+                if not self._put(chunk):
+                    return
+        except Exception:
+            # raised again in the consumer thread
+            self._put(sys.exc_info())
+        else:
+            self._put(self._END)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is self._END:
+                return
+            if isinstance(item, tuple):
+                raise item[0], item[1], item[2]
+            yield item
+
+    def close(self):
+        self._closed = True
+        self._thread.join()
+
+
+class _Input(object):
+    """Lines of a decompressed file, or SAM lines of a BAM file"""
+
+    def __init__(self, f, chunks, bam=False):
+        self._f = f
+        self._read_ahead = _ReadAhead(chunks)
+        self._lines = _bam_lines(self._read_ahead) if bam else \
+            _split_lines(self._read_ahead)
+
+    def __iter__(self):
+        return self._lines
+
+    def next(self):
+        return next(self._lines)
+
+    def close(self):
+        self._read_ahead.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _split_lines(chunks):
+    pending = ''
+    for chunk in chunks:
+        lines = (pending + chunk).split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    if pending:
+        yield pending + '\n'
+
+
+# SAM strings of BAM CIGAR operations, sequence codes and tag value types
+_CIGAR_OPS = 'MIDNSHP=X'
+_SEQ_BASES = '=ACMGRSVTWYHKDBN'
+_SEQ_PAIRS = [a + b for a in _SEQ_BASES for b in _SEQ_BASES]
+_QUAL_TABLE = ''.join(chr((i + 33) % 256) for i in range(256))
+_TAG_INTEGERS = {'c': '<b', 'C': '<B', 's': '<h', 'S': '<H', 'i': '<i',
+                 'I': '<I'}
+
+
+def _bam_lines(chunks):
+    """Decode the header and records of BAM data into SAM lines"""
+    buf = ''
+    pos = 0
+    chunks = iter(chunks)
+
+    # read chunks until buf holds size bytes from pos
+    def fill(buf, pos, size):
+        while len(buf) - pos < size:
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise ValueError("truncated BAM data")
+            buf = buf[pos:] + chunk
+            pos = 0
+        return buf, pos
+
+    buf, pos = fill(buf, pos, 8)
+    if buf[pos:pos + 4] != BAM_MAGIC:
+        raise ValueError("not a BAM file")
+    text_length = struct.unpack_from('<i', buf, pos + 4)[0]
+    pos += 8
+    buf, pos = fill(buf, pos, text_length + 4)
+    text = buf[pos:pos + text_length].rstrip('\0')
+    for line in text.splitlines():
+        yield line + '\n'
+    pos += text_length
+    num_refs = struct.unpack_from('<i', buf, pos)[0]
+    pos += 4
+    refs = []
+    for i in xrange(num_refs):
+        buf, pos = fill(buf, pos, 4)
+        name_length = struct.unpack_from('<i', buf, pos)[0]
+        buf, pos = fill(buf, pos, name_length + 8)
+        refs.append(buf[pos + 4:pos + 3 + name_length])
+        pos += name_length + 8
+
+    while True:
+        if len(buf) - pos < 4:
+            chunk = next(chunks, None)
+            if chunk is None:
+                if len(buf) > pos:
+                    raise ValueError("truncated BAM record")
+                return
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        block_size = struct.unpack_from('<i', buf, pos)[0]
+        buf, pos = fill(buf, pos, block_size + 4)
+        yield _bam_record(buf, pos + 4, pos + 4 + block_size, refs)
+        pos += 4 + block_size
+
+
+def _bam_record(buf, start, end, refs):
+    """Decode the BAM record in buf[start:end] into a SAM line"""
+    (ref_id, position, name_length, mapq, _, num_cigar_ops, flag, seq_length,
+     next_ref_id, next_position, template_length) = \
+        struct.unpack_from('<iiBBHHHiiii', buf, start)
+    i = start + 32
+    read_id = buf[i:i + name_length - 1]
+    i += name_length
+    if num_cigar_ops:
+        cigar = ''.join('%d%s' % (op >> 4, _CIGAR_OPS[op & 0xf])
+                        for op in struct.unpack_from('<%dI' % num_cigar_ops,
+                                                     buf, i))
+    else:
+        cigar = '*'
+    i += 4 * num_cigar_ops
+    packed_length = (seq_length + 1) // 2
+    seq = ''.join([_SEQ_PAIRS[b] for b in
+                   bytearray(buf[i:i + packed_length])])[:seq_length] or '*'
+    i += packed_length
+    qual = buf[i:i + seq_length]
+    if not qual or qual[0] == '\xff':
+        qual = '*'
+    else:
+        qual = qual.translate(_QUAL_TABLE)
+    i += seq_length
+
+    fields = [read_id, str(flag),
+              refs[ref_id] if ref_id >= 0 else '*', str(position + 1),
+              str(mapq), cigar,
+              '*' if next_ref_id < 0 else
+              '=' if next_ref_id == ref_id else refs[next_ref_id],
+              str(next_position + 1), str(template_length), seq, qual]
+    while i < end:
+        tag, value_type = buf[i:i + 2], buf[i + 2]
+        i += 3
+        if value_type in _TAG_INTEGERS:
+            fmt = _TAG_INTEGERS[value_type]
+            fields.append('%s:i:%d' % (tag, struct.unpack_from(fmt, buf, i)[0]))
+            i += struct.calcsize(fmt)
+        elif value_type == 'A':
+            fields.append('%s:A:%s' % (tag, buf[i]))
+            i += 1
+        elif value_type == 'f':
+            fields.append('%s:f:%g' % (tag,
+                                       struct.unpack_from('<f', buf, i)[0]))
+            i += 4
+        elif value_type in 'ZH':
+            value_end = buf.index('\0', i)
+            fields.append('%s:%s:%s' % (tag, value_type, buf[i:value_end]))
+            i = value_end + 1
+        elif value_type == 'B':
+            subtype = buf[i]
+            count = struct.unpack_from('<i', buf, i + 1)[0]
+            fmt = '<%d%s' % (count, 'f' if subtype == 'f' else
+                             _TAG_INTEGERS[subtype][1])
+            values = struct.unpack_from(fmt, buf, i + 5)
+            fields.append('%s:B:%s' % (tag, ','.join(
+                [subtype] + ['%g' % v if subtype == 'f' else str(v)
+                             for v in values])))
+            i += 5 + struct.calcsize(fmt)
+        else:
+            raise ValueError("unknown BAM tag type %s" % value_type)
+    return '\t'.join(fields) + '\n'
+
+
+@click.command()
+@click.argument('input_fp', required=True,
+                type=click.Path(resolve_path=True, readable=True, exists=True,
+                                file_okay=True))
+@click.option('--threads', type=int, default=_DEFAULT_THREADS,
+              show_default=True,
+              help='number of threads decompressing BGZF blocks')
+def _main(input_fp, threads):
+    """
+    """
+    with open_input(input_fp, threads=threads) as input_f:
+        for line in input_f:
+            sys.stdout.write(line)
+
+
+if __name__ == "__main__":
+    _main()
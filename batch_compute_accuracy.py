@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+
+"""Compute the accuracy of many tools' alignments vs. one set of ground-truth
+   alignments, loading the ground truth once
+   usage: python batch_compute_accuracy.py ground_truth.blast tools.txt --total_reads N > accuracy.txt
+
+   Each line of tools.txt describes one run of a tool (tab-separated):
+      tool  parameters  observed_alns_fp  [sam,blast]  [extra columns]
+   The output has one row per line of tools.txt, in the layout read by
+   graph_accuracy.py: the tool and parameters, the results of
+   suppl_compute_accuracy.py and any extra columns (e.g. user and wall time).
+"""
+
+import sys
+from multiprocessing import Pool
+
+import click
+
+from offsets import parse_offsets
+from suppl_compute_accuracy import (collect_observed_alignments,
+                                    evaluate_alignments,
+                                    format_result,
+                                    load_ground_truth,
+                                    _cache_mode,
+                                    GROUND_TRUTH_CACHE_SUFFIX)
+
+
+# ground truth shared with the worker processes, which are forked after it is
+# loaded so its arrays are shared copy-on-write rather than pickled
+_expected_alns = None
+
+
+def parse_tools(tools_fp):
+    """Parses the list of tool runs to evaluate
+
+       Returns:
+       --------
+       tools : list
+          (tool, parameters, observed_alns_fp, file_format, extra columns)
+          tuples
+    """
+    tools = []
+    with open(tools_fp, 'U') as tools_f:
+        for line in tools_f:
+            if not line.strip() or line.startswith('#'):
+                continue
+            line = line.rstrip('\n').split('\t')
+            if len(line) < 4:
+                raise ValueError("expected tool, parameters, observed "
+                                 "alignments and format: %s" % line)
+            tool, parameters, observed_alns_fp, file_format = line[:4]
+            if file_format not in ["sam", "blast"]:
+                raise ValueError("%s is not supported" % file_format)
+            tools.append((tool, parameters, observed_alns_fp, file_format,
+                          line[4:]))
+    return tools
+
+
+def evaluate_run(observed_alns_fp, file_format, total_reads, offsets):
+    """Evaluate the alignments of one tool run against the shared ground
+       truth and return its results as formatted by format_result
+    """
+    observed_alns = collect_observed_alignments(
+        observed_alns_fp=observed_alns_fp, file_format=file_format)
+    result = evaluate_alignments(expected_alns=_expected_alns,
+                                 observed_alns=observed_alns,
+                                 file_format=file_format,
+                                 offsets=offsets)
+    return format_result(result[0], total_reads, *result[1:])
+
+
+def evaluate_tool(tool_run, total_reads, offsets):
+    """Evaluate the alignments of one tool run against the shared ground
+       truth and return its row of the accuracy table
+    """
+    tool, parameters, observed_alns_fp, file_format, extra = tool_run
+    return "%s\t%s\t%s%s\n" % (tool, parameters,
+                               evaluate_run(observed_alns_fp, file_format,
+                                            total_reads, offsets),
+                               "\t".join(extra))
+
+
+def _evaluate_tool_star(args):
+    return evaluate_tool(*args)
+
+
+def _evaluate_run_star(args):
+    return evaluate_run(*args)
+
+
+def batch_compute_accuracy(expected_alns_fp, tools, total_reads,
+                           offsets=(0, 5, 10), processes=1, cache="auto"):
+    """Evaluate tool runs against one ground truth in parallel processes
+
+       Parameters:
+       -----------
+       expected_alns_fp : string
+          filepath of ground-truth BLAST alignments
+       tools : list
+          tool runs, as returned by parse_tools
+       total_reads : integer
+          total number of sequences aligned by each tool
+       offsets : list, optional
+          offsets to compute the accuracy score for
+       processes : integer, optional
+          number of worker processes
+       cache : string, optional
+          cache mode of the ground truth (see load_ground_truth)
+
+       Yields:
+       -------
+       row : string
+          row of the accuracy table for each tool run, in order
+    """
+    tasks = [(tool_run, total_reads, list(offsets)) for tool_run in tools]
+    return _evaluate(expected_alns_fp, _evaluate_tool_star, tasks, processes,
+                     cache)
+
+
+def batch_evaluate_runs(expected_alns_fp, runs, offsets=(0, 5, 10),
+                        processes=1, cache="auto"):
+    """Evaluate runs of tools against one ground truth in parallel
+       processes, as batch_compute_accuracy
+
+       Parameters:
+       -----------
+       runs : list
+          (observed_alns_fp, file_format, total_reads) of each run
+
+       Yields:
+       -------
+       result : string
+          results of each run as formatted by format_result, in order
+    """
+    tasks = [(observed_alns_fp, file_format, total_reads, list(offsets))
+             for observed_alns_fp, file_format, total_reads in runs]
+    return _evaluate(expected_alns_fp, _evaluate_run_star, tasks, processes,
+                     cache)
+
+
+def _evaluate(expected_alns_fp, function, tasks, processes, cache):
+    """Load the ground truth once and map function over tasks, in worker
+       processes forked after it is loaded when processes > 1
+    """
+    global _expected_alns
+    _expected_alns = load_ground_truth(expected_alns_fp, cache=cache)
+    # the read codec is built once, before the worker processes are forked
+    _expected_alns.read_codec
+    try:
+        if processes == 1:
+            for task in tasks:
+                yield function(task)
+        else:
+            pool = Pool(processes)
+            try:
+                for result in pool.imap(function, tasks):
+                    yield result
+            finally:
+                pool.terminate()
+    finally:
+        _expected_alns = None
+
+
+@click.command()
+@click.argument('expected_alns_fp', required=True,
+                type=click.Path(resolve_path=True, readable=True, exists=True,
+                                file_okay=True))
+@click.argument('tools_fp', required=True,
+                type=click.Path(resolve_path=True, readable=True, exists=True,
+                                file_okay=True))
+@click.option('--total_reads', type=int, required=True,
+              help='total number of sequences used in alignment by each tool')
+@click.option('--offsets', type=str, default='0,5,10', show_default=True,
+              help='comma-separated offsets (or ranges, e.g. 0-50) to output '
+                   'one accuracy column each')
+@click.option('--processes', type=int, default=1, show_default=True,
+              help='number of tools evaluated in parallel')
+@click.option('--no_cache', is_flag=True, default=False, show_default=True,
+              help='parse expected_alns_fp without reading or writing its '
+                   'binary cache (%s)' % GROUND_TRUTH_CACHE_SUFFIX)
+@click.option('--rebuild_cache', is_flag=True, default=False, show_default=True,
+              help='parse expected_alns_fp and overwrite its binary cache')
+def _main(expected_alns_fp, tools_fp, total_reads, offsets, processes,
+          no_cache, rebuild_cache):
+    """
+    """
+    tools = parse_tools(tools_fp)
+    for row in batch_compute_accuracy(expected_alns_fp=expected_alns_fp,
+                                      tools=tools,
+                                      total_reads=total_reads,
+                                      offsets=parse_offsets(offsets),
+                                      processes=processes,
+                                      cache=_cache_mode(no_cache,
+                                                        rebuild_cache)):
+        sys.stdout.write(row)
+
+
+if __name__ == "__main__":
+    _main()
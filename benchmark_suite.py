@@ -0,0 +1,856 @@
+#!/usr/bin/env python
+
+"""Benchmarks for the alignment evaluation scripts on synthetic data
+   usage: python benchmark_suite.py ground_truth_memory --num_reads 1000000
+          python benchmark_suite.py startup
+          python benchmark_suite.py suite --num_reads 10000 --num_reads 1000000
+                 --output_fp results.json [--baseline_fp previous.json]
+
+   The suite command times each stage of the evaluation (see SUITE_STAGES)
+   on datasets of write_dataset of every size, each stage in a fresh
+   interpreter so that its peak memory is its own. Results are written as
+   JSON with the parameters and environment of the run; a previous result
+   file given as a baseline adds the speedup and memory ratio of each stage.
+"""
+
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime
+from multiprocessing import cpu_count
+from os.path import abspath, dirname, exists, join
+from tempfile import mkdtemp
+
+import click
+
+from simulate_alignments import (DATASET_FILES, write_dataset,
+                                 write_ground_truth, write_reads, write_sam)
+
+
+def _collect_ground_truth_dict(ground_truth_alns_fp):
+    """Reference loader keeping each BLAST line as a list of strings in a
+       dictionary (the layout used before the columnar GroundTruth store)
+    """
+    expected_alns = {}
+    with open(ground_truth_alns_fp, 'U') as ground_truth_alns:
+        for line in ground_truth_alns:
+            line = line.strip().split()
+            read_id = line[0]
+            if read_id in expected_alns:
+                expected_alns[read_id].append(line[1:])
+            else:
+                expected_alns[read_id] = [line[1:]]
+    for read in expected_alns:
+        expected_alns[read].sort(key=lambda x: float(x[10]), reverse=True)
+    return expected_alns
+
+
+def _collect_sam_inline(sam_fp):
+    """Reference SAM parser of compare_two_sam_files_AS.py before the shared
+       sam_parser module (several splits per line, CIGAR regex per line)
+    """
+    import re
+    mapping = {}
+    with open(sam_fp, 'U') as sam_f:
+        for line in sam_f:
+            if line.startswith('@'):
+                continue
+            name = line.split()[0]
+            sw_score = line.split()[11].split(':')[2]
+            contig = line.split('\t')[2]
+            if contig == "*":
+                continue
+            orig_begin = int(line.split('\t')[3])
+            cigar = line.split('\t')[5]
+            pattern = re.compile('([MIDNSHPX=])')
+            values = pattern.split(cigar)[:-1]
+            paired = (values[n:n+2] for n in xrange(0, len(values), 2))
+            align_len = 0
+            num_indel = 0
+            for pair in paired:
+                l = int(pair[0])
+                t = pair[1]
+                if (t == 'M'):
+                    align_len += l
+                elif (t == 'I'):
+                    align_len += l
+                    num_indel += 1
+                elif (t == 'D'):
+                    num_indel += 1
+            mapping[name] = [contig, orig_begin, cigar, align_len, num_indel,
+                             sw_score]
+    return mapping
+
+
+def _collect_sam_records(sam_fp):
+    from sam_parser import parse_sam
+    mapping = {}
+    with open(sam_fp, 'U') as sam_f:
+        for record in parse_sam(sam_f, aligned_only=True):
+            mapping[record.read_id] = [record.contig, record.position,
+                                       record.cigar, record.align_len,
+                                       record.num_indel,
+                                       record.alignment_score]
+    return mapping
+
+
+def _alignment_stats_loop(sam_fp, expected_mapping, min_score):
+    """Reference per-read loop of compute_stats_unique_alignments.py before
+       its statistics were computed with array reductions
+    """
+    from sam_parser import parse_sam
+    s1_mapping = {}
+    with open(sam_fp, 'U') as sam_f:
+        for record in parse_sam(sam_f, aligned_only=True):
+            name = record.read_id
+            if name not in expected_mapping:
+                continue
+            s1_mapping[name] = [record.contig, record.cigar, record.align_len,
+                                record.num_indel, record.alignment_score]
+    total_indels = 0
+    total_coverage = 0
+    total_amb_nt = 0
+    total_sw_score = 0
+    total_read_length = 0
+    low_coverage = 1.0
+    high_coverage = 0.0
+    num_alignments_with_min_score = 0
+    for read in s1_mapping:
+        total_indels += s1_mapping[read][3]
+        coverage = float(float(s1_mapping[read][2]) /
+                         float(expected_mapping[read][0]))
+        total_coverage += coverage
+        if coverage < low_coverage:
+            low_coverage = coverage
+        elif coverage > high_coverage:
+            high_coverage = coverage
+        total_amb_nt += expected_mapping[read][1]
+        total_sw_score += s1_mapping[read][4]
+        total_read_length += expected_mapping[read][0]
+        if int(s1_mapping[read][4]) >= int(min_score):
+            num_alignments_with_min_score += 1
+    return (len(s1_mapping), total_indels, total_coverage, low_coverage,
+            high_coverage, total_amb_nt, total_sw_score, total_read_length,
+            num_alignments_with_min_score)
+
+
+def _alignment_stats_arrays(sam_fp, expected_mapping, min_score):
+    from compute_stats_unique_alignments import (alignment_stats,
+                                                 collect_alignments)
+    return alignment_stats(collect_alignments(sam_fp, expected_mapping,
+                                              'tool'), min_score)
+
+
+def _origins_dict(ground_truth_fp):
+    """Reference ground truth of filter_better_hits.py (454 reads) before
+       the streaming engine, a dictionary of [contig, start] lists
+    """
+    from sam_parser import parse_sam
+    expected_mapping = {}
+    with open(ground_truth_fp, 'U') as ground_truth:
+        for record in parse_sam(ground_truth):
+            expected_mapping[record.read_id] = [record.contig,
+                                                record.fields[3]]
+    return expected_mapping
+
+
+def _filter_better_hits_dict(expected_mapping, blast_alignments_fp):
+    """Reference filter of filter_better_hits.py before the streaming
+       engine, on the ground truth of _origins_dict
+    """
+    filtered = []
+    written = False
+    blast_hits = {}
+    with open(blast_alignments_fp, 'U') as blast_alignments:
+        for line in blast_alignments:
+            alignment = line.strip().split('\t')
+            if alignment[0] in blast_hits:
+                if (blast_hits[alignment[0]][10] == alignment[11] and
+                        not written):
+                    filtered.append(alignment[0])
+                    written = True
+            else:
+                blast_hits.clear()
+                blast_hits[alignment[0]] = alignment[1:]
+                written = False
+                if (alignment[1] != expected_mapping[alignment[0]][0] and
+                        alignment[8] != expected_mapping[alignment[0]][1]):
+                    filtered.append(alignment[0])
+                    written = True
+    return filtered
+
+
+def _origins_streaming(ground_truth_fp):
+    from filter_better_hits import collect_origins
+    return collect_origins('454', ground_truth_fp)
+
+
+def _filter_better_hits_streaming(origins, blast_alignments_fp):
+    from filter_better_hits import filter_better_hits
+    with open(blast_alignments_fp, 'U') as blast_alignments:
+        return list(filter_better_hits(origins, blast_alignments))
+
+
+# stages timed by the suite command, in order
+SUITE_STAGES = ['collect_ground_truth', 'collect_observed_alignments',
+                'compute_accuracy', 'compute_precision',
+                'compare_two_sam_files', 'filter_better_hits']
+# version of the layout of the suite results
+_SUITE_VERSION = 1
+
+
+def _time_stage(stage, dataset, offset):
+    """Run a stage of the suite on a dataset (filepaths keyed as
+       DATASET_FILES), return the seconds of the stage itself, not of
+       loading its inputs
+    """
+    import suppl_compute_accuracy as accuracy
+    if stage == 'collect_ground_truth':
+        start = time.time()
+        accuracy.collect_ground_truth(dataset['ground_truth'])
+        return time.time() - start
+    if stage == 'collect_observed_alignments':
+        start = time.time()
+        accuracy.collect_observed_alignments(dataset['observed_sam'])
+        return time.time() - start
+    if stage in ('compute_accuracy', 'compute_precision'):
+        expected_alns = accuracy.collect_ground_truth(dataset['ground_truth'])
+        observed_alns = accuracy.collect_observed_alignments(
+            dataset['observed_sam'])
+        start = time.time()
+        if stage == 'compute_accuracy':
+            accuracy.compute_accuracy(expected_alns, observed_alns,
+                                      offset=offset)
+        else:
+            accuracy.compute_precision(expected_alns, observed_alns)
+        return time.time() - start
+    if stage == 'compare_two_sam_files':
+        from compare_two_sam_files_AS import _main as compare_main
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        start = time.time()
+        try:
+            compare_main.main(['tool1', 'tool2', dataset['reads'],
+                               dataset['observed_sam'],
+                               dataset['observed_sam_2'], str(offset)],
+                              standalone_mode=False)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        return time.time() - start
+    if stage == 'filter_better_hits':
+        from filter_better_hits import collect_origins, filter_better_hits
+        start = time.time()
+        origins = collect_origins('454', dataset['origins'])
+        with open(dataset['ssearch'], 'U') as blast_alignments:
+            for read_id in filter_better_hits(origins, blast_alignments):
+                pass
+        return time.time() - start
+    raise ValueError("unknown stage %s" % stage)
+
+
+def _dataset_paths(dataset_dir):
+    return dict((name, join(dataset_dir, file_name))
+                for name, file_name in DATASET_FILES.iteritems())
+
+
+def _suite_dataset(data_dir, num_reads, parameters):
+    """Directory of the dataset of num_reads reads for the parameters,
+       written unless an earlier run left it in data_dir
+    """
+    dataset_dir = join(data_dir, 'reads_%d' % num_reads)
+    parameters_fp = join(dataset_dir, 'parameters.json')
+    dataset_parameters = dict(parameters, num_reads=num_reads)
+    if exists(parameters_fp):
+        with open(parameters_fp) as parameters_f:
+            if json.load(parameters_f) == dataset_parameters:
+                return dataset_dir
+    write_dataset(dataset_dir, num_reads=num_reads, **parameters)
+    with open(parameters_fp, 'w') as parameters_f:
+        json.dump(dataset_parameters, parameters_f, sort_keys=True)
+    return dataset_dir
+
+
+def _environment():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=dirname(abspath(__file__)),
+            stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import numpy
+    return {'date': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'commit': commit,
+            'python': platform.python_version(),
+            'numpy': numpy.__version__,
+            'platform': platform.platform(),
+            'cpu_count': cpu_count()}
+
+
+def _compare_to_baseline(report, baseline):
+    """Add the baseline seconds and peak memory of each stage to the results
+       of a report, with the speedup and memory ratio
+    """
+    if baseline.get('parameters') != report['parameters']:
+        raise ValueError("baseline parameters %s differ from %s" %
+                         (baseline.get('parameters'), report['parameters']))
+    previous = dict(((result['stage'], result['num_reads']), result)
+                    for result in baseline['results'])
+    for result in report['results']:
+        base = previous.get((result['stage'], result['num_reads']))
+        if base is None:
+            continue
+        result['baseline_seconds'] = base['seconds']
+        result['baseline_peak_rss_mb'] = base['peak_rss_mb']
+        result['speedup'] = round(base['seconds'] / result['seconds'], 3) \
+            if result['seconds'] else None
+        result['memory_ratio'] = round(result['peak_rss_mb'] /
+                                       base['peak_rss_mb'], 3)
+    report['baseline'] = baseline['environment']
+
+
+def _ground_truth_loaders():
+    from suppl_compute_accuracy import collect_ground_truth, load_ground_truth
+    return {'dict': _collect_ground_truth_dict,
+            'columnar': collect_ground_truth,
+            'cache_cold': lambda fp: load_ground_truth(fp, cache="rebuild"),
+            'cache_warm': lambda fp: load_ground_truth(fp, cache="auto")}
+
+
+def _peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _run_isolated(*args):
+    """Run a command of this script in a fresh interpreter so that its peak
+       memory is not shared with other measurements, return its JSON result
+    """
+    output = subprocess.check_output([sys.executable, abspath(__file__)] +
+                                     [str(arg) for arg in args])
+    return json.loads(output)
+
+
+@click.group()
+def cli():
+    """
+    """
+    pass
+
+
+@cli.command(name='measure_load')
+@click.argument('loader', type=click.Choice(['dict', 'columnar', 'cache_cold',
+                                            'cache_warm']))
+@click.argument('ground_truth_fp', type=click.Path(exists=True))
+def measure_load(loader, ground_truth_fp):
+    """Load a ground-truth file and print load time and peak RSS (internal)
+    """
+    baseline_mb = _peak_rss_mb()
+    start = time.time()
+    expected_alns = _ground_truth_loaders()[loader](ground_truth_fp)
+    seconds = time.time() - start
+    # a cached store builds its read index on the first lookup
+    start = time.time()
+    'seq.000000000' in expected_alns
+    lookup_seconds = time.time() - start
+    sys.stdout.write(json.dumps({'loader': loader,
+                                 'reads': len(expected_alns),
+                                 'seconds': round(seconds, 3),
+                                 'first_lookup_seconds': round(lookup_seconds, 3),
+                                 'baseline_rss_mb': round(baseline_mb, 1),
+                                 'peak_rss_mb': round(_peak_rss_mb(), 1)}))
+
+
+@cli.command(name='ground_truth_memory')
+@click.option('--num_reads', type=int, default=1000000, show_default=True,
+              help='number of synthetic reads')
+@click.option('--hits_per_read', type=int, default=5, show_default=True,
+              help='number of ground-truth alignments per read')
+def ground_truth_memory(num_reads, hits_per_read):
+    """Compare load time and peak memory of the dictionary and columnar
+       ground-truth layouts
+    """
+    working_dir = mkdtemp(prefix='benchmark_')
+    try:
+        ground_truth_fp = join(working_dir, 'ground_truth.blast')
+        write_ground_truth(ground_truth_fp, num_reads=num_reads,
+                           hits_per_read=hits_per_read)
+        for loader in ['dict', 'columnar']:
+            result = _run_isolated('measure_load', loader, ground_truth_fp)
+            result['hits_per_read'] = hits_per_read
+            sys.stdout.write("%s\n" % json.dumps(result, sort_keys=True))
+    finally:
+        shutil.rmtree(working_dir)
+
+
+@cli.command(name='hit_multiplicity')
+@click.option('--num_alignments', type=int, default=500000, show_default=True,
+              help='number of ground-truth alignments, split into reads')
+@click.option('--offset', type=int, default=10, show_default=True,
+              help='maximum distance between expected and observed positions')
+def hit_multiplicity(num_alignments, offset):
+    """Time compute_accuracy per read as the number of expected alignments
+       per read grows, with the position index and with a linear scan
+    """
+    import random
+    import suppl_compute_accuracy
+
+    index_min_alignments = suppl_compute_accuracy._INDEX_MIN_ALIGNMENTS
+    working_dir = mkdtemp(prefix='benchmark_')
+    try:
+        ground_truth_fp = join(working_dir, 'ground_truth.blast')
+        for hits_per_read in [5, 50, 500, 5000]:
+            num_reads = max(num_alignments // hits_per_read, 1)
+            write_ground_truth(ground_truth_fp, num_reads=num_reads,
+                               hits_per_read=hits_per_read)
+            expected_alns = suppl_compute_accuracy.collect_ground_truth(
+                ground_truth_fp)
+            # observed alignments a few nucleotides off a random expected one
+            rand = random.Random(0)
+            observed_alns = {}
+            for read_id in expected_alns:
+                alignments = expected_alns.alignments(read_id)
+                contig, start, end, bitscore = rand.choice(alignments)
+                observed_alns[read_id] = ['0', contig, str(start + 3), '255']
+            # build the position index outside of the timed runs
+            start = time.time()
+            expected_alns.position_index()
+            index_seconds = time.time() - start
+            for search in ['index', 'scan']:
+                if search == 'scan':
+                    suppl_compute_accuracy._INDEX_MIN_ALIGNMENTS = sys.maxint
+                start = time.time()
+                accuracy = suppl_compute_accuracy.compute_accuracy(
+                    expected_alns, observed_alns, offset=offset)
+                seconds = time.time() - start
+                suppl_compute_accuracy._INDEX_MIN_ALIGNMENTS = \
+                    index_min_alignments
+                sys.stdout.write("%s\n" % json.dumps(
+                    {'hits_per_read': hits_per_read,
+                     'reads': num_reads,
+                     'search': search,
+                     'index_build_seconds': round(index_seconds, 3),
+                     'accuracy': round(accuracy, 3),
+                     'seconds': round(seconds, 3),
+                     'us_per_read': round(seconds / num_reads * 1e6, 1)},
+                    sort_keys=True))
+    finally:
+        shutil.rmtree(working_dir)
+
+
+@cli.command(name='ground_truth_cache')
+@click.option('--num_reads', type=int, default=1000000, show_default=True,
+              help='number of synthetic reads')
+@click.option('--hits_per_read', type=int, default=5, show_default=True,
+              help='number of ground-truth alignments per read')
+def ground_truth_cache(num_reads, hits_per_read):
+    """Compare loading the ground truth while writing its binary cache (cold)
+       and from the cache (warm)
+    """
+    working_dir = mkdtemp(prefix='benchmark_')
+    try:
+        ground_truth_fp = join(working_dir, 'ground_truth.blast')
+        write_ground_truth(ground_truth_fp, num_reads=num_reads,
+                           hits_per_read=hits_per_read)
+        for loader in ['cache_cold', 'cache_warm']:
+            result = _run_isolated('measure_load', loader, ground_truth_fp)
+            result['hits_per_read'] = hits_per_read
+            sys.stdout.write("%s\n" % json.dumps(result, sort_keys=True))
+    finally:
+        shutil.rmtree(working_dir)
+
+
+@cli.command(name='sam_parsing')
+@click.option('--num_reads', type=int, default=1000000, show_default=True,
+              help='number of synthetic SAM alignments')
+def sam_parsing(num_reads):
+    """Compare the inline SAM parsing loop formerly in the SAM scripts with
+       the shared sam_parser records
+    """
+    working_dir = mkdtemp(prefix='benchmark_')
+    try:
+        sam_fp = join(working_dir, 'alignments.sam')
+        write_sam(sam_fp, num_reads=num_reads)
+        for parser, collect in [('inline', _collect_sam_inline),
+                                ('sam_parser', _collect_sam_records)]:
+            start = time.time()
+            mapping = collect(sam_fp)
+            seconds = time.time() - start
+            sys.stdout.write("%s\n" % json.dumps(
+                {'parser': parser,
+                 'reads': num_reads,
+                 'aligned': len(mapping),
+                 'seconds': round(seconds, 3),
+                 'us_per_line': round(seconds / num_reads * 1e6, 2)},
+                sort_keys=True))
+    finally:
+        shutil.rmtree(working_dir)
+
+
+@cli.command(name='alignment_stats')
+@click.option('--num_reads', type=int, default=1000000, show_default=True,
+              help='number of synthetic reads and SAM alignments')
+@click.option('--min_score', type=int, default=250, show_default=True,
+              help='minimum SW score counted')
+def alignment_stats(num_reads, min_score):
+    """Compare the per-read loop of compute_stats_unique_alignments.py with
+       its array reductions, from the SAM file to the summary
+    """
+    from compute_stats_unique_alignments import collect_reads
+    working_dir = mkdtemp(prefix='benchmark_')
+    try:
+        sam_fp = join(working_dir, 'alignments.sam')
+        reads_fp = join(working_dir, 'reads.fasta')
+        write_sam(sam_fp, num_reads=num_reads)
+        write_reads(reads_fp, num_reads=num_reads)
+        expected_mapping = collect_reads(reads_fp)
+        results = []
+        for method, stats in [('loop', _alignment_stats_loop),
+                              ('arrays', _alignment_stats_arrays)]:
+            start = time.time()
+            results.append(stats(sam_fp, expected_mapping, min_score))
+            seconds = time.time() - start
+            sys.stdout.write("%s\n" % json.dumps(
+                {'method': method,
+                 'reads': num_reads,
+                 'seconds': round(seconds, 3),
+                 'records_per_second': int(num_reads / seconds)},
+                sort_keys=True))
+        if results[0] != results[1]:
+            raise ValueError("statistics differ: %s != %s" % tuple(results))
+    finally:
+        shutil.rmtree(working_dir)
+
+
+@cli.command(name='compare_inputs')
+@click.option('--num_reads', type=int, default=1000000, show_default=True,
+              help='number of synthetic reads and SAM alignments per tool')
+def compare_inputs(num_reads):
+    """Time parsing the reads and two SAM files of compare_two_sam_files_AS.py
+       one after another and concurrently
+    """
+    from multiprocessing import cpu_count
+    from compare_two_sam_files_AS import collect_inputs
+    working_dir = mkdtemp(prefix='benchmark_')
+    try:
+        reads_fp = join(working_dir, 'reads.fasta')
+        sam_fps = [join(working_dir, 'tool%d.sam' % i) for i in (1, 2)]
+        write_reads(reads_fp, num_reads=num_reads)
+        for seed, sam_fp in enumerate(sam_fps):
+            write_sam(sam_fp, num_reads=num_reads, seed=seed)
+        for processes in [1, 3]:
+            start = time.time()
+            tables = list(collect_inputs(reads_fp, sam_fps[0], sam_fps[1],
+                                         'tool1', 'tool2',
+                                         processes=processes))
+            seconds = time.time() - start
+            sys.stdout.write("%s\n" % json.dumps(
+                {'processes': processes,
+                 'cpus': cpu_count(),
+                 'reads': num_reads,
+                 'aligned': [len(table) for table in tables[1:]],
+                 'seconds': round(seconds, 3)},
+                sort_keys=True))
+    finally:
+        shutil.rmtree(working_dir)
+
+
+@cli.command(name='read_lengths')
+@click.option('--num_reads', type=int, default=1000000, show_default=True,
+              help='number of synthetic reads')
+def read_lengths(num_reads):
+    """Compare parsing a reads FASTA file for lengths and N counts with
+       building and reading its index
+    """
+    from skbio.parse.sequences import parse_fasta
+    from fasta_index import build_fasta_index, load_fasta_index
+
+    def parse(reads_fp):
+        with open(reads_fp, 'U') as reads_f:
+            return [(label.split()[0], len(seq), seq.count('N'))
+                    for label, seq in parse_fasta(reads_f)]
+
+    working_dir = mkdtemp(prefix='benchmark_')
+    try:
+        reads_fp = join(working_dir, 'reads.fasta')
+        write_reads(reads_fp, num_reads=num_reads)
+        for method, lengths in [
+                ('parse_fasta', parse),
+                ('build_index', build_fasta_index),
+                ('write_index', lambda fp: load_fasta_index(fp, rebuild=True)),
+                ('read_index', load_fasta_index)]:
+            start = time.time()
+            lengths(reads_fp)
+            seconds = time.time() - start
+            sys.stdout.write("%s\n" % json.dumps(
+                {'method': method,
+                 'reads': num_reads,
+                 'seconds': round(seconds, 3)},
+                sort_keys=True))
+    finally:
+        shutil.rmtree(working_dir)
+
+
+@cli.command(name='measure_better_hits')
+@click.argument('method', type=click.Choice(['dict', 'streaming']))
+@click.argument('ground_truth_fp', type=click.Path(exists=True))
+@click.argument('blast_alignments_fp', type=click.Path(exists=True))
+def measure_better_hits(method, ground_truth_fp, blast_alignments_fp):
+    """Filter better hits and print time and peak RSS of loading the ground
+       truth and of the whole run (internal)
+    """
+    filters = {'dict': (_origins_dict, _filter_better_hits_dict),
+               'streaming': (_origins_streaming,
+                             _filter_better_hits_streaming)}
+    load, filter_hits = filters[method]
+    baseline_mb = _peak_rss_mb()
+    start = time.time()
+    origins = load(ground_truth_fp)
+    load_seconds = time.time() - start
+    load_peak_mb = _peak_rss_mb()
+    filtered = filter_hits(origins, blast_alignments_fp)
+    seconds = time.time() - start
+    sys.stdout.write(json.dumps({'method': method,
+                                 'filtered': len(filtered),
+                                 'seconds': round(seconds, 3),
+                                 'load_seconds': round(load_seconds, 3),
+                                 'baseline_rss_mb': round(baseline_mb, 1),
+                                 'load_peak_rss_mb': round(load_peak_mb, 1),
+                                 'peak_rss_mb': round(_peak_rss_mb(), 1)}))
+
+
+@cli.command(name='better_hits')
+@click.option('--num_reads', type=int, default=1000000, show_default=True,
+              help='number of synthetic reads')
+@click.option('--hits_per_read', type=int, multiple=True, default=[5, 20],
+              show_default=True,
+              help='number of SSEARCH alignments per read (repeatable)')
+def better_hits(num_reads, hits_per_read):
+    """Compare time and peak memory of filter_better_hits.py with the
+       dictionary ground truth and the streaming engine, as the number of
+       SSEARCH alignments grows
+    """
+    working_dir = mkdtemp(prefix='benchmark_')
+    try:
+        ground_truth_fp = join(working_dir, 'reads.sam')
+        write_sam(ground_truth_fp, num_reads=num_reads)
+        for hits in hits_per_read:
+            blast_alignments_fp = join(working_dir, 'ssearch.m8')
+            write_ground_truth(blast_alignments_fp, num_reads=num_reads,
+                               hits_per_read=hits)
+            for method in ['dict', 'streaming']:
+                result = _run_isolated('measure_better_hits', method,
+                                       ground_truth_fp, blast_alignments_fp)
+                result['hits_per_read'] = hits
+                sys.stdout.write("%s\n" % json.dumps(result, sort_keys=True))
+    finally:
+        shutil.rmtree(working_dir)
+
+
+def _numbered_read_ids(numbers):
+    """Read ids seq.000000000 of an array of read numbers as a NumPy string
+       array, as read from a ground-truth cache
+    """
+    import numpy as np
+    chars = np.empty((len(numbers), 13), dtype=np.uint8)
+    chars[:, :4] = np.frombuffer(b'seq.', dtype=np.uint8)
+    for column in range(12, 3, -1):
+        chars[:, column] = numbers % 10 + ord('0')
+        numbers = numbers // 10
+    return chars.view('S13').ravel()
+
+
+@cli.command(name='measure_precision')
+@click.argument('method', type=click.Choice(['strings', 'codes']))
+@click.argument('num_reads', type=int)
+def measure_precision(method, num_reads):
+    """Count the true positives of observed read ids against ground-truth
+       read ids and print time and peak RSS (internal)
+    """
+    import numpy as np
+    from itertools import izip
+    from read_ids import ReadIdCodec
+
+    # 90% of the reads are observed, with 5% more reads unknown to the
+    # ground truth, in random order
+    expected_ids = _numbered_read_ids(np.arange(num_reads, dtype=np.int64))
+    observed = np.random.RandomState(0).permutation(
+        int(num_reads * 1.05))[:int(num_reads * 0.95)]
+    observed_ids = _numbered_read_ids(observed)
+    del observed
+    baseline_mb = _peak_rss_mb()
+
+    start = time.time()
+    if method == 'strings':
+        read_index = dict(izip(expected_ids.tolist(), xrange(num_reads)))
+    else:
+        read_codec = ReadIdCodec(expected_ids)
+    build_seconds = time.time() - start
+    start = time.time()
+    if method == 'strings':
+        tp = sum(1 for read_id in observed_ids.tolist()
+                 if read_id in read_index)
+    else:
+        tp = int(np.count_nonzero(read_codec.encode(observed_ids) >= 0))
+    seconds = time.time() - start
+    sys.stdout.write(json.dumps({'method': method,
+                                 'reads': num_reads,
+                                 'tp': tp,
+                                 'build_seconds': round(build_seconds, 3),
+                                 'seconds': round(seconds, 3),
+                                 'baseline_rss_mb': round(baseline_mb, 1),
+                                 'peak_rss_mb': round(_peak_rss_mb(), 1)}))
+
+
+@cli.command(name='read_id_codes')
+@click.option('--num_reads', type=int, multiple=True,
+              default=[1000000, 10000000, 100000000], show_default=True,
+              help='number of ground-truth reads (repeatable)')
+@click.option('--method', type=click.Choice(['strings', 'codes']),
+              multiple=True, default=['strings', 'codes'], show_default=True,
+              help='read index of the ground truth (repeatable)')
+def read_id_codes(num_reads, method):
+    """Compare time and peak memory of the true positives of
+       compute_precision with a dictionary of read ids (strings) and with
+       the int32 codes of a ReadIdCodec (codes)
+    """
+    for reads in num_reads:
+        for name in method:
+            result = _run_isolated('measure_precision', name, reads)
+            sys.stdout.write("%s\n" % json.dumps(result, sort_keys=True))
+
+
+@cli.command(name='measure_stage')
+@click.argument('stage', type=click.Choice(SUITE_STAGES))
+@click.argument('dataset_dir', type=click.Path(exists=True))
+@click.argument('offset', type=int)
+@click.argument('repeat', type=int)
+def measure_stage(stage, dataset_dir, offset, repeat):
+    """Time a stage of the suite and print its fastest time and peak RSS
+       (internal)
+    """
+    dataset = _dataset_paths(dataset_dir)
+    seconds = min(_time_stage(stage, dataset, offset)
+                  for run in xrange(repeat))
+    sys.stdout.write(json.dumps({'stage': stage,
+                                 'seconds': round(seconds, 3),
+                                 'peak_rss_mb': round(_peak_rss_mb(), 1)}))
+
+
+@cli.command(name='suite')
+@click.option('--num_reads', type=int, multiple=True,
+              default=[10000, 100000, 1000000], show_default=True,
+              help='number of reads of a dataset (repeatable, e.g. up to '
+                   '100000000)')
+@click.option('--stage', type=click.Choice(SUITE_STAGES), multiple=True,
+              help='stage to time (repeatable, default all)')
+@click.option('--hits_per_read', type=int, default=5, show_default=True,
+              help='number of ground-truth and SSEARCH alignments per read')
+@click.option('--repeat_fraction', type=float, default=0.1,
+              show_default=True, help='fraction of reads from repeats')
+@click.option('--error_rate', type=float, default=0.01, show_default=True,
+              help='sequencing errors per nucleotide')
+@click.option('--misaligned_fraction', type=float, default=0.05,
+              show_default=True,
+              help='fraction of aligned reads aligned to a random location')
+@click.option('--unaligned_fraction', type=float, default=0.05,
+              show_default=True, help='fraction of reads not aligned')
+@click.option('--offset', type=int, default=5, show_default=True,
+              help='offset of compute_accuracy and the comparison script')
+@click.option('--repeat', type=int, default=1, show_default=True,
+              help='runs of each stage, the fastest is reported')
+@click.option('--seed', type=int, default=0, show_default=True,
+              help='seed of the dataset generator')
+@click.option('--data_dir', type=click.Path(file_okay=False), default=None,
+              help='directory keeping the datasets for later runs (default: '
+                   'a temporary directory)')
+@click.option('--output_fp', type=click.Path(writable=True), default=None,
+              help='JSON results (default: standard output)')
+@click.option('--baseline_fp', type=click.Path(exists=True), default=None,
+              help='JSON results of a previous run to compare with')
+def suite(num_reads, stage, hits_per_read, repeat_fraction, error_rate,
+          misaligned_fraction, unaligned_fraction, offset, repeat, seed,
+          data_dir, output_fp, baseline_fp):
+    """Time and measure the peak memory of each stage of the evaluation on
+       synthetic datasets of increasing size
+    """
+    dataset_parameters = {'hits_per_read': hits_per_read,
+                          'repeat_fraction': repeat_fraction,
+                          'error_rate': error_rate,
+                          'misaligned_fraction': misaligned_fraction,
+                          'unaligned_fraction': unaligned_fraction,
+                          'seed': seed}
+    stages = [name for name in SUITE_STAGES if not stage or name in stage]
+    report = {'version': _SUITE_VERSION,
+              'environment': _environment(),
+              'parameters': dict(dataset_parameters, offset=offset,
+                                 repeat=repeat),
+              'results': []}
+    baseline = None
+    if baseline_fp is not None:
+        with open(baseline_fp) as baseline_f:
+            baseline = json.load(baseline_f)
+
+    working_dir = data_dir if data_dir is not None else \
+        mkdtemp(prefix='benchmark_')
+    try:
+        for reads in sorted(num_reads):
+            dataset_dir = _suite_dataset(working_dir, reads,
+                                         dataset_parameters)
+            for name in stages:
+                result = _run_isolated('measure_stage', name, dataset_dir,
+                                       offset, repeat)
+                result['num_reads'] = reads
+                result['reads_per_second'] = \
+                    int(round(reads / result['seconds'])) \
+                    if result['seconds'] else None
+                report['results'].append(result)
+                sys.stderr.write("%-28s %10d reads %9.3f s %9.1f MB\n" % (
+                    name, reads, result['seconds'], result['peak_rss_mb']))
+            if data_dir is None:
+                shutil.rmtree(dataset_dir)
+    finally:
+        if data_dir is None:
+            shutil.rmtree(working_dir)
+
+    if baseline is not None:
+        _compare_to_baseline(report, baseline)
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if output_fp is None:
+        sys.stdout.write(output + '\n')
+    else:
+        with open(output_fp, 'w') as output_f:
+            output_f.write(output + '\n')
+
+
+@cli.command(name='startup')
+@click.option('--repeat', type=int, default=3, show_default=True,
+              help='number of runs of each subcommand, the fastest is kept')
+def startup(repeat):
+    """Time the startup of each subcommand of benchmarks.py vs. its budget,
+       exit with an error if a subcommand is over budget
+    """
+    from benchmarks import COMMANDS, STARTUP_BUDGETS, startup_seconds
+
+    over_budget = []
+    for command in [None] + sorted(COMMANDS):
+        seconds = startup_seconds(command, repeat)
+        result = {'command': command,
+                  'seconds': round(seconds, 3),
+                  'budget_seconds': STARTUP_BUDGETS[command]}
+        sys.stdout.write("%s\n" % json.dumps(result, sort_keys=True))
+        if seconds > STARTUP_BUDGETS[command]:
+            over_budget.append(command or 'benchmarks.py')
+    if over_budget:
+        raise click.ClickException("startup over budget: %s"
+                                   % ', '.join(over_budget))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+"""Run the evaluation scripts as subcommands of one command
+   usage: python benchmarks.py accuracy ground_truth.blast tool sam tool.sam total_reads [...]
+          python benchmarks.py compare tool_1 tool_2 reads.fasta tool_1.sam tool_2.sam offset
+          python benchmarks.py stats tool alignments.sam reads.fasta min_score
+          python benchmarks.py filter illumina reads.sam ssearch.m8 output.txt [...]
+          python benchmarks.py grid grid.txt 'accuracy_{platform}.txt' [...]
+          python benchmarks.py graph accuracy.txt accuracy.png [...]
+          python benchmarks.py graph3d accuracy.txt accuracy.png [...]
+
+   Each subcommand is the command line of its script (see COMMANDS), whose
+   module is imported only when the subcommand runs, so that --help and the
+   other subcommands do not import numpy or matplotlib. The startup time of
+   each subcommand is kept under STARTUP_BUDGETS (see startup_seconds and
+   python benchmark_suite.py startup).
+"""
+
+import os
+import subprocess
+import sys
+import time
+from importlib import import_module
+from os.path import abspath, splitext
+
+import click
+
+
+# subcommand: (module, short help)
+COMMANDS = {
+    'accuracy': ('suppl_compute_accuracy',
+                 "Accuracy of a tool's alignments vs. the ground truth"),
+    'compare': ('compare_two_sam_files_AS',
+                "Compare the alignments of two tools"),
+    'stats': ('compute_stats_unique_alignments',
+              "Statistics of the alignments of a tool"),
+    'filter': ('filter_better_hits',
+               "Reads with better SSEARCH alignments than the ground truth"),
+    'grid': ('grid_compute_accuracy',
+             "Accuracy tables of a grid of tools and platforms, cached by "
+             "cell"),
+    'graph': ('graph_accuracy',
+              "Plot F-measure vs. accuracy of an accuracy table"),
+    'graph3d': ('graph_accuracy_3d',
+                "Plot F-measure vs. accuracy vs. run time of an accuracy "
+                "table"),
+}
+
+# seconds to start a subcommand and print its help, several times the
+# measured startup (the subcommand imports its module, not matplotlib)
+STARTUP_BUDGETS = {
+    None: 0.5,
+    'accuracy': 1.0,
+    'compare': 0.5,
+    'stats': 1.0,
+    'filter': 1.0,
+    'grid': 1.0,
+    'graph': 1.0,
+    'graph3d': 1.0,
+}
+
+
+class LazyGroup(click.Group):
+    """Group of the _main commands of COMMANDS, importing the module of a
+       subcommand when it is run or its help is shown
+    """
+
+    def list_commands(self, ctx):
+        return sorted(COMMANDS)
+
+    def get_command(self, ctx, name):
+        if name not in COMMANDS:
+            return None
+        return import_module(COMMANDS[name][0])._main
+
+    def format_commands(self, ctx, formatter):
+        # the help of the group lists the short helps of COMMANDS rather
+        # than importing every module for its docstring
+        with formatter.section('Commands'):
+            formatter.write_dl([(name, COMMANDS[name][1])
+                                for name in self.list_commands(ctx)])
+
+
+@click.command(cls=LazyGroup)
+def cli():
+    """Evaluate the alignments of short-read aligners
+    """
+    pass
+
+
+def startup_seconds(command=None, repeat=3):
+    """Fastest time to start a subcommand in a fresh interpreter and print
+       its help
+
+       Parameters:
+       -----------
+       command : string, optional
+          subcommand of COMMANDS, None for the help of benchmarks.py
+       repeat : integer, optional
+          number of runs
+
+       Returns:
+       --------
+       seconds : float
+          fastest wall time of the runs
+    """
+    args = [sys.executable, splitext(abspath(__file__))[0] + '.py']
+    if command is not None:
+        if command not in COMMANDS:
+            raise ValueError("%s is not a subcommand" % command)
+        args.append(command)
+    args.append('--help')
+    with open(os.devnull, 'w') as devnull:
+        fastest = None
+        for _ in range(repeat):
+            start = time.time()
+            subprocess.check_call(args, stdout=devnull)
+            seconds = time.time() - start
+            fastest = seconds if fastest is None else min(fastest, seconds)
+    return fastest
+
+
+if __name__ == '__main__':
+    cli()
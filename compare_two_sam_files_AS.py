@@ -1,107 +1,143 @@
 """Compare alignments between two SAM files (single best alignment per read required)
-   usage: python compare_two_sam_files_AS.py [tool_1_name] [tool_2_name] [reads FASTA file] [tool_1_sam] [tool_2_sam] [offset]
+   usage: python compare_two_sam_files_AS.py [tool_1_name] [tool_2_name] [reads FASTA or SAM file] [tool_1_sam] [tool_2_sam] [offset]
+                 [--processes 3]
    The final 'offset' parameter is the +-N nucleotides range within which the starting
    alignment positions must be for two tools in order to consider the alignments equal
+   The reads and both SAM files are parsed one after another, or at the same time by up
+   to 3 worker processes with --processes.
 """
 
-from skbio.parse.sequences import parse_fasta
-import sys
-import re
+import marshal
+from multiprocessing import Pool
+
+import click
+
+from alignment_io import open_input
+from fasta_index import read_lengths
+from sam_parser import parse_sam
 
-if __name__ == '__main__':
-    software_1 = sys.argv[1]
-    software_2 = sys.argv[2]
-    reads = sys.argv[3]
-    s1_mapping_f = sys.argv[4]
-    s2_mapping_f = sys.argv[5]
-    offset = int(sys.argv[6])
 
+def collect_reads(lengths):
+    """Dictionary of read lengths (as returned by fasta_index.read_lengths),
+       inserted in the order of the reads file so that the comparison visits
+       reads in the same order wherever they were parsed
+
+       Returns:
+       --------
+       expected_mapping : dict
+          [length] of each read id
+    """
     expected_mapping = {}
-    expected_reads = 0
-
-    # load ground-truth origin mappings into dict 
-    with open(reads, 'U') as reads_fp:
-        for label, seq in parse_fasta(reads_fp):
-            expected_reads += 1
-            name = label.split()[0]
-            length = len(seq)
-            if name not in expected_mapping:
-                expected_mapping[name] = [length]
+    for name, length, num_amb_nt in lengths:
+        expected_mapping[name] = [length]
+    return expected_mapping
+
+
+def collect_alignments(sam_fp, software):
+    """Single best alignment of each aligned read of a SAM file
+
+       Returns:
+       --------
+       mapping : dict
+          [contig, position, cigar, aligned length, number of indels,
+          alignment score] of each read id
+    """
+    mapping = {}
+    with open_input(sam_fp) as sam_f:
+        for record in parse_sam(sam_f, aligned_only=True):
+            name = record.read_id
+            # alignment score looked up by tag (AS:i), compared as integers
+            sw_score = record.alignment_score
+            if name not in mapping:
+                mapping[name] = [record.contig, record.position, record.cigar,
+                                 record.align_len, record.num_indel, sw_score]
             else:
-                raise ValueError("reads: %s seen twice" % name)
+                raise ValueError("%s: %s seen twice" % (software, name))
+    return mapping
+
+
+def _collect_marshalled(args):
+    # tables are returned marshalled, much faster to transfer than pickled
+    collect, collect_args = args
+    return marshal.dumps(collect(*collect_args), 2)
+
+
+def collect_inputs(reads, s1_mapping_f, s2_mapping_f, software_1, software_2,
+                   processes=1):
+    """Parse the reads and both SAM files, one after another or at the same
+       time in separate processes
+
+       Parameters:
+       -----------
+       processes : integer, optional
+          number of worker processes, each parsing one input (at most 3);
+          1 parses them in this process
+
+       Yields:
+       -------
+       expected_mapping, s1_mapping, s2_mapping : dict
+          the table of each input (see collect_reads and collect_alignments),
+          in this order
+    """
+    tasks = [(read_lengths, (reads,)),
+             (collect_alignments, (s1_mapping_f, software_1)),
+             (collect_alignments, (s2_mapping_f, software_2))]
+    if processes == 1:
+        tables = (collect(*collect_args) for collect, collect_args in tasks)
+        yield collect_reads(next(tables))
+        for table in tables:
+            yield table
+        return
+    pool = Pool(min(processes, len(tasks)))
+    try:
+        results = [pool.apply_async(_collect_marshalled, (task,))
+                   for task in tasks]
+        # workers exit once their table is done
+        pool.close()
+        yield collect_reads(marshal.loads(results[0].get()))
+        for result in results[1:]:
+            yield marshal.loads(result.get())
+    finally:
+        pool.terminate()
+
+
+@click.command()
+@click.argument('software_1', required=True)
+@click.argument('software_2', required=True)
+@click.argument('reads', required=True,
+                type=click.Path(resolve_path=True, readable=True, exists=True,
+                                file_okay=True))
+@click.argument('s1_mapping_f', required=True,
+                type=click.Path(resolve_path=True, readable=True, exists=True,
+                                file_okay=True))
+@click.argument('s2_mapping_f', required=True,
+                type=click.Path(resolve_path=True, readable=True, exists=True,
+                                file_okay=True))
+@click.argument('offset', required=True, type=int)
+@click.option('--processes', type=int, default=1, show_default=True,
+              help='number of inputs parsed in parallel (at most 3)')
+def _main(software_1, software_2, reads, s1_mapping_f, s2_mapping_f, offset,
+          processes):
+    """
+    """
+
+    # the reads (ground-truth origin mappings) and alignments of both
+    # software are parsed in turn, or concurrently with --processes
+    inputs = collect_inputs(reads, s1_mapping_f, s2_mapping_f, software_1,
+                            software_2, processes=processes)
+
+    expected_mapping = next(inputs)
 
     print "Done reading reads file."
 
-    s1_mapping = {}
-
     # software 1
-    with open(s1_mapping_f, 'U') as sam_fp:
-        for line in sam_fp:
-            if line.startswith('@'):
-                continue
-            name = line.split()[0]
-            sw_score = line.split()[11].split(':')[2]
-            # segemehl splits by tabs (label can have spaces)
-            contig = line.split('\t')[2]
-            if contig == "*":
-                continue
-            orig_begin = int(line.split('\t')[3])
-            cigar = line.split('\t')[5]
-            pattern = re.compile('([MIDNSHPX=])')
-            values = pattern.split(cigar)[:-1] # turn cigar into tuple of values
-            paired = (values[n:n+2] for n in xrange(0, len(values), 2)) # pair values by twos
-            align_len = 0
-            num_indel = 0
-            for pair in paired:
-                l = int(pair[0]) # length of CIGAR event
-                t = pair[1] # type of CIGAR event
-                if (t == 'M'):
-                    align_len += l
-                elif (t == 'I'):
-                    align_len += l
-                    num_indel += 1
-                elif (t == 'D'):
-                    num_indel += 1
-            if name not in s1_mapping:
-                s1_mapping[name] = [contig, orig_begin, cigar, align_len, num_indel, sw_score]
-            else:
-                raise ValueError("%s: %s seen twice" % (software_1, name))
-    s2_mapping = {}
+    s1_mapping = next(inputs)
 
     print "Done reading s1 file."
 
     # software 2
-    with open(s2_mapping_f, 'U') as sam_fp:
-        for line in sam_fp:
-            if line.startswith('@'):
-                continue
-            name = line.split()[0]
-            sw_score = line.split()[11].split(':')[2]
-            contig = line.split('\t')[2]
-            if contig == "*":
-                continue
-            orig_begin = int(line.split('\t')[3])
-            cigar = line.split('\t')[5]
-            pattern = re.compile('([MIDNSHPX=])')
-            values = pattern.split(cigar)[:-1] # turn cigar into tuple of values
-            paired = (values[n:n+2] for n in xrange(0, len(values), 2)) # pair values by twos
-            align_len = 0
-            num_indel = 0
-            for pair in paired:
-                l = int(pair[0]) # length of CIGAR event
-                t = pair[1] # type of CIGAR event
-                if (t == 'M'):
-                    align_len += l
-                elif (t == 'I'):
-                    align_len += l
-                    num_indel += 1
-                elif (t == 'D'):
-                    num_indel += 1
-            if name not in s2_mapping:
-                s2_mapping[name] = [contig, orig_begin, cigar, align_len, num_indel, sw_score]
-            else:
-                raise ValueError("%s: %s seen twice" % (software_2, name))
-            
+    s2_mapping = next(inputs)
+
     print "Done reading s2 file."
 
     # compare ground-truth to both software
@@ -194,3 +230,7 @@ if __name__ == '__main__':
     print "Average number of indels per alignment: %s" % float(total_indel/reads_by_1)
     print "Average read length: %s" % int(total_read_length_1/reads_by_1)
     print "Average query coverage: %s" % float(float(total_q_cov_1)/float(reads_by_1))
+
+
+if __name__ == '__main__':
+    _main()
@@ -6,100 +6,187 @@
         - average number of N's in the reads
     for all alignments in SAM file.
 
-    usage: python compute_stats_unique_alignments.py [tool_name] [alignments.sam] [reads.fasta]
+    usage: python compute_stats_unique_alignments.py [tool_name] [alignments.sam] [reads.fasta or reads.sam] [min_score]
 """
 
-from skbio.parse.sequences import parse_fasta
-import sys
-import re
+import click
+import numpy as np
+
+from alignment_io import open_input
+from fasta_index import read_lengths
+from sam_parser import parse_sam
+
+
+# alignments whose CIGAR strings are decoded together
+_CHUNK_SIZE = 1000000
 
-if __name__ == '__main__':
-    software = sys.argv[1]
-    s1_mapping_f = sys.argv[2] # alignments for all study
-    reads = sys.argv[3] # reads aligned only by software
-    min_score = sys.argv[4] # minimum SW score to pass E-value
 
+def collect_reads(reads_fp):
+    """Read length and number of N's of each read, from the index of a FASTA
+       file or from a SAM file of the reads (see fasta_index.read_lengths)
+
+       Returns:
+       --------
+       expected_mapping : dict
+          [length, number of N's] of each read id
+    """
     expected_mapping = {}
-    expected_reads = 0
+    for name, length, num_amb_nt in read_lengths(reads_fp):
+        expected_mapping[name] = [length, num_amb_nt]
+    return expected_mapping
 
-    # compute read length and number of N's in a read
-    with open(reads, 'U') as reads_fp:
-        for label, seq in parse_fasta(reads_fp):
-            expected_reads += 1
-            name = label.split()[0]
-            length = len(seq)
-            num_amb_nt = int(seq.count('N'))
-            if name not in expected_mapping:
-                expected_mapping[name] = [length, num_amb_nt]
-            else:
-                raise ValueError("reads: %s seen twice" % name)
 
-    print "Done reading reads file."
+def cigar_arrays(cigars):
+    """Aligned length (M and I events) and number of indels (I and D events)
+       of many CIGAR strings, decoded together with array operations
 
-    s1_mapping = {}
+       Parameters:
+       -----------
+       cigars : list
+          CIGAR strings
 
-    # software 1
-    with open(s1_mapping_f, 'U') as sam_fp:
-        for line in sam_fp:
-            if line.startswith('@'):
-                continue
-            name = line.split()[0]
+       Returns:
+       --------
+       align_len, num_indel : numpy.ndarray
+          one integer per CIGAR string
+    """
+    chars = np.frombuffer(''.join(cigars), dtype=np.uint8)
+    ends = np.cumsum([len(cigar) for cigar in cigars])
+    is_digit = (chars >= ord('0')) & (chars <= ord('9'))
+    if len(ends) and np.any(is_digit[ends[ends > 0] - 1]):
+        raise ValueError("CIGAR strings must end with an operation")
+    op_positions = np.flatnonzero(~is_digit)
+    digit_positions = np.flatnonzero(is_digit)
+    # each digit is a decimal place of the length of the next operation
+    digit_op = np.searchsorted(op_positions, digit_positions)
+    place = op_positions[digit_op] - digit_positions - 1
+    op_lengths = np.bincount(
+        digit_op, weights=(chars[digit_positions] - ord('0')) * 10.0 ** place,
+        minlength=len(op_positions))
+    ops = chars[op_positions]
+    op_cigar = np.searchsorted(ends, op_positions, side='right')
+    insertion = ops == ord('I')
+    indel = insertion | (ops == ord('D'))
+    align_len = np.bincount(op_cigar,
+                            weights=op_lengths * ((ops == ord('M')) |
+                                                  insertion),
+                            minlength=len(cigars))
+    num_indel = np.bincount(op_cigar, weights=indel, minlength=len(cigars))
+    return (np.rint(align_len).astype(np.int64),
+            np.rint(num_indel).astype(np.int64))
+
+
+def collect_alignments(sam_fp, expected_mapping, software):
+    """Statistics of the alignment of each read of expected_mapping in a
+       SAM file (one alignment per read)
+
+       Returns:
+       --------
+       stats : dict
+          'read_length', 'num_amb_nt', 'align_len', 'num_indel' and
+          'sw_score' arrays, with one element per aligned read in the
+          iteration order of a dictionary of the aligned read ids
+    """
+    s1_index = {}
+    chunks = []
+    columns = ([], [], [], [])
+
+    def add_chunk():
+        read_length, num_amb_nt, cigars, sw_scores = columns
+        align_len, num_indel = cigar_arrays(cigars)
+        chunks.append((np.array(read_length, dtype=np.int64),
+                       np.array(num_amb_nt, dtype=np.int64),
+                       align_len, num_indel,
+                       np.array(sw_scores, dtype=np.int64)))
+        for column in columns:
+            del column[:]
+
+    with open_input(sam_fp) as sam_f:
+        for record in parse_sam(sam_f, aligned_only=True):
+            name = record.read_id
             if name not in expected_mapping:
                 continue
-            #sw_score = line.split()[11].split(':')[2]
-            # segemehl splits by tabs (label can have spaces)
-            contig = line.split('\t')[2]
-            if contig == "*":
-                continue
-            #orig_begin = int(line.split('\t')[3])
-            sw_score = int(line.split('\t')[11].split(':')[2])
-            cigar = line.split('\t')[5]
-            pattern = re.compile('([MIDNSHPX=])')
-            values = pattern.split(cigar)[:-1] # turn cigar into tuple of values
-            paired = (values[n:n+2] for n in xrange(0, len(values), 2)) # pair values by twos
-            align_len = 0
-            num_indel = 0
-            for pair in paired:
-                l = int(pair[0]) # length of CIGAR event
-                t = pair[1] # type of CIGAR event
-                if (t == 'M'):
-                    align_len += l
-                elif (t == 'I'):
-                    align_len += l
-                    num_indel += 1
-                elif (t == 'D'):
-                    num_indel += 1
-            if name not in s1_mapping:
-                s1_mapping[name] = [contig, cigar, align_len, num_indel, sw_score]
-            else:
-                raise ValueError("%s: %s seen twice" % (software_1, name))
-    s2_mapping = {}
+            if name in s1_index:
+                raise ValueError("%s: %s seen twice" % (software, name))
+            s1_index[name] = len(s1_index)
+            length, num_amb_nt = expected_mapping[name]
+            columns[0].append(length)
+            columns[1].append(num_amb_nt)
+            columns[2].append(record.cigar)
+            columns[3].append(record.alignment_score)
+            if len(columns[2]) == _CHUNK_SIZE:
+                add_chunk()
+    add_chunk()
+
+    # the summary depends on the order reads were visited in
+    order = np.fromiter(s1_index.itervalues(), dtype=np.int64,
+                        count=len(s1_index))
+    return dict((name, np.concatenate([chunk[i] for chunk in chunks])[order])
+                for i, name in enumerate(['read_length', 'num_amb_nt',
+                                          'align_len', 'num_indel',
+                                          'sw_score']))
+
+
+def alignment_stats(stats, min_score):
+    """Summarize the statistics of aligned reads
+
+       Parameters:
+       -----------
+       stats : dict
+          arrays of statistics per read, as returned by collect_alignments
+       min_score : integer
+          minimum SW score to pass E-value
+
+       Returns:
+       --------
+       total_reads, total_indels, total_coverage, low_coverage,
+       high_coverage, total_amb_nt, total_sw_score, total_read_length,
+       num_alignments_with_min_score : numbers
+    """
+    total_reads = len(stats['align_len'])
+    coverage = stats['align_len'] / stats['read_length'].astype(np.float64)
+    # sums of floats accumulated in read order, as in a loop
+    total_coverage = float(np.cumsum(coverage)[-1]) if total_reads else 0
+    low_coverage = float(min(1.0, coverage.min())) if total_reads else 1.0
+    # the high coverage only includes reads that did not lower the low
+    # coverage seen so far
+    low_before = np.minimum.accumulate(np.concatenate(([1.0], coverage)))[:-1]
+    candidates = coverage[coverage >= low_before]
+    high_coverage = float(max(0.0, candidates.max())) if len(candidates) \
+        else 0.0
+    return (total_reads, int(stats['num_indel'].sum()), total_coverage,
+            low_coverage, high_coverage, int(stats['num_amb_nt'].sum()),
+            int(stats['sw_score'].sum()), int(stats['read_length'].sum()),
+            int((stats['sw_score'] >= int(min_score)).sum()))
+
+
+@click.command()
+@click.argument('software', required=True)
+@click.argument('s1_mapping_f', required=True,
+                type=click.Path(resolve_path=True, readable=True, exists=True,
+                                file_okay=True))
+@click.argument('reads', required=True,
+                type=click.Path(resolve_path=True, readable=True, exists=True,
+                                file_okay=True))
+@click.argument('min_score', required=True, type=int)
+def _main(software, s1_mapping_f, reads, min_score):
+    """
+    """
+
+    # compute read length and number of N's in a read
+    expected_mapping = collect_reads(reads)
+
+    print "Done reading reads file."
+
+    # software 1
+    stats = collect_alignments(s1_mapping_f, expected_mapping, software)
 
     print "Done reading s1 file."
 
     # compute stats
-    total_reads = len(s1_mapping)
-    total_indels = 0
-    total_coverage = 0
-    total_amb_nt = 0
-    total_sw_score = 0
-    total_read_length = 0
-    low_coverage = 1.0
-    high_coverage = 0.0
-    num_alignments_with_min_score = 0
-    for read in s1_mapping:
-        total_indels += s1_mapping[read][3]
-        coverage = float(float(s1_mapping[read][2])/float(expected_mapping[read][0]))
-        total_coverage += coverage
-        if coverage < low_coverage:
-            low_coverage = coverage
-        elif coverage > high_coverage:
-            high_coverage = coverage
-        total_amb_nt += expected_mapping[read][1]
-        total_sw_score += s1_mapping[read][4]
-        total_read_length += expected_mapping[read][0]
-        if int(s1_mapping[read][4]) >= int(min_score):
-            num_alignments_with_min_score +=1
+    (total_reads, total_indels, total_coverage, low_coverage, high_coverage,
+     total_amb_nt, total_sw_score, total_read_length,
+     num_alignments_with_min_score) = alignment_stats(stats, min_score)
 
     print "Total reads: %s" % total_reads
     print "Average number of indels per alignment: %s" % float(float(total_indels)/float(total_reads))
@@ -109,3 +196,7 @@ if __name__ == '__main__':
     print "Average SW score: %s" % float(float(total_sw_score)/float(total_reads))
     print "Average read length: %s" % float(float(total_read_length)/float(total_reads))
     print "Number of alignments with >= min_score (%s) = %s" % (min_score, num_alignments_with_min_score)
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+"""Sort BLAST tabular (m8) alignments by read id, then by descending
+   bitscore, within a memory budget
+   usage: python external_sort.py alignments.m8 sorted.m8 [--buffer_mb 512]
+
+   Lines are read into a buffer of at most buffer_mb megabytes, which is
+   sorted and spilled to a temporary file (a run) when full. The runs are
+   then merged (k-way, with a heap) into the sorted output, in several
+   passes if there are more runs than files opened at once. Input that
+   fits in the buffer is sorted in memory without temporary files. Hits of
+   a read with equal bitscores keep their order in the input.
+"""
+
+import heapq
+import os
+import shutil
+from tempfile import mkdtemp, mkstemp
+
+import click
+
+from alignment_io import open_input
+
+
+# default memory budget of the sort buffer
+DEFAULT_BUFFER_MB = 512
+# runs merged at once (each holds an open file)
+_MERGE_WIDTH = 64
+# approximate memory of a buffered line besides its characters
+_LINE_OVERHEAD = 120
+
+
+def hit_key(line):
+    """Sort key of a BLAST tabular line: read id, then descending bitscore
+    """
+    fields = line.split('\t', 12)
+    if len(fields) < 12:
+        raise ValueError("not a BLAST tabular line: %r" % line)
+    return fields[0], -float(fields[11])
+
+
+def _write_run(lines, tmp_dir):
+    f, run_fp = mkstemp(prefix='run_', suffix='.m8', dir=tmp_dir)
+    with os.fdopen(f, 'w') as run_f:
+        run_f.writelines(lines)
+    return run_fp
+
+
+def _decorated(lines, run, key):
+    # the run number keeps equal keys in input order across runs
+    for line in lines:
+        yield key(line), run, line
+
+
+def _merge(run_fps, key):
+    """Yield the lines of sorted run files in sorted order"""
+    run_fs = [open(run_fp) for run_fp in run_fps]
+    try:
+        for _, _, line in heapq.merge(*[_decorated(run_f, run, key)
+                                        for run, run_f in enumerate(run_fs)]):
+            yield line
+    finally:
+        for run_f in run_fs:
+            run_f.close()
+
+
+def external_sort(lines, key=hit_key, buffer_mb=DEFAULT_BUFFER_MB,
+                  tmp_dir=None):
+    """Sort lines with a bounded buffer, spilling sorted runs to temporary
+       files and merging them
+
+       Parameters:
+       -----------
+       lines : iterable
+          lines to sort, each ending with a newline
+       key : function, optional
+          sort key of a line (the sort is stable)
+       buffer_mb : number, optional
+          memory budget of the lines held at once, in megabytes
+       tmp_dir : string, optional
+          directory of the temporary runs (default: the system's)
+
+       Yields:
+       -------
+       line : string
+          lines in sorted order; blank lines are dropped
+    """
+    budget = int(buffer_mb * (1 << 20))
+    buffered = []
+    size = 0
+    run_dir = None
+    run_fps = []
+    try:
+        for line in lines:
+            if not line.strip():
+                continue
+            if not line.endswith('\n'):
+                line += '\n'
+            buffered.append(line)
+            size += len(line) + _LINE_OVERHEAD
+            if size >= budget:
+                if run_dir is None:
+                    run_dir = mkdtemp(prefix='external_sort_', dir=tmp_dir)
+                buffered.sort(key=key)
+                run_fps.append(_write_run(buffered, run_dir))
+                buffered = []
+                size = 0
+        buffered.sort(key=key)
+        if not run_fps:
+            for line in buffered:
+                yield line
+            return
+        if buffered:
+            run_fps.append(_write_run(buffered, run_dir))
+        del buffered
+
+        # merge the oldest runs first so that equal keys stay in order
+        while len(run_fps) > _MERGE_WIDTH:
+            merged_fp = _write_run(_merge(run_fps[:_MERGE_WIDTH], key),
+                                   run_dir)
+            for run_fp in run_fps[:_MERGE_WIDTH]:
+                os.remove(run_fp)
+            run_fps = [merged_fp] + run_fps[_MERGE_WIDTH:]
+        for line in _merge(run_fps, key):
+            yield line
+    finally:
+        if run_dir is not None:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def sort_alignments(blast_alignments_fp, output_fp,
+                    buffer_mb=DEFAULT_BUFFER_MB, tmp_dir=None):
+    """Sort a BLAST tabular file by read id, then by descending bitscore,
+       into output_fp
+    """
+    with open_input(blast_alignments_fp) as blast_f:
+        with open(output_fp, 'w') as output_f:
+            output_f.writelines(external_sort(blast_f, buffer_mb=buffer_mb,
+                                              tmp_dir=tmp_dir))
+
+
+@click.command()
+@click.argument('blast_alignments_fp', required=True,
+                type=click.Path(resolve_path=True, readable=True, exists=True,
+                                file_okay=True))
+@click.argument('output_fp', required=True,
+                type=click.Path(resolve_path=True, writable=True))
+@click.option('--buffer_mb', type=float, default=DEFAULT_BUFFER_MB,
+              show_default=True,
+              help='memory budget of the sort buffer, in megabytes')
+@click.option('--tmp_dir', default=None,
+              type=click.Path(resolve_path=True, exists=True,
+                              file_okay=False),
+              help='directory of the temporary sorted runs')
+def _main(blast_alignments_fp, output_fp, buffer_mb, tmp_dir):
+    """
+    """
+    sort_alignments(blast_alignments_fp, output_fp, buffer_mb=buffer_mb,
+                    tmp_dir=tmp_dir)
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+
+"""Index the reads of a FASTA file by name, length, offset and number of
+   N's, so that scripts needing only read lengths do not parse the
+   sequences
+   usage: python fasta_index.py reads.fasta
+
+   The index is a tab-separated file written next to the FASTA file (with
+   the suffix .nfai), like a samtools .fai index with the number of N's in
+   place of the line layout columns. It is built in one pass over a
+   memory map of the FASTA file and rebuilt when the size or modification
+   time of the FASTA file changes.
+
+   Read lengths can also be taken from a SAM file of the reads (e.g. as
+   output by a read simulator), from the CIGAR string or the SEQ column.
+"""
+
+import gc
+import mmap
+import os
+import sys
+from tempfile import mkstemp
+
+import click
+
+from alignment_io import input_format, open_input
+from sam_parser import parse_sam
+
+
+# suffix of the index file written next to a FASTA file
+FASTA_INDEX_SUFFIX = '.nfai'
+_INDEX_MAGIC = '#nfai'
+
+
+def _scan_fasta(data):
+    """Yield (name, length, offset, number of N's) of each record of FASTA
+       data (a string or memory map)
+    """
+    size = len(data)
+    position = data.find('>')
+    if position > 0 and data[:position].strip():
+        raise ValueError("FASTA data must start with a label")
+    while position != -1:
+        header_end = data.find('\n', position)
+        if header_end == -1:
+            header_end = size
+        name = data[position + 1:header_end].split(None, 1)
+        next_position = data.find('\n>', header_end)
+        seq_end = next_position if next_position != -1 else size
+        seq = data[header_end + 1:seq_end]
+        if name:
+            yield (name[0], len(seq) - seq.count('\n') - seq.count('\r'),
+                   header_end + 1, seq.count('N'))
+        position = next_position + 1 if next_position != -1 else -1
+
+
+def build_fasta_index(fasta_fp):
+    """Index the records of a FASTA file
+
+       Parameters:
+       -----------
+       fasta_fp : string
+          filepath of reads (FASTA), plain text or compressed
+
+       Returns:
+       --------
+       index : list
+          (name, length, offset, number of N's) of each read, in the order
+          of the file; offsets are those of the sequences in the
+          uncompressed data
+    """
+    if input_format(fasta_fp) == 'text':
+        if not os.path.getsize(fasta_fp):
+            return []
+        with open(fasta_fp, 'rb') as fasta_f:
+            data = mmap.mmap(fasta_f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                index = list(_scan_fasta(data))
+            finally:
+                data.close()
+    else:
+        with open_input(fasta_fp) as fasta_f:
+            index = list(_scan_fasta(''.join(fasta_f)))
+
+    names = set()
+    for record in index:
+        if record[0] in names:
+            raise ValueError("reads: %s seen twice" % record[0])
+        names.add(record[0])
+    return index
+
+
+def _source(fasta_fp):
+    stat = os.stat(fasta_fp)
+    return "%d\t%r" % (stat.st_size, stat.st_mtime)
+
+
+def write_fasta_index(index, index_fp, source):
+    """Write an index as returned by build_fasta_index, after a header
+       identifying the source file
+    """
+    f, tmp_fp = mkstemp(prefix='.nfai_',
+                        dir=os.path.dirname(os.path.abspath(index_fp)))
+    try:
+        with os.fdopen(f, 'w') as index_f:
+            index_f.write("%s\t%s\n" % (_INDEX_MAGIC, source))
+            for record in index:
+                index_f.write("%s\t%d\t%d\t%d\n" % record)
+        os.rename(tmp_fp, index_fp)
+    except:
+        os.remove(tmp_fp)
+        raise
+
+
+def read_fasta_index(index_fp, fasta_fp=None):
+    """Read an index file
+
+       Returns:
+       --------
+       index : list
+          (name, length, offset, number of N's) of each read, or None if
+          the index is missing or does not match the current fasta_fp
+    """
+    try:
+        index_f = open(index_fp, 'U')
+    except IOError:
+        return None
+    with index_f:
+        header = index_f.readline().rstrip('\n').split('\t', 1)
+        if header[0] != _INDEX_MAGIC or \
+                (fasta_fp is not None and header[1:] != [_source(fasta_fp)]):
+            return None
+        # names are single words, so the columns can be split all at once
+        values = index_f.read().split()
+    if len(values) % 4:
+        return None
+    # the index holds millions of tuples, which would otherwise trigger
+    # repeated full garbage collections
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return zip(values[0::4], _ints(values[1::4]), map(int, values[2::4]),
+                   _ints(values[3::4]))
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _ints(values):
+    # most reads share a few lengths and N counts, converted once each
+    converted = dict((value, int(value)) for value in set(values))
+    return map(converted.__getitem__, values)
+
+
+def load_fasta_index(fasta_fp, rebuild=False):
+    """Index of a FASTA file, read from its index file or built and saved
+       when missing or stale
+
+       Parameters:
+       -----------
+       fasta_fp : string
+          filepath of reads (FASTA)
+       rebuild : boolean, optional
+          build the index even if its file is up to date
+
+       Returns:
+       --------
+       index : list
+          (name, length, offset, number of N's) of each read, in the order
+          of the file
+    """
+    index_fp = fasta_fp + FASTA_INDEX_SUFFIX
+    if not rebuild:
+        index = read_fasta_index(index_fp, fasta_fp)
+        if index is not None:
+            return index
+
+    source = _source(fasta_fp)
+    index = build_fasta_index(fasta_fp)
+    try:
+        write_fasta_index(index, index_fp, source)
+    except (IOError, OSError) as e:
+        sys.stderr.write("WARNING: could not write FASTA index %s: %s\n"
+                         % (index_fp, e))
+    return index
+
+
+def sam_read_lengths(sam_fp):
+    """Length and number of N's of each read of a SAM file, from the CIGAR
+       string (including clipped nucleotides) or else the SEQ column
+
+       Returns:
+       --------
+       lengths : list
+          (name, length, number of N's) of each read, in the order of the
+          file; secondary and supplementary alignments are skipped
+    """
+    lengths = []
+    names = set()
+    with open_input(sam_fp) as sam_f:
+        for record in parse_sam(sam_f):
+            if record.flag & 0x900:
+                continue
+            name = record.read_id
+            if name in names:
+                raise ValueError("reads: %s seen twice" % name)
+            names.add(name)
+            length = record.read_length
+            if length is None:
+                raise ValueError("no CIGAR string or sequence for read %s" %
+                                 name)
+            seq = record.fields[9]
+            lengths.append((name, length, seq.count('N') if seq != '*' else 0))
+    return lengths
+
+
+def read_lengths(reads_fp):
+    """Length and number of N's of each read, from the index of a FASTA
+       file or from a SAM file of the reads
+
+       Parameters:
+       -----------
+       reads_fp : string
+          filepath of reads, FASTA or SAM
+
+       Returns:
+       --------
+       lengths : list
+          (name, length, number of N's) of each read, in the order of the
+          file
+    """
+    with open_input(reads_fp) as reads_f:
+        first_line = next((line for line in reads_f if line.strip()), '')
+    if first_line.startswith('>'):
+        return [(name, length, num_amb_nt)
+                for name, length, offset, num_amb_nt in
+                load_fasta_index(reads_fp)]
+    return sam_read_lengths(reads_fp)
+
+
+@click.command()
+@click.argument('fasta_fp', required=True,
+                type=click.Path(resolve_path=True, readable=True, exists=True,
+                                file_okay=True))
+def _main(fasta_fp):
+    """
+    """
+    load_fasta_index(fasta_fp, rebuild=True)
+
+
+if __name__ == "__main__":
+    _main()
@@ -13,91 +13,337 @@ purpose: output read labels for which SSEARCH found better alignments on the gen
 author : Evguenia Kopylova (jenya.kopylov@gmail.com)
 date   : Feb 09, 2015
 usage  : python filter_better_hits.py ['illumina', '454' or 'ion'] [ground_truth_fp] [ssearch_alignments.m8] [output_fp]
+                [--num_shards N --shard K] [--sort_buffer_mb MB --tmp_dir DIR]
          The 'ground_truth_fp' is a file containing the ground truth alignments. This is limited to SAM alignments
          (output by the Mason simulator) for Illumina reads, the simulated FASTA file for 454 reads (output by the Mason
           simulator) and the simulated FASTA file for Ion Torrent reads (output by CureSim). This script can be updated
          to support other ground-truth input files.
+         The SSEARCH alignments are streamed read by read, so memory only holds the compact ground truth. They
+         must be grouped by read, best hit first: a first pass checks this, and alignments that are not are
+         sorted by read id and descending bitscore with an external merge sort (see external_sort.py) within
+         --sort_buffer_mb megabytes. Very large files can be filtered in N shards run as separate jobs, shard K
+         (0 to N-1) writing the reads of the K-th part of the file; the outputs concatenated in shard order are
+         the output of a single run. Sharded files must already be sorted (python external_sort.py in.m8 out.m8).
 """
 
-import sys
-from skbio.parse.sequences import parse_fasta
 
+import os
+from array import array
+from itertools import groupby
 
-if __name__ == '__main__':
+import click
+import numpy as np
 
-    technology = sys.argv[1]
-    ground_truth_fp = sys.argv[2]
-    blast_alignments_fp = sys.argv[3]
-    output_fp = sys.argv[4]
-    expected_mapping = {}
-    written = False
+from alignment_io import input_format, open_input
+from external_sort import DEFAULT_BUFFER_MB, external_sort
+from sam_parser import parse_sam
 
-    # parse Illumina ground-truth alignments
-    if technology == "illumina":
-        with open(ground_truth_fp, 'U') as ground_truth:
-            for label, seq in parse_fasta(ground_truth):
-                name = label.split()[0]
-                contig = label.split()[1].split('=')[1]
-                orig_begin = int(label.split()[4].split('=')[1])
-                if name not in expected_mapping:
-                    expected_mapping[name] = [contig, orig_begin]
-                else:
-                    raise ValueError("%s seen twice" % name)
 
-    elif technology == "454":
-        with open(ground_truth_fp, 'U') as ground_truth:
-            for line in ground_truth:
-                if line.startswith('@'):
-                    continue
-                name = line.split()[0]
-                contig = line.split()[2]
-                orig_begin = line.split()[3]
-                if name not in expected_mapping:
-                    expected_mapping[name] = [contig, orig_begin]
-                else:
-                    raise ValueError("%s seen twice" % name)
+class GroundTruthOrigins(object):
+    """Origin (contig and start position) of each simulated read, held in
+       arrays sorted by read name with contigs interned to integer codes
+    """
 
-    elif technology == "ion":
-        with open(ground_truth_fp, 'U') as ground_truth:
-            for label, seq in parse_fasta(ground_truth):
-                name = label
-                contig = label.split('_')[0]
-                orig_begin = label.split('_')[3]
-                if name not in expected_mapping:
-                    expected_mapping[name] = [contig, orig_begin]
-                else:
-                    raise ValueError("%s seen twice" % name)
+    def __init__(self, names, contig_codes, positions, contigs,
+                 match_position=True):
+        order = np.argsort(names, kind='mergesort')
+        self._names = names[order]
+        duplicates = np.flatnonzero(self._names[1:] == self._names[:-1])
+        if len(duplicates):
+            raise ValueError("%s seen twice" % self._names[duplicates[0]])
+        self._contig_codes = contig_codes[order]
+        self._positions = positions[order]
+        self.contigs = contigs
+        self.match_position = match_position
+
+    def __len__(self):
+        return len(self._names)
+
+    def index(self, read_id):
+        """Position of read_id in the sorted reads, None if it is unknown"""
+        i = int(self._names.searchsorted(read_id))
+        if i < len(self._names) and self._names[i] == read_id:
+            return i
+        return None
 
+    def origin(self, i):
+        """Contig and start position of the read at index i"""
+        return self.contigs[self._contig_codes[i]], int(self._positions[i])
+
+
+def _fasta_labels(fasta_fp):
+    with open_input(fasta_fp) as fasta_f:
+        for line in fasta_f:
+            if line.startswith('>'):
+                yield line[1:].strip()
+
+
+def _origins(technology, ground_truth_fp):
+    """Yield the name, contig and start position of each simulated read"""
+    if technology == "illumina":
+        for label in _fasta_labels(ground_truth_fp):
+            label = label.split()
+            yield label[0], label[1].split('=')[1], label[4].split('=')[1]
+    elif technology == "454":
+        with open_input(ground_truth_fp) as ground_truth:
+            for record in parse_sam(ground_truth):
+                yield record.read_id, record.contig, record.fields[3]
+    elif technology == "ion":
+        for label in _fasta_labels(ground_truth_fp):
+            fields = label.split('_')
+            yield label, fields[0], fields[3]
     else:
         raise ValueError("unrecognized technology %s" % technology)
-                
-
-    # filter sequences
-    with open(blast_alignments_fp, 'U') as blast_alignments:
-        with open(output_fp, 'w') as filter_out:
-            blast_hits = {}
-            for line in blast_alignments:
-                alignment = line.strip().split('\t')
-                # check quality of new alignment with previous one
-                if alignment[0] in blast_hits:
-                    alignment_best = blast_hits[alignment[0]]
-                    # if equal bitscore
-                    if (alignment_best[10] == alignment[11] and not written):
-                        filter_out.write("%s\n" % alignment[0])
-                        written = True
-                # new alignment
-                else:
-                    # first (best) alignment for read
-                    if len(blast_hits) == 0:
-                        blast_hits[alignment[0]] = alignment[1:]
-                    else:
-                        # new read, clear blast_hits dict from
-                        # previous read
-                        blast_hits.clear()
-                        blast_hits[alignment[0]] = alignment[1:]
-                        written = False
-                    
-                    # the best hit by SSEARCH does not equal to the ground-truth
-                    if ((alignment[1] != expected_mapping[alignment[0]][0]) and (alignment[8] != expected_mapping[alignment[0]][1])):
-                        filter_out.write("%s\n" % alignment[0])
-                        written = True
+
+
+def collect_origins(technology, ground_truth_fp):
+    """Parse the origin of each simulated read
+
+       Parameters:
+       -----------
+       technology : string
+          'illumina', '454' or 'ion' (see the usage above)
+       ground_truth_fp : string
+          filepath of the simulated reads (FASTA) or alignments (SAM)
+
+       Returns:
+       --------
+       origins : GroundTruthOrigins
+          origin of each read
+    """
+    # read names are appended to one byte buffer and contigs and positions
+    # to typed buffers, so that loading holds a few bytes per read rather
+    # than Python strings and integers
+    names = bytearray()
+    name_ends = array('l')
+    contig_codes = array('i')
+    positions = array('l')
+    contig_index = {}
+    for name, contig, position in _origins(technology, ground_truth_fp):
+        names += name
+        name_ends.append(len(names))
+        code = contig_index.get(contig)
+        if code is None:
+            code = contig_index[contig] = len(contig_index)
+        contig_codes.append(code)
+        positions.append(int(position))
+    contigs = [None] * len(contig_index)
+    for contig, code in contig_index.iteritems():
+        contigs[code] = contig
+    # the start of Illumina reads (an integer) used to be compared with the
+    # SSEARCH start (a string) and never matched, so only contigs decide
+    return GroundTruthOrigins(_string_array(names, name_ends),
+                              np.frombuffer(contig_codes, dtype=np.int32),
+                              np.frombuffer(positions, dtype=np.int_),
+                              contigs,
+                              match_position=technology != "illumina")
+
+
+def _string_array(names, name_ends):
+    """NumPy string array of the names concatenated in a byte buffer, the
+       end of each name in name_ends
+    """
+    ends = np.frombuffer(name_ends, dtype=np.int_)
+    if not len(ends):
+        return np.array([], dtype=np.string_)
+    starts = np.concatenate(([0], ends[:-1]))
+    lengths = ends - starts
+    width = max(int(lengths.max()), 1)
+    chars = np.frombuffer(names, dtype=np.uint8)
+    # one column of the fixed-width names at a time, names shorter than the
+    # column are left padded with NULs
+    table = np.zeros((len(ends), width), dtype=np.uint8)
+    for column in range(width):
+        rows = np.flatnonzero(lengths > column)
+        table[rows, column] = chars[starts[rows] + column]
+    return table.view('S%d' % width).ravel()
+
+
+def filter_better_hits(origins, blast_alignments):
+    """Stream SSEARCH alignments grouped by read, best hit first, and yield
+       the reads for which SSEARCH found a better alignment than their origin
+
+       A read is output once if its best hit is on another contig and at
+       another start position than its origin, or if another of its hits
+       has the bitscore of its best hit.
+
+       Parameters:
+       -----------
+       origins : GroundTruthOrigins
+          origin of each read
+       blast_alignments : iterable
+          lines of SSEARCH alignments (BLAST tabular)
+
+       Yields:
+       -------
+       read_id : string
+          label of each read to filter
+    """
+    seen = bytearray(len(origins))
+    for read_id, lines in groupby(blast_alignments, key=_read_id):
+        if not read_id.strip():
+            continue
+        i = origins.index(read_id)
+        if i is None:
+            raise ValueError("%s not found in the ground truth" % read_id)
+        if seen[i]:
+            raise ValueError("alignments of %s are not grouped by read" %
+                             read_id)
+        seen[i] = 1
+        best = next(lines).strip().split('\t')
+        contig, position = origins.origin(i)
+        # the best hit by SSEARCH does not equal to the ground-truth
+        if best[1] != contig and (not origins.match_position or
+                                  int(best[8]) != position):
+            yield read_id
+            continue
+        # another hit with the bitscore of the best one; only the bitscore
+        # column of the other hits is split off
+        for line in lines:
+            if line.split('\t', 12)[11].rstrip() == best[11]:
+                yield read_id
+                break
+
+
+def _read_id(line):
+    return line.split('\t', 1)[0]
+
+
+def alignments_grouped(origins, blast_alignments):
+    """Check that SSEARCH alignments are grouped by read, best hit first
+       (non-increasing bitscores), as filter_better_hits expects
+
+       Parameters:
+       -----------
+       origins : GroundTruthOrigins
+          origin of each read
+       blast_alignments : iterable
+          lines of SSEARCH alignments (BLAST tabular)
+
+       Returns:
+       --------
+       grouped : boolean
+          False if the alignments must be sorted first
+    """
+    seen = bytearray(len(origins))
+    for read_id, lines in groupby(blast_alignments, key=_read_id):
+        if not read_id.strip():
+            continue
+        i = origins.index(read_id)
+        if i is None:
+            raise ValueError("%s not found in the ground truth" % read_id)
+        if seen[i]:
+            return False
+        seen[i] = 1
+        bitscores = [float(line.split('\t', 12)[11]) for line in lines]
+        if any(a < b for a, b in zip(bitscores, bitscores[1:])):
+            return False
+    return True
+
+
+def shard_range(blast_alignments_fp, shard, num_shards):
+    """Byte range of a shard of an alignments file, starting and ending at
+       the first line of a read so that each read is in exactly one shard
+
+       Returns:
+       --------
+       start, end : integers
+          byte offsets of the shard in the file
+    """
+    if not 0 <= shard < num_shards:
+        raise ValueError("shard %d not in 0..%d" % (shard, num_shards - 1))
+    if input_format(blast_alignments_fp) != 'text':
+        raise ValueError("compressed alignments cannot be sharded")
+
+    def boundary(blast_f, k):
+        size = os.fstat(blast_f.fileno()).st_size
+        if k == 0:
+            return 0
+        if k == num_shards:
+            return size
+        # start of the first line at or after the target offset
+        target = size * k // num_shards
+        blast_f.seek(max(target - 1, 0))
+        if target:
+            blast_f.readline()
+        read_id = blast_f.readline().split('\t', 1)[0]
+        # skip the rest of the read of that line
+        while True:
+            line_start = blast_f.tell()
+            line = blast_f.readline()
+            if not line or line.split('\t', 1)[0] != read_id:
+                return line_start
+
+    with open(blast_alignments_fp, 'rb') as blast_f:
+        return boundary(blast_f, shard), boundary(blast_f, shard + 1)
+
+
+def _shard_lines(blast_alignments_fp, start, end):
+    with open(blast_alignments_fp, 'rb') as blast_f:
+        blast_f.seek(start)
+        while blast_f.tell() < end:
+            line = blast_f.readline()
+            if not line:
+                break
+            yield line
+
+
+def _filter_to_file(origins, blast_alignments, output_fp):
+    with open(output_fp, 'w') as filter_out:
+        for read_id in filter_better_hits(origins, blast_alignments):
+            filter_out.write("%s\n" % read_id)
+
+
+@click.command()
+@click.argument('technology', required=True,
+                type=click.Choice(['illumina', '454', 'ion']))
+@click.argument('ground_truth_fp', required=True,
+                type=click.Path(resolve_path=True, readable=True, exists=True,
+                                file_okay=True))
+@click.argument('blast_alignments_fp', required=True,
+                type=click.Path(resolve_path=True, readable=True, exists=True,
+                                file_okay=True))
+@click.argument('output_fp', required=True,
+                type=click.Path(resolve_path=True, writable=True))
+@click.option('--num_shards', type=int, default=1, show_default=True,
+              help='number of shards the alignments are split into')
+@click.option('--shard', type=int, default=0, show_default=True,
+              help='shard filtered by this run (0 to num_shards - 1)')
+@click.option('--sort_buffer_mb', type=float, default=DEFAULT_BUFFER_MB,
+              show_default=True,
+              help='memory budget for sorting alignments not grouped by read')
+@click.option('--tmp_dir', default=None,
+              type=click.Path(resolve_path=True, exists=True,
+                              file_okay=False),
+              help='directory of the temporary files of the sort')
+def _main(technology, ground_truth_fp, blast_alignments_fp, output_fp,
+          num_shards, shard, sort_buffer_mb, tmp_dir):
+    """
+    """
+    origins = collect_origins(technology, ground_truth_fp)
+    if num_shards > 1:
+        start, end = shard_range(blast_alignments_fp, shard, num_shards)
+        if not alignments_grouped(
+                origins, _shard_lines(blast_alignments_fp, start, end)):
+            raise ValueError("alignments are not grouped by read, best hit "
+                             "first; sort them with external_sort.py before "
+                             "sharding")
+        _filter_to_file(origins,
+                        _shard_lines(blast_alignments_fp, start, end),
+                        output_fp)
+        return
+
+    # one pass reading only read ids and bitscores decides whether the
+    # alignments must be sorted before filtering
+    with open_input(blast_alignments_fp) as blast_alignments:
+        grouped = alignments_grouped(origins, blast_alignments)
+    with open_input(blast_alignments_fp) as blast_alignments:
+        if not grouped:
+            blast_alignments = external_sort(blast_alignments,
+                                             buffer_mb=sort_buffer_mb,
+                                             tmp_dir=tmp_dir)
+        _filter_to_file(origins, blast_alignments, output_fp)
+
+
+if __name__ == '__main__':
+    _main()
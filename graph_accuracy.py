@@ -1,109 +1,249 @@
 #!/usr/bin/python
 
+"""Plot the F-measure vs. the accuracy score of tools from an accuracy table
+   (rows of suppl_compute_accuracy.py or batch_compute_accuracy.py)
+   usage: python graph_accuracy.py accuracy.txt accuracy.png [--offset 0]
+          python graph_accuracy.py accuracy.txt 'accuracy_{platform}_{offset}.png' \
+              --offsets 0,5,10 [--table 'Roche 454' accuracy_454.txt]
+
+   The table is loaded once into typed columns. Several offsets (--offsets)
+   and the tables of other platforms (--table) are rendered in one run,
+   each on a new figure, into output files named by the
+   {offset} and {platform} fields of the output filepath.
+"""
+
 import click
-import matplotlib as mpl
-mpl.use('Agg')
 import numpy as np
-import  matplotlib.pyplot as plt
-import matplotlib.cm as cm
-from os.path import join, exists
-import glob
-import brewer2mpl
 
+from offsets import parse_offsets
 
-def graph_accuracy(accuracy_fp,
-                   output_acc_fp,
-                   offset=0,
-                   platform="Illumina"):
+
+PLATFORMS = ["Illumina", "Roche 454", "Ion Torrent PGM"]
+# column of the F-measure, followed by one accuracy column per offset and
+# the extra columns of the table (user and wall time)
+_FMEASURE_COLUMN = 9
+
+
+class AccuracyTable(object):
+    """Columns of an accuracy table, one row per run of a tool
+
+       Attributes:
+       -----------
+       tools : list
+          tool names, in the order of their first row
+       tool_codes : numpy array
+          index in tools of the tool of each row
+       fmeasure : numpy array
+          F-measure of each row
+       accuracy : numpy array
+          accuracy score (%) of each row (rows x accuracy_offsets)
+       accuracy_offsets : list
+          offset of each accuracy column
+       usertime, walltime : numpy array
+          user and wall time of each row (NaN where the table has no time
+          columns)
+    """
+
+    def __init__(self, tools, tool_codes, fmeasure, accuracy,
+                 accuracy_offsets, usertime, walltime):
+        self.tools = tools
+        self.tool_codes = tool_codes
+        self.fmeasure = fmeasure
+        self.accuracy = accuracy
+        self.accuracy_offsets = list(accuracy_offsets)
+        self.usertime = usertime
+        self.walltime = walltime
+
+    def __len__(self):
+        return len(self.tool_codes)
+
+    def accuracy_at(self, offset):
+        """Normalized accuracy score [0,1] of each row at an offset"""
+        if offset not in self.accuracy_offsets:
+            raise ValueError("%s offset is not allowed" % offset)
+        return rounded(
+            self.accuracy[:, self.accuracy_offsets.index(offset)] / 100.0, 3)
+
+    def rows_by_tool(self):
+        """Rows of each tool, in the order of tools
+
+           Returns:
+           --------
+           rows : list
+              array of the row indices of each tool, in table order
+        """
+        order = np.argsort(self.tool_codes, kind='mergesort')
+        bounds = np.searchsorted(self.tool_codes[order],
+                                 np.arange(len(self.tools) + 1))
+        return np.split(order, bounds[1:-1])
+
+
+def rounded(values, digits):
+    """Round an array as round() rounds each value, halves away from zero
+       (np.round rounds them to even), rounding each distinct value once
     """
+    distinct, inverse = np.unique(values, return_inverse=True)
+    return np.array([round(value, digits) for value in distinct],
+                    dtype=np.float64)[inverse]
+
+
+def load_accuracy_table(accuracy_fp, accuracy_offsets=(0, 5, 10)):
+    """Read an accuracy table in one pass
+
+       Parameters:
+       -----------
+       accuracy_fp : string
+          filepath of the accuracy table
+       accuracy_offsets : list, optional
+          offsets of the accuracy columns, as passed to
+          suppl_compute_accuracy.py --offsets
+
+       Returns:
+       --------
+       table : AccuracyTable
+          columns of the table
     """
+    accuracy_offsets = list(accuracy_offsets)
+    time_column = _FMEASURE_COLUMN + 1 + len(accuracy_offsets)
+    with open(accuracy_fp, 'U') as accuracy_f:
+        rows = [line.strip().split('\t') for line in accuracy_f
+                if not line.startswith('#') and line.strip()]
+    for row in rows:
+        if len(row) < time_column:
+            raise ValueError("expected %d columns with %d accuracy offsets: "
+                             "%s" % (time_column, len(accuracy_offsets), row))
+
+    names = np.array([row[0] for row in rows], dtype=np.string_)
+    values = np.array([row[_FMEASURE_COLUMN:time_column] for row in rows],
+                      dtype=np.float64).reshape(len(rows),
+                                                len(accuracy_offsets) + 1)
+    times = np.array([row[time_column:time_column + 2]
+                      if len(row) >= time_column + 2 else ['nan', 'nan']
+                      for row in rows],
+                     dtype=np.float64).reshape(len(rows), 2)
+
+    # tools in the order of their first row
+    unique_names, first_rows, codes = np.unique(names, return_index=True,
+                                                return_inverse=True)
+    order = np.argsort(first_rows)
+    tool_codes = np.empty(len(order), dtype=np.int32)
+    tool_codes[order] = np.arange(len(order), dtype=np.int32)
+    return AccuracyTable(tools=[str(name) for name in unique_names[order]],
+                         tool_codes=tool_codes[codes],
+                         fmeasure=values[:, 0],
+                         accuracy=values[:, 1:],
+                         accuracy_offsets=accuracy_offsets,
+                         usertime=times[:, 0],
+                         walltime=times[:, 1])
+
+
+def new_figure():
+    """An Agg figure outside of pyplot, which would keep every figure of a
+       batch open and use the backend chosen by whoever imported it first
+    """
+    # matplotlib is imported when a figure is drawn, so that loading tables
+    # and --help do not pay for it
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def dark2_colors(num_colors):
+    """Colors of the Dark2 qualitative map, which has 3 to 8 colors"""
+    import brewer2mpl
+    return brewer2mpl.get_map('Dark2',
+                              'qualitative',
+                              max(num_colors, 3)).mpl_colors
+
+
+def _plot_offset(table, offset):
+    """New figure of the F-measure vs. the accuracy of each tool of a table
+       at an offset
+    """
+    import matplotlib as mpl
     mpl.rcParams['legend.fontsize'] = 10
     mpl.rcParams['xtick.major.pad']='10'
     mpl.rcParams['ytick.major.pad']='10'
     mpl.rcParams['grid.linestyle'] = "-"
     mpl.rcParams['grid.color'] = "0.7"
-    fig = plt.figure()
+    fig = new_figure()
     ax = fig.add_subplot(111, axisbg='0.97')
 
-    if offset == 0:
-        acc_ind = 10
-    elif offset == 5:
-        acc_ind = 11
-    elif offset == 10:
-        acc_ind = 12
-    else:
-        raise ValueError("%s offset is not allowed" % offset)
+    accuracy = table.accuracy_at(offset)
+    colors = dark2_colors(len(table.tools))
+    for ind, (tool, tool_rows) in enumerate(zip(table.tools,
+                                                table.rows_by_tool())):
+        ax.scatter(accuracy[tool_rows], table.fmeasure[tool_rows],
+                   marker='o', s=60, label=tool, color=colors[ind])
 
-    # count number of tools
-    tools = []
-    with open(accuracy_fp, 'U') as accuracy_f:
-        for line in accuracy_f:
-            if line.startswith('#'):
-                continue
-            line = line.strip().split('\t')
-            tool = line[0]
-            if tool not in tools:
-                tools.append(tool)            
-
-    num_colors = len(tools)
-    colors = brewer2mpl.get_map('Dark2', 
-                                'qualitative', 
-                                num_colors).mpl_colors
-
-    # plot F-measure vs. accuracy
-    tools = []
-    fmeasure_list = []
-    accuracy_list = []
-    proxy_list = []
-    tools_list = []
+    ax.set_xlabel('Normalized Weighted True-Positive Alignment score [0,1]')
+    ax.set_ylabel('F-measure [0,1]')
+    ax.tick_params(labelsize=10)
+    ax.grid(True)
+    return fig
+
+
+def output_filepath(output_template, offset, platform):
+    """Output filepath of the figure of an offset and platform, filling the
+       {offset} and {platform} fields of output_template
+    """
+    return output_template.format(offset=offset,
+                                  platform=platform.replace(' ', '_'))
 
-    with open(accuracy_fp, 'U') as accuracy_f:
-        ind = 0
-        for line in accuracy_f:
-            if line.startswith('#'):
-                continue
-            line = line.strip().split('\t')
-            tool = line[0]
-            fmeasure = float(line[9])
-            accuracy = round(float(line[acc_ind])/100.0, 3)
-            usertime = round(float(line[11]),0)
-            walltime = round(float(line[12]),0)
-            if tool not in tools:
-                # plot existing tool
-                if len(fmeasure_list) > 0:
-                    ax.scatter(accuracy_list, fmeasure_list, marker='o', s=60, label=tools[ind], color=colors[ind])
-                    proxy = plt.Rectangle((0,0), 1, 1, fc=colors[ind])
-                    proxy_list.append(proxy)
-                    tools_list.append(tools[ind])
-                    ind += 1
-                tools.append(tool)
-                # reset points for next tool
-                fmeasure_list = [fmeasure]
-                accuracy_list = [accuracy]
-            else:
-                fmeasure_list.append(fmeasure)
-                accuracy_list.append(accuracy)
-
-        # plot last tool
-        if len(fmeasure_list) > 0:
-            ax.scatter(accuracy_list, fmeasure_list, marker='o', s=60, label=tools[ind], color=colors[ind])
-            proxy = plt.Rectangle((0,0), 1, 1, fc=colors[ind])
-            proxy_list.append(proxy)
-            tools_list.append(tools[ind])
-
-        #ax.xaxis._axinfo['label']['space_factor'] = 1.9
-        #ax.yaxis._axinfo['label']['space_factor'] = 1.9
-        ax.set_xlabel('Normalized Weighted True-Positive Alignment score [0,1]')
-        ax.set_ylabel('F-measure [0,1]')
-        zed = [tick.label.set_fontsize(10) for tick in ax.yaxis.get_major_ticks()]
-        zed = [tick.label.set_fontsize(10) for tick in ax.xaxis.get_major_ticks()]
-
-        #legend
-        #lgd = ax.legend(proxy_list, tools_list, bbox_to_anchor=(1.3, 0.9), borderaxespad=0.5)
-        #plt.savefig(output_acc_fp, bbox_extra_artists=(lgd,), bbox_inches='tight', pad_inches=0.8)
-        plt.grid()
-        plt.savefig(output_acc_fp)
 
+def render_figures(tables, output_template, offsets):
+    """Render the figure of every table at every offset, from one load of
+       each table
+
+       Parameters:
+       -----------
+       tables : list
+          (platform, AccuracyTable) of each table
+       output_template : string
+          output filepath, with {offset} and {platform} fields when several
+          figures are rendered
+       offsets : list
+          offsets to render
+
+       Returns:
+       --------
+       output_fps : list
+          filepath of each figure written
+    """
+    output_fps = [output_filepath(output_template, offset, platform)
+                  for platform, table in tables for offset in offsets]
+    if len(set(output_fps)) < len(output_fps):
+        raise ValueError("%s must have {offset} and {platform} fields to name "
+                         "%d figures" % (output_template, len(output_fps)))
+    for platform, table in tables:
+        for offset in offsets:
+            if offset not in table.accuracy_offsets:
+                raise ValueError("%s offset is not allowed" % offset)
+
+    output_fps = iter(output_fps)
+    written = []
+    for platform, table in tables:
+        for offset in offsets:
+            # a new figure for each offset, since the limits of axes that
+            # were drawn once are not those of new axes
+            output_fp = next(output_fps)
+            _plot_offset(table, offset).savefig(output_fp)
+            written.append(output_fp)
+    return written
+
+
+def graph_accuracy(accuracy_fp,
+                   output_acc_fp,
+                   offset=0,
+                   platform="Illumina",
+                   accuracy_offsets=(0, 5, 10)):
+    """
+    """
+    table = load_accuracy_table(accuracy_fp, accuracy_offsets)
+    render_figures([(platform, table)], output_acc_fp, [offset])
 
 
 @click.command()
@@ -113,24 +253,47 @@ def graph_accuracy(accuracy_fp,
 @click.argument('output_acc_fp', required=True,
                 type=click.Path(resolve_path=True, readable=True, exists=False,
                                 file_okay=True))
-@click.option('--offset', required=False, type=int, default=0, show_default=True,
-              help="Maximum difference between expected alignment position and observed")
+@click.option('--offset', required=False, type=int, default=None,
+              help="Maximum difference between expected alignment position and observed [default: 0]")
+@click.option('--offsets', required=False, type=str, default=None,
+              help="comma-separated offsets (or ranges, e.g. 0-10) to render one "
+                   "figure each, named by the {offset} field of output_acc_fp")
+@click.option('--accuracy_offsets', required=False, type=str, default='0,5,10',
+              show_default=True,
+              help="offsets of the accuracy columns in accuracy_fp, as passed to "
+                   "suppl_compute_accuracy.py --offsets")
 @click.option('--platform', required=False, type=str, default='Illumina', show_default=True,
               help="platform can be Illumina, Roche 454 or Ion Torrent PGM")
-def _main(accuracy_fp, output_acc_fp, offset, platform):
+@click.option('--table', 'tables', required=False, multiple=True,
+              type=(str, click.Path(resolve_path=True, readable=True,
+                                    exists=True, file_okay=True)),
+              help="platform and accuracy table of another platform to render, "
+                   "named by the {platform} field of output_acc_fp (repeatable)")
+def _main(accuracy_fp, output_acc_fp, offset, offsets, accuracy_offsets, platform,
+          tables):
     """
     """
+    platforms = [platform] + [table_platform for table_platform, _ in tables]
+    for table_platform in platforms:
+        if table_platform not in PLATFORMS:
+            raise ValueError("%s can only be one of Illumina, Roche 454 or Ion Torrent PGM" % table_platform)
 
-    if platform not in ["Illumina", "Roche 454", "Ion Torrent PGM"]:
-        raise ValueError("%s can only be one of Illumina, Roche 454 or Ion Torrent PGM" % platform)
+    if offsets is not None:
+        if offset is not None:
+            raise ValueError("--offset and --offsets are mutually exclusive")
+        offsets = parse_offsets(offsets)
+    elif offset is not None:
+        offsets = [offset]
+    else:
+        offsets = [0]
 
-    graph_accuracy(accuracy_fp=accuracy_fp,
-                   output_acc_fp=output_acc_fp,
-                   offset=offset,
-                   platform=platform)
+    accuracy_offsets = parse_offsets(accuracy_offsets)
+    render_figures([(table_platform, load_accuracy_table(table_fp,
+                                                         accuracy_offsets))
+                    for table_platform, table_fp in
+                    [(platform, accuracy_fp)] + list(tables)],
+                   output_acc_fp, offsets)
 
 
 if __name__ == "__main__":
     _main()
-                
-                
@@ -1,127 +1,209 @@
 #!/usr/bin/python
 
+"""Plot the F-measure vs. the accuracy score vs. the run time of tools from
+   an accuracy table (rows of batch_compute_accuracy.py with user and wall
+   time columns)
+   usage: python graph_accuracy_3d.py accuracy.txt accuracy.png [--offset 0 --time Walltime]
+          python graph_accuracy_3d.py accuracy.txt 'accuracy_{platform}_{offset}_{time}.png' \
+              --offsets 0,5,10 --times Walltime,Usertime \
+              [--table 'Roche 454' accuracy_454.txt] [--processes 4]
+
+   Each table is loaded once, and every (platform, offset, time) variant is
+   rendered into the output file named by the {platform}, {offset} and
+   {time} fields of the output filepath, by a pool of processes which
+   share the loaded tables and each draw on their own Agg canvas.
+"""
+
+from multiprocessing import Pool
+
 import click
-import matplotlib as mpl
-from mpl_toolkits.mplot3d import Axes3D
-mpl.use('Agg')
 import numpy as np
-import  matplotlib.pyplot as plt
-import matplotlib.cm as cm
-from os.path import join, exists
-import glob
-import brewer2mpl
 
+from graph_accuracy import (PLATFORMS, dark2_colors, load_accuracy_table,
+                            new_figure, rounded)
+from offsets import parse_offsets
 
-def graph_accuracy(accuracy_fp,
-                   output_acc_fp,
-                   output_walltime_fp,
-                   output_usertime_fp,
-                   offset=0,
-                   time="Walltime",
-                   platform="Illumina"):
+
+TIMES = ["Walltime", "Usertime"]
+
+# tables shared with the worker processes, which are forked after they are
+# loaded so that they are not pickled for each variant
+_tables = None
+
+
+def variant_filepath(output_template, platform, offset, time):
+    """Output filepath of a variant, filling the {platform}, {offset} and
+       {time} fields of output_template
     """
+    return output_template.format(platform=platform.replace(' ', '_'),
+                                  offset=offset, time=time)
+
+
+def render_variant(table, output_fp, offset=0, time="Walltime"):
+    """Render the figure of a table at an offset with the wall or user time
+       as z-axis
+
+       Parameters:
+       -----------
+       table : AccuracyTable
+          accuracy table with time columns
+       output_fp : string
+          filepath of the figure
+       offset : integer, optional
+          offset of the accuracy score
+       time : string, optional
+          z-axis, Walltime or Usertime
     """
+    if time not in TIMES:
+        raise ValueError("%s is not an option of --time" % time)
+    import matplotlib as mpl
+    from matplotlib.patches import Rectangle
+    # registers the 3d projection
+    from mpl_toolkits.mplot3d import Axes3D
+
     mpl.rcParams['legend.fontsize'] = 10
-    fig = plt.figure()
+    # each process draws on its own Agg canvas
+    fig = new_figure()
     ax = fig.add_subplot(111, projection='3d')
 
-    if offset == 0:
-        acc_ind = 10
-    elif offset == 5:
-        acc_ind = 11
-    elif offset == 10:
-        acc_ind = 12
-    else:
-        raise ValueError("%s offset is not allowed" % offset)
-
-    # count number of tools
-    tools = []
-    with open(accuracy_fp, 'U') as accuracy_f:
-        for line in accuracy_f:
-            if line.startswith('#'):
-                continue
-            line = line.strip().split('\t')
-            tool = line[0]
-            if tool not in tools:
-                tools.append(tool)            
-
-    num_colors = len(tools)
-    colors = brewer2mpl.get_map('Dark2', 
-                                'qualitative', 
-                                num_colors).mpl_colors
-
-    # plot F-measure vs. accuracy vs. usertime
-    tools = []
-    fmeasure_list = []
-    accuracy_list = []
-    usertime_list = []
-    walltime_list = []
+    accuracy = table.accuracy_at(offset)
+    times = rounded(table.walltime if time == "Walltime" else table.usertime,
+                    0)
+    if np.isnan(times).any():
+        raise ValueError("the accuracy table has no user and wall time "
+                         "columns")
+
+    colors = dark2_colors(len(table.tools))
+
+    # plot F-measure vs. accuracy vs. time
     proxy_list = []
-    tools_list = []
-
-    with open(accuracy_fp, 'U') as accuracy_f:
-        ind = 0
-        for line in accuracy_f:
-            if line.startswith('#'):
-                continue
-            line = line.strip().split('\t')
-            tool = line[0]
-            fmeasure = float(line[9])
-            # 10: offset 0; 11: offset 5; 12: offset 10
-            accuracy = round(float(line[acc_ind])/100.0, 3)
-            usertime = round(float(line[13]),0)
-            walltime = round(float(line[14]),0)
-
-            if tool not in tools:
-                # plot existing tool
-                if len(fmeasure_list) > 0:
-                    if time == "Walltime":
-                        time_list = walltime_list
-                    else:
-                        time_list = usertime_list
-                    ax.scatter(accuracy_list, fmeasure_list, time_list, marker='o', s=60, label=tools[ind], color=colors[ind])
-                    proxy = plt.Rectangle((0,0), 1, 1, fc=colors[ind])
-                    proxy_list.append(proxy)
-                    tools_list.append(tools[ind])
-                    ind += 1
-                tools.append(tool)
-                # reset points for next tool
-                fmeasure_list = [fmeasure]
-                accuracy_list = [accuracy]
-                walltime_list = [walltime]
-                usertime_list = [usertime]
-            else:
-                fmeasure_list.append(fmeasure)
-                accuracy_list.append(accuracy)
-                walltime_list.append(walltime)
-                usertime_list.append(usertime)
-
-        # plot last tool
-        if len(fmeasure_list) > 0:
-            if time == "Walltime":
-                time_list = walltime_list
-            else:
-                time_list = usertime_list
-            ax.scatter(accuracy_list, fmeasure_list, time_list, marker='o', s=60, label=tools[ind], color=colors[ind])
-            proxy = plt.Rectangle((0,0), 1, 1, fc=colors[ind])
-            proxy_list.append(proxy)
-            tools_list.append(tools[ind])
-
-        ax.xaxis._axinfo['label']['space_factor'] = 1.9
-        ax.yaxis._axinfo['label']['space_factor'] = 1.9
-        ax.zaxis._axinfo['label']['space_factor'] = 1.9
-        ax.set_xlabel('Normalized Weighted True-Positive Alignment score [0,1]')
-        ax.set_ylabel('F-measure [0,1]')
-        ax.set_zlabel('%s (sec)' % time)
-        zed = [tick.label.set_fontsize(10) for tick in ax.yaxis.get_major_ticks()]
-        zed = [tick.label.set_fontsize(10) for tick in ax.xaxis.get_major_ticks()]
-        zed = [tick.label.set_fontsize(10) for tick in ax.zaxis.get_major_ticks()]
-        ax.set_zlim(0)
-
-        #legend
-        lgd = ax.legend(proxy_list, tools_list, bbox_to_anchor=(0.1, 0.9), borderaxespad=0.5)
-        plt.savefig(output_acc_fp, bbox_extra_artists=(lgd,), bbox_inches='tight', pad_inches=0.8)
-        #plt.show()
+    for ind, (tool, tool_rows) in enumerate(zip(table.tools,
+                                                table.rows_by_tool())):
+        ax.scatter(accuracy[tool_rows], table.fmeasure[tool_rows],
+                   times[tool_rows], marker='o', s=60, label=tool,
+                   color=colors[ind])
+        proxy_list.append(Rectangle((0,0), 1, 1, fc=colors[ind]))
+
+    ax.xaxis._axinfo['label']['space_factor'] = 1.9
+    ax.yaxis._axinfo['label']['space_factor'] = 1.9
+    ax.zaxis._axinfo['label']['space_factor'] = 1.9
+    ax.set_xlabel('Normalized Weighted True-Positive Alignment score [0,1]')
+    ax.set_ylabel('F-measure [0,1]')
+    ax.set_zlabel('%s (sec)' % time)
+    zed = [tick.label.set_fontsize(10) for tick in ax.yaxis.get_major_ticks()]
+    zed = [tick.label.set_fontsize(10) for tick in ax.xaxis.get_major_ticks()]
+    zed = [tick.label.set_fontsize(10) for tick in ax.zaxis.get_major_ticks()]
+    ax.set_zlim(0)
+
+    #legend
+    lgd = ax.legend(proxy_list, table.tools, bbox_to_anchor=(0.1, 0.9), borderaxespad=0.5)
+    fig.savefig(output_fp, bbox_extra_artists=(lgd,), bbox_inches='tight', pad_inches=0.8)
+
+
+def _forget_fonts():
+    """Drop the fonts a worker process inherits from its parent (initializer
+       of the pool)
+
+       Fonts opened before the fork read their font file through the file
+       offset of the parent, which concurrent workers move under each
+       other, misplacing some labels. The worker opens its own fonts on
+       first use. matplotlib has no public call to drop its font cache, so
+       the private cache of this version (RendererAgg._fontd) or of newer
+       ones (font_manager._get_font) is cleared when it exists; newer
+       matplotlib also clear it after a fork themselves.
+    """
+    from matplotlib import font_manager
+    from matplotlib.backends.backend_agg import RendererAgg
+    for name in ['_get_font', 'get_font']:
+        cache_clear = getattr(getattr(font_manager, name, None),
+                              'cache_clear', None)
+        if cache_clear is not None:
+            cache_clear()
+    fonts = getattr(RendererAgg, '_fontd', None)
+    if fonts is not None:
+        fonts.clear()
+
+
+def _render_variant_star(args):
+    table_index, output_fp, offset, time = args
+    render_variant(_tables[table_index], output_fp, offset, time)
+    return output_fp
+
+
+def render_variants(tables, output_template, offsets, times=("Walltime",),
+                    processes=1):
+    """Render every (platform, offset, time) variant of loaded tables in
+       parallel processes
+
+       Parameters:
+       -----------
+       tables : list
+          (platform, AccuracyTable) of each table
+       output_template : string
+          output filepath, with {platform}, {offset} and {time} fields when
+          several variants are rendered
+       offsets : list
+          offsets to render
+       times : list, optional
+          z-axes to render, Walltime and/or Usertime
+       processes : integer, optional
+          number of worker processes
+
+       Returns:
+       --------
+       output_fps : list
+          filepath of each figure written, in the order of tables, offsets
+          and times
+    """
+    global _tables
+    tasks = [(table_index, variant_filepath(output_template, platform,
+                                            offset, time), offset, time)
+             for table_index, (platform, table) in enumerate(tables)
+             for offset in offsets for time in times]
+    output_fps = [task[1] for task in tasks]
+    if len(set(output_fps)) < len(output_fps):
+        raise ValueError("%s must have {platform}, {offset} and {time} fields "
+                         "to name %d figures" % (output_template,
+                                                 len(output_fps)))
+    for platform, table in tables:
+        for offset in offsets:
+            if offset not in table.accuracy_offsets:
+                raise ValueError("%s offset is not allowed" % offset)
+    for time in times:
+        if time not in TIMES:
+            raise ValueError("%s is not an option of --time" % time)
+
+    _tables = [table for platform, table in tables]
+    try:
+        if processes == 1 or len(tasks) == 1:
+            return map(_render_variant_star, tasks)
+        pool = Pool(min(processes, len(tasks)), initializer=_forget_fonts)
+        try:
+            return pool.map(_render_variant_star, tasks, chunksize=1)
+        finally:
+            pool.terminate()
+    finally:
+        _tables = None
+
+
+def graph_accuracy(accuracy_fp,
+                   output_acc_fp,
+                   output_walltime_fp=None,
+                   output_usertime_fp=None,
+                   offset=0,
+                   time="Walltime",
+                   platform="Illumina",
+                   accuracy_offsets=(0, 5, 10)):
+    """Render output_acc_fp with the time z-axis, and the Walltime and
+       Usertime figures into output_walltime_fp and output_usertime_fp when
+       given, from one load of the accuracy table
+    """
+    table = load_accuracy_table(accuracy_fp, accuracy_offsets)
+    render_variant(table, output_acc_fp, offset, time)
+    for time_fp, fp_time in [(output_walltime_fp, "Walltime"),
+                             (output_usertime_fp, "Usertime")]:
+        if time_fp is not None:
+            render_variant(table, time_fp, offset, fp_time)
 
 
 @click.command()
@@ -137,32 +219,68 @@ def graph_accuracy(accuracy_fp,
 @click.argument('output_usertime_fp', required=False,
                 type=click.Path(resolve_path=True, readable=True, exists=False,
                                 file_okay=True))
-@click.option('--offset', required=False, type=int, default=0, show_default=True,
-              help="Maximum difference between expected alignment position and observed")
-@click.option('--time', required=False, type=str, default='Walltime', show_default=True,
-              help="z-axis is Walltime or Usertime")
+@click.option('--offset', required=False, type=int, default=None,
+              help="Maximum difference between expected alignment position and observed [default: 0]")
+@click.option('--offsets', required=False, type=str, default=None,
+              help="comma-separated offsets (or ranges, e.g. 0-10) to render, "
+                   "named by the {offset} field of output_acc_fp")
+@click.option('--time', required=False, type=str, default=None,
+              help="z-axis is Walltime or Usertime [default: Walltime]")
+@click.option('--times', required=False, type=str, default=None,
+              help="comma-separated z-axes to render (Walltime,Usertime), named "
+                   "by the {time} field of output_acc_fp")
+@click.option('--accuracy_offsets', required=False, type=str, default='0,5,10',
+              show_default=True,
+              help="offsets of the accuracy columns in accuracy_fp, as passed to "
+                   "suppl_compute_accuracy.py --offsets")
 @click.option('--platform', required=False, type=str, default='Illumina', show_default=True,
               help="platform can be Illumina, Roche 454 or Ion Torrent PGM")
-def _main(accuracy_fp, output_acc_fp, output_walltime_fp, output_usertime_fp, offset, time, platform):
+@click.option('--table', 'tables', required=False, multiple=True,
+              type=(str, click.Path(resolve_path=True, readable=True,
+                                    exists=True, file_okay=True)),
+              help="platform and accuracy table of another platform to render, "
+                   "named by the {platform} field of output_acc_fp (repeatable)")
+@click.option('--processes', type=int, default=1, show_default=True,
+              help="number of figures rendered in parallel")
+def _main(accuracy_fp, output_acc_fp, output_walltime_fp, output_usertime_fp, offset, offsets,
+          time, times, accuracy_offsets, platform, tables, processes):
     """
     """
+    if time is not None and times is not None:
+        raise ValueError("--time and --times are mutually exclusive")
+    times = times.split(',') if times is not None else [time or "Walltime"]
+    for variant_time in times:
+        if variant_time not in TIMES:
+            raise ValueError("%s is not an option of --time" % variant_time)
 
-    if time not in ["Walltime", "Usertime"]:
-        raise ValueError("%s is not an option of --time" % time)
+    platforms = [platform] + [table_platform for table_platform, _ in tables]
+    for table_platform in platforms:
+        if table_platform not in PLATFORMS:
+            raise ValueError("%s can only be one of Illumina, Roche 454 or Ion Torrent PGM" % table_platform)
+
+    if offsets is not None:
+        if offset is not None:
+            raise ValueError("--offset and --offsets are mutually exclusive")
+        offsets = parse_offsets(offsets)
+    elif offset is not None:
+        offsets = [offset]
+    else:
+        offsets = [0]
 
-    if platform not in ["Illumina", "Roche 454", "Ion Torrent PGM"]:
-        raise ValueError("%s can only be one of Illumina, Roche 454 or Ion Torrent PGM" % platform)
+    accuracy_offsets = parse_offsets(accuracy_offsets)
+    loaded = [(table_platform, load_accuracy_table(table_fp,
+                                                   accuracy_offsets))
+              for table_platform, table_fp in
+              [(platform, accuracy_fp)] + list(tables)]
+    render_variants(loaded, output_acc_fp, offsets, times, processes)
 
-    graph_accuracy(accuracy_fp=accuracy_fp,
-                   output_acc_fp=output_acc_fp,
-                   output_walltime_fp=output_walltime_fp,
-                   output_usertime_fp=output_usertime_fp,
-                   offset=offset,
-                   time=time,
-                   platform=platform)
+    # the figures of the single table, offset and time of the original
+    # arguments
+    for time_fp, fp_time in [(output_walltime_fp, "Walltime"),
+                             (output_usertime_fp, "Usertime")]:
+        if time_fp is not None:
+            render_variant(loaded[0][1], time_fp, offsets[0], fp_time)
 
 
 if __name__ == "__main__":
     _main()
-                
-                
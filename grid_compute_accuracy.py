@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+
+"""Compute the accuracy tables of a grid of tools and platforms, caching the
+   result of each cell by the content of its inputs
+   usage: python grid_compute_accuracy.py grid.txt 'accuracy_{platform}.txt' \
+              [--offsets 0,5,10] [--processes 4] [--cache_dir DIR]
+
+   Each line of grid.txt describes one platform (tab-separated):
+      platform  ground_truth_fp  total_reads  tools_fp
+   where tools_fp lists the tool runs of the platform as read by
+   batch_compute_accuracy.py. Relative filepaths are relative to the
+   directory of the file listing them. A cell is one tool run of a platform,
+   evaluated at every offset of --offsets.
+
+   The results of a cell are cached in --cache_dir under a key made of the
+   MD5 digests of its ground-truth and observed alignments and of its
+   parameters (file format, total reads and offsets), so that a cell is
+   only evaluated again when one of them changes. The cells left to
+   evaluate are grouped by ground truth, loaded once per group and shared
+   with the worker processes evaluating its cells. The accuracy table of
+   each platform is written into the output file named by the {platform}
+   field of the output filepath, in the layout read by graph_accuracy.py
+   (--table platform accuracy_platform.txt).
+"""
+
+import hashlib
+import json
+import os
+import sys
+from collections import OrderedDict
+from tempfile import mkstemp
+
+import click
+
+from batch_compute_accuracy import batch_evaluate_runs, parse_tools
+from graph_accuracy import PLATFORMS
+from offsets import parse_offsets
+from suppl_compute_accuracy import _cache_mode, GROUND_TRUTH_CACHE_SUFFIX
+
+
+# version of the results of a cell, part of its cache key so that results of
+# an older evaluation are not reused
+CELL_VERSION = 1
+# file of the digests of the inputs in the cache directory, by filepath,
+# size and modification time, so that unchanged inputs are not read again
+_DIGESTS_FILE = 'digests.json'
+_RESULT_SUFFIX = '.result'
+
+
+def _resolve(fp, spec_fp):
+    """Absolute path of a filepath read from a spec file, relative paths
+       being relative to the directory of the spec file
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(spec_fp)),
+                        os.path.expanduser(fp))
+
+
+def parse_grid(grid_fp):
+    """Parses the platforms of a grid and their tool runs
+
+       Relative filepaths are relative to the directory of the file listing
+       them (the grid or a tools file), so that a grid finds the same inputs
+       wherever it is run from.
+
+       Returns:
+       --------
+       platforms : list
+          (platform, ground_truth_fp, total_reads, tool runs) tuples, the
+          tool runs as returned by parse_tools
+    """
+    platforms = []
+    with open(grid_fp, 'U') as grid_f:
+        for line in grid_f:
+            if not line.strip() or line.startswith('#'):
+                continue
+            line = line.rstrip('\n').split('\t')
+            if len(line) != 4:
+                raise ValueError("expected platform, ground truth, total "
+                                 "reads and tools: %s" % line)
+            platform, ground_truth_fp, total_reads, tools_fp = line
+            if platform not in PLATFORMS:
+                raise ValueError("%s can only be one of Illumina, Roche 454 "
+                                 "or Ion Torrent PGM" % platform)
+            if platform in [p[0] for p in platforms]:
+                raise ValueError("%s is listed twice" % platform)
+            tools_fp = _resolve(tools_fp, grid_fp)
+            tools = [(tool, parameters, _resolve(observed_alns_fp, tools_fp),
+                      file_format, extra)
+                     for tool, parameters, observed_alns_fp, file_format, extra
+                     in parse_tools(tools_fp)]
+            platforms.append((platform, _resolve(ground_truth_fp, grid_fp),
+                              int(total_reads), tools))
+    return platforms
+
+
+class ResultCache(object):
+    """Results of cells in a directory, one file per cell named by its key
+
+       Parameters:
+       -----------
+       cache_dir : string
+          directory of the cache, created if missing
+    """
+
+    def __init__(self, cache_dir):
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        self.cache_dir = cache_dir
+        self._digests_fp = os.path.join(cache_dir, _DIGESTS_FILE)
+        try:
+            with open(self._digests_fp) as digests_f:
+                self._digests = json.load(digests_f)
+        except (IOError, ValueError):
+            self._digests = {}
+
+    def digest(self, fp):
+        """MD5 digest of the content of a file, read again only when its
+           size or modification time changed
+        """
+        stat = os.stat(fp)
+        fp = os.path.abspath(fp)
+        known = self._digests.get(fp)
+        if known is not None and known[:2] == [stat.st_size, stat.st_mtime]:
+            return known[2]
+        md5 = hashlib.md5()
+        with open(fp, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                md5.update(chunk)
+        self._digests[fp] = [stat.st_size, stat.st_mtime, md5.hexdigest()]
+        return md5.hexdigest()
+
+    def key(self, ground_truth_fp, observed_alns_fp, file_format,
+            total_reads, offsets):
+        """Key of the results of a cell"""
+        return hashlib.sha1(json.dumps(
+            [CELL_VERSION, self.digest(ground_truth_fp),
+             self.digest(observed_alns_fp), file_format, total_reads,
+             list(offsets)])).hexdigest()
+
+    def get(self, key):
+        """Cached results of a key, None if they are not cached"""
+        try:
+            with open(os.path.join(self.cache_dir,
+                                   key + _RESULT_SUFFIX)) as result_f:
+                return result_f.read()
+        except IOError:
+            return None
+
+    def put(self, key, result):
+        """Cache the results of a key, replacing its file at once"""
+        self._write(os.path.join(self.cache_dir, key + _RESULT_SUFFIX),
+                    result)
+
+    def save_digests(self):
+        self._write(self._digests_fp, json.dumps(self._digests,
+                                                 sort_keys=True))
+
+    def _write(self, fp, data):
+        f, tmp_fp = mkstemp(prefix='.result_', dir=self.cache_dir)
+        try:
+            with os.fdopen(f, 'w') as tmp_f:
+                tmp_f.write(data)
+            os.rename(tmp_fp, fp)
+        except:
+            os.remove(tmp_fp)
+            raise
+
+
+def grid_compute_accuracy(platforms, cache_dir, offsets=(0, 5, 10),
+                          processes=1, cache="auto"):
+    """Compute the accuracy table of each platform of a grid, evaluating
+       only the cells missing from the result cache
+
+       Parameters:
+       -----------
+       platforms : list
+          platforms of the grid, as returned by parse_grid
+       cache_dir : string
+          directory of the result cache
+       offsets : list, optional
+          offsets to compute the accuracy score for
+       processes : integer, optional
+          number of worker processes evaluating the cells of a ground truth
+       cache : string, optional
+          cache mode of the ground truths (see load_ground_truth)
+
+       Returns:
+       --------
+       tables : list
+          (platform, rows) of each platform, the rows of the accuracy table
+          in the order of its tool runs
+       counts : dict
+          number of cells read from the cache (cached) and evaluated
+    """
+    result_cache = ResultCache(cache_dir)
+    # the cells of each ground truth left to evaluate, by cache key
+    pending = OrderedDict()
+    keys = []
+    for platform, ground_truth_fp, total_reads, tools in platforms:
+        platform_keys = []
+        for tool, parameters, observed_alns_fp, file_format, extra in tools:
+            key = result_cache.key(ground_truth_fp, observed_alns_fp,
+                                   file_format, total_reads, offsets)
+            platform_keys.append(key)
+            if result_cache.get(key) is None:
+                pending.setdefault(ground_truth_fp, OrderedDict())[key] = \
+                    (observed_alns_fp, file_format, total_reads)
+        keys.append(platform_keys)
+    result_cache.save_digests()
+
+    evaluated = 0
+    for ground_truth_fp, runs in pending.iteritems():
+        for key, result in zip(runs, batch_evaluate_runs(
+                ground_truth_fp, runs.values(), offsets=offsets,
+                processes=processes, cache=cache)):
+            result_cache.put(key, result)
+            evaluated += 1
+
+    tables = []
+    for (platform, ground_truth_fp, total_reads, tools), platform_keys in \
+            zip(platforms, keys):
+        tables.append((platform, [
+            "%s\t%s\t%s%s\n" % (tool, parameters, result_cache.get(key),
+                                "\t".join(extra))
+            for (tool, parameters, observed_alns_fp, file_format, extra), key
+            in zip(tools, platform_keys)]))
+    return tables, {'cached': len(set(sum(keys, []))) - evaluated,
+                    'evaluated': evaluated}
+
+
+def table_filepath(output_template, platform):
+    """Output filepath of the table of a platform, filling the {platform}
+       field of output_template
+    """
+    return output_template.format(platform=platform.replace(' ', '_'))
+
+
+@click.command()
+@click.argument('grid_fp', required=True,
+                type=click.Path(resolve_path=True, readable=True, exists=True,
+                                file_okay=True))
+@click.argument('output_fp', required=True,
+                type=click.Path(resolve_path=True, writable=True,
+                                file_okay=True))
+@click.option('--offsets', type=str, default='0,5,10', show_default=True,
+              help='comma-separated offsets (or ranges, e.g. 0-50) to output '
+                   'one accuracy column each')
+@click.option('--processes', type=int, default=1, show_default=True,
+              help='number of cells evaluated in parallel')
+@click.option('--cache_dir', required=False,
+              type=click.Path(resolve_path=True, file_okay=False),
+              help='directory of the cached results of the cells [default: '
+                   '.accuracy_cache next to grid_fp]')
+@click.option('--no_cache', is_flag=True, default=False, show_default=True,
+              help='parse the ground truths without reading or writing '
+                   'their binary cache (%s)' % GROUND_TRUTH_CACHE_SUFFIX)
+@click.option('--rebuild_cache', is_flag=True, default=False, show_default=True,
+              help='parse the ground truths and overwrite their binary cache')
+def _main(grid_fp, output_fp, offsets, processes, cache_dir, no_cache,
+          rebuild_cache):
+    """
+    """
+    platforms = parse_grid(grid_fp)
+    if len(platforms) > 1 and \
+            len(set(table_filepath(output_fp, platform)
+                    for platform, _, _, _ in platforms)) < len(platforms):
+        raise ValueError("%s must have a {platform} field to name %d tables"
+                         % (output_fp, len(platforms)))
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(grid_fp), '.accuracy_cache')
+
+    tables, counts = grid_compute_accuracy(
+        platforms, cache_dir, offsets=parse_offsets(offsets),
+        processes=processes, cache=_cache_mode(no_cache, rebuild_cache))
+    for platform, rows in tables:
+        with open(table_filepath(output_fp, platform), 'w') as output_f:
+            output_f.writelines(rows)
+    sys.stderr.write("%d cells: %d cached, %d evaluated\n"
+                     % (counts['cached'] + counts['evaluated'],
+                        counts['cached'], counts['evaluated']))
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+
+"""Parse the offsets of the accuracy scores given on the command line, kept
+   apart from suppl_compute_accuracy.py so that the plotting scripts do not
+   import the scoring code to read them
+"""
+
+
+def parse_offsets(offsets):
+    """Parse a comma-separated list of offsets, where "a-b" stands for every
+       offset from a to b, e.g. "0,5,10" or "0-50"
+    """
+    parsed = []
+    for field in offsets.split(','):
+        if '-' in field:
+            first, last = field.split('-')
+            parsed.extend(range(int(first), int(last) + 1))
+        else:
+            parsed.append(int(field))
+    return parsed
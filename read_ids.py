@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+
+"""Code read ids as dense integers, so that the reads of the ground truth
+   and of observed alignments are matched with NumPy arrays rather than
+   dictionaries of strings
+
+   A ReadIdCodec gives each read id of a set (e.g. the reads of the ground
+   truth) the code of its position, an int32, and codes unknown read ids
+   -1. Read ids made of a common prefix and a fixed number of digits, as
+   written by read simulators (seq.000000828), are coded from their number
+   through a lookup table (or a sorted array when the numbers are sparse)
+   instead of a dictionary: a few bytes per read in place of a string and
+   a dictionary entry, and whole arrays of read ids are coded at once.
+
+   A ReadSample selects a fraction of read ids by the MD5 digest of the
+   read id and a seed, so that files of the same reads (e.g. ground-truth
+   and observed alignments) are sampled alike without reading one another.
+"""
+
+import hashlib
+import struct
+from itertools import izip
+
+import numpy as np
+
+
+# numbers are held as int64, which hold 18 digits
+_MAX_DIGITS = 18
+# the lookup table of numbers is used while it holds at most this many
+# entries per read id (int32 each), the sorted numbers otherwise
+_MAX_TABLE_RATIO = 4
+
+
+class ReadIdCodec(object):
+    """Dense int32 codes of a set of unique read ids
+
+       Parameters:
+       -----------
+       read_ids : sequence
+          read ids (list or NumPy string array), coded by their position
+    """
+
+    def __init__(self, read_ids):
+        self._read_ids = read_ids
+        self._index = None
+        self._prefix = None
+        self._table = None
+        self._sorted_numbers = None
+        self._sorted_codes = None
+        ids = _string_array(read_ids)
+        numbers = None
+        if len(ids):
+            prefix = ids[0].rstrip('0123456789')
+            numbers = _numbers(ids, prefix,
+                               ids.dtype.itemsize - len(prefix))
+        if numbers is None or (numbers < 0).any():
+            self._index = dict(izip(_tolist(read_ids), xrange(len(ids))))
+            return
+        self._prefix = prefix
+        self._width = ids.dtype.itemsize - len(prefix)
+        codes = np.arange(len(numbers), dtype=np.int32)
+        if numbers.max() < _MAX_TABLE_RATIO * len(numbers) + 1024:
+            self._table = _unknown(int(numbers.max()) + 1)
+            self._table[numbers] = codes
+        else:
+            order = np.argsort(numbers, kind='mergesort')
+            self._sorted_numbers = numbers[order]
+            self._sorted_codes = codes[order]
+
+    @classmethod
+    def from_index(cls, index):
+        """Codec of a dictionary of codes by read id, which is used as is"""
+        codec = cls.__new__(cls)
+        codec._read_ids = None
+        codec._index = index
+        codec._prefix = None
+        return codec
+
+    @property
+    def numeric(self):
+        """Whether read ids are coded from their number"""
+        return self._prefix is not None
+
+    @property
+    def read_ids(self):
+        """Read ids, indexed by code"""
+        if self._read_ids is None:
+            read_ids = [None] * len(self._index)
+            for read_id, code in self._index.iteritems():
+                read_ids[code] = read_id
+            self._read_ids = read_ids
+        return self._read_ids
+
+    def __len__(self):
+        if self._index is not None:
+            return len(self._index)
+        return len(self._read_ids)
+
+    def __contains__(self, read_id):
+        return self.code(read_id) >= 0
+
+    def __iter__(self):
+        return iter(_tolist(self.read_ids))
+
+    def code(self, read_id):
+        """Code of a read id, -1 if it is not in the set"""
+        if self._index is not None:
+            return self._index.get(read_id, -1)
+        digits = read_id[len(self._prefix):]
+        if (len(digits) != self._width or not digits.isdigit() or
+                not read_id.startswith(self._prefix)):
+            return -1
+        return int(self._lookup(np.array([int(digits)], dtype=np.int64))[0])
+
+    def encode(self, read_ids):
+        """Codes of a sequence of read ids
+
+           Parameters:
+           -----------
+           read_ids : sequence
+              read ids (any iterable, e.g. the keys of a dictionary, or a
+              NumPy string array)
+
+           Returns:
+           --------
+           codes : numpy array (int32)
+              code of each read id, -1 for read ids not in the set
+        """
+        if self._index is not None:
+            index = self._index
+            return np.fromiter((index.get(read_id, -1) for read_id in read_ids),
+                               dtype=np.int32)
+        ids = _string_array(read_ids)
+        if not len(ids):
+            return np.zeros(0, dtype=np.int32)
+        numbers = _numbers(ids, self._prefix, self._width)
+        codes = _unknown(len(ids))
+        if numbers is not None:
+            known = numbers >= 0
+            codes[known] = self._lookup(numbers[known])
+        return codes
+
+    def _lookup(self, numbers):
+        """Codes of read numbers, -1 for numbers not in the set"""
+        if self._table is not None:
+            codes = _unknown(len(numbers))
+            in_table = numbers < len(self._table)
+            codes[in_table] = self._table[numbers[in_table]]
+            return codes
+        found = np.searchsorted(self._sorted_numbers, numbers)
+        found[found == len(self._sorted_numbers)] = 0
+        return np.where(self._sorted_numbers[found] == numbers,
+                        self._sorted_codes[found], -1).astype(np.int32)
+
+
+def _unknown(size):
+    """Array of size codes of unknown read ids"""
+    codes = np.empty(size, dtype=np.int32)
+    codes.fill(-1)
+    return codes
+
+
+def _tolist(read_ids):
+    return read_ids.tolist() if isinstance(read_ids, np.ndarray) else \
+        list(read_ids)
+
+
+def _string_array(read_ids):
+    """Read ids as a NumPy string array"""
+    if isinstance(read_ids, np.ndarray) and read_ids.dtype.kind == 'S':
+        return read_ids
+    return np.array(_tolist(read_ids), dtype=np.string_)
+
+
+def _numbers(ids, prefix, width):
+    """Numbers of the read ids of a NumPy string array made of prefix and
+       width digits, -1 for other read ids, or None if none can be
+
+       Returns:
+       --------
+       numbers : numpy array (int64)
+          number of each read id
+    """
+    length = len(prefix) + width
+    if (width < 1 or width > _MAX_DIGITS or ids.dtype.itemsize < length or
+            '\0' in prefix):
+        return None
+    # each read id as a row of bytes, padded with NULs to the longest
+    chars = np.ascontiguousarray(ids).view(np.uint8).reshape(
+        len(ids), ids.dtype.itemsize)
+    valid = np.ones(len(ids), dtype=bool)
+    for column, char in enumerate(prefix):
+        valid &= chars[:, column] == ord(char)
+    if ids.dtype.itemsize > length:
+        valid &= (chars[:, length:] == 0).all(axis=1)
+    numbers = np.zeros(len(ids), dtype=np.int64)
+    for column in range(len(prefix), length):
+        # bytes below '0' wrap around above 9
+        digit = chars[:, column] - np.uint8(ord('0'))
+        valid &= digit <= 9
+        numbers *= 10
+        numbers += digit
+    numbers[~valid] = -1
+    return numbers
+
+
+class ReadSample(object):
+    """Deterministic sample of a fraction of read ids, selected by the first
+       8 bytes of the MD5 digest of the seed and read id
+
+       Parameters:
+       -----------
+       fraction : float
+          fraction of read ids in the sample, in (0, 1]
+       seed : integer, optional
+          seed of the sample, other seeds select other reads
+    """
+
+    def __init__(self, fraction, seed=0):
+        if not 0 < fraction <= 1:
+            raise ValueError("the sample fraction must be in (0, 1]: %s" %
+                             fraction)
+        self.fraction = fraction
+        self.seed = seed
+        self._md5 = hashlib.md5("%d:" % seed)
+        # digests are compared as big-endian numbers to the threshold,
+        # which is None when every read is selected
+        self._threshold = struct.pack('>Q', int(fraction * 2 ** 64)) \
+            if fraction < 1 else None
+
+    def __contains__(self, read_id):
+        if self._threshold is None:
+            return True
+        md5 = self._md5.copy()
+        md5.update(read_id)
+        return md5.digest()[:8] < self._threshold
+
+    def lines(self, lines):
+        """Lines of a tab-separated file (BLAST or SAM) whose read id is in
+           the sample, SAM headers excluded. The read id is the first word of
+           the first field, as the parsers read it (a read name may carry a
+           description after a space).
+        """
+        previous_id = None
+        selected = False
+        for line in lines:
+            end = line.find('\t')
+            read_id = line[:end] if end != -1 else line
+            if ' ' in read_id or end == -1:
+                read_id = read_id.split(None, 1)[0] if read_id.strip() else ''
+            # the alignments of a read are usually consecutive
+            if read_id != previous_id:
+                previous_id = read_id
+                selected = read_id in self and not read_id.startswith('@')
+            if selected:
+                yield line
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+"""Parse SAM alignments into records shared by the scripts of this
+   repository
+
+   Each line is split once on tabs. The CIGAR string of a record is decoded
+   on first use, and decoded CIGARs are cached by string since most reads
+   share a few CIGARs. Optional fields (e.g. AS:i) are looked up by tag
+   rather than by column, so records with other optional fields before the
+   alignment score are parsed correctly.
+"""
+
+import re
+
+
+_CIGAR_EVENT = re.compile(r'(\d+)([MIDNSHPX=])')
+
+# decoded CIGAR strings, cleared when it grows past _CIGAR_CACHE_SIZE
+_cigar_cache = {}
+_CIGAR_CACHE_SIZE = 100000
+
+# column of each optional field tag in the last record it was found in
+_tag_columns = {}
+
+
+def cigar_stats(cigar):
+    """Alignment length and number of indels of a CIGAR string
+
+       Parameters:
+       -----------
+       cigar : string
+          CIGAR string (e.g. '5S90M2I3M')
+
+       Returns:
+       --------
+       align_len : integer
+          number of read nucleotides aligned (M and I events)
+       num_indel : integer
+          number of insertion and deletion events
+    """
+    stats = _cigar_cache.get(cigar)
+    if stats is None:
+        align_len = 0
+        num_indel = 0
+        for length, event in _CIGAR_EVENT.findall(cigar):
+            if event == 'M':
+                align_len += int(length)
+            elif event == 'I':
+                align_len += int(length)
+                num_indel += 1
+            elif event == 'D':
+                num_indel += 1
+        stats = (align_len, num_indel)
+        if len(_cigar_cache) >= _CIGAR_CACHE_SIZE:
+            _cigar_cache.clear()
+        _cigar_cache[cigar] = stats
+    return stats
+
+
+def cigar_read_length(cigar):
+    """Length of the read of a CIGAR string, including clipped nucleotides
+       (M, I, S, H, = and X events), None for a missing CIGAR ('*')
+    """
+    if cigar == '*':
+        return None
+    return sum(int(length) for length, event in _CIGAR_EVENT.findall(cigar)
+               if event in 'MISH=X')
+
+
+class SamRecord(object):
+    """One alignment of a SAM file
+
+       The read id and contig are the first whitespace-separated word of
+       their columns (some aligners keep the full FASTA label); fields holds
+       all tab-separated columns.
+    """
+
+    __slots__ = ('read_id', 'contig', 'fields')
+
+    def __init__(self, fields):
+        self.fields = fields
+        read_id = fields[0]
+        self.read_id = read_id.split(None, 1)[0] if ' ' in read_id else read_id
+        contig = fields[2]
+        self.contig = contig.split(None, 1)[0] if ' ' in contig else contig
+
+    @property
+    def flag(self):
+        return int(self.fields[1])
+
+    @property
+    def position(self):
+        return int(self.fields[3])
+
+    @property
+    def cigar(self):
+        return self.fields[5]
+
+    @property
+    def aligned(self):
+        return self.contig != '*'
+
+    @property
+    def align_len(self):
+        return cigar_stats(self.fields[5])[0]
+
+    @property
+    def num_indel(self):
+        return cigar_stats(self.fields[5])[1]
+
+    @property
+    def read_length(self):
+        """Read length from the CIGAR string, or else the SEQ column, None
+           if neither is available
+        """
+        length = cigar_read_length(self.fields[5])
+        if length is None and self.fields[9] != '*':
+            length = len(self.fields[9])
+        return length
+
+    def tag(self, name, default=None):
+        """Value of the optional field name (e.g. 'AS'), converted to an
+           integer or float for the i and f types
+        """
+        fields = self.fields
+        # aligners output their optional fields in the same order on every
+        # line, so try the column the tag was last found in first
+        column = _tag_columns.get(name, 11)
+        if column >= len(fields) or fields[column][:2] != name:
+            for column in xrange(11, len(fields)):
+                if fields[column][:2] == name:
+                    _tag_columns[name] = column
+                    break
+            else:
+                return default
+        # optional fields are TAG:TYPE:VALUE with two-character tags
+        value = fields[column]
+        value_type = value[3]
+        if value_type == 'i':
+            return int(value[5:])
+        if value_type == 'f':
+            return float(value[5:])
+        return value[5:]
+
+    @property
+    def alignment_score(self):
+        """Alignment score (AS:i tag), None if absent"""
+        return self.tag('AS')
+
+
+def parse_sam(sam_f, aligned_only=False):
+    """Parse the alignments of a SAM file, skipping header lines
+
+       Parameters:
+       -----------
+       sam_f : iterable
+          lines of a SAM file
+       aligned_only : boolean, optional
+          skip records without an alignment (contig '*')
+
+       Yields:
+       -------
+       record : SamRecord
+          one record per alignment line
+    """
+    for line in sam_f:
+        if line.startswith('@'):
+            continue
+        record = SamRecord(line.strip().split('\t'))
+        if aligned_only and record.contig == '*':
+            continue
+        yield record
@@ -0,0 +1,394 @@
+#!/usr/bin/env python
+
+"""Write synthetic alignment files for benchmarking the scripts in this
+   repository at scale
+   usage: python simulate_alignments.py ground_truth.blast --num_reads 1000000
+          python simulate_alignments.py dataset_dir --dataset --num_reads 1000000
+                 [--repeat_fraction 0.1 --error_rate 0.01 ...]
+
+   With --dataset, a matching set of files is written into dataset_dir (see
+   write_dataset): reads, their simulated origins, ground-truth BLAST
+   alignments, the SAM and BLAST alignments of two tools and SSEARCH
+   alignments, all for the same reads. Files are written read by read, so
+   memory does not grow with the number of reads.
+"""
+
+import os
+import random
+
+import click
+
+
+def _read_id(i):
+    return "seq.%09d" % i
+
+
+def write_ground_truth(ground_truth_fp, num_reads, hits_per_read=5,
+                       num_contigs=10, contig_length=5000000, seed=0):
+    """Write synthetic ground-truth BLAST alignments (tabular, -outfmt 6)
+
+       Parameters:
+       -----------
+       ground_truth_fp : string
+          output filepath
+       num_reads : integer
+          number of reads
+       hits_per_read : integer, optional
+          number of alignments per read
+       num_contigs : integer, optional
+          number of reference contigs
+       contig_length : integer, optional
+          length of each reference contig
+       seed : integer, optional
+          seed of the random number generator
+    """
+    rand = random.Random(seed)
+    read_length = 150
+    with open(ground_truth_fp, 'w') as ground_truth:
+        for i in xrange(num_reads):
+            read_id = _read_id(i)
+            bitscore = 280.0
+            for j in xrange(hits_per_read):
+                contig = "ref%d" % rand.randrange(num_contigs)
+                sstart = rand.randrange(1, contig_length - read_length)
+                send = sstart + read_length - 1
+                # half of the hits are on the reverse strand
+                if rand.random() < 0.5:
+                    sstart, send = send, sstart
+                # about half of the hits share the bitscore of the previous
+                if j > 0 and rand.random() < 0.5:
+                    bitscore -= rand.randrange(1, 20) * 0.5
+                ground_truth.write(
+                    "%s\t%s\t%.2f\t%d\t%d\t%d\t%d\t%d\t%d\t%d\t%.1e\t%.1f\n" % (
+                        read_id, contig, 99.0, read_length, 1, 0, 1,
+                        read_length, sstart, send, 1e-70, bitscore))
+
+
+def write_sam(sam_fp, num_reads, num_contigs=10, contig_length=5000000,
+              seed=0):
+    """Write synthetic SAM alignments, one per read, with a few distinct
+       CIGAR strings as output by short-read aligners
+
+       Parameters:
+       -----------
+       sam_fp : string
+          output filepath
+       num_reads : integer
+          number of reads
+       num_contigs : integer, optional
+          number of reference contigs
+       contig_length : integer, optional
+          length of each reference contig
+       seed : integer, optional
+          seed of the random number generator
+    """
+    rand = random.Random(seed)
+    cigars = ['150M'] * 6 + ['5S145M', '70M1I79M', '40M2D110M', '148M2S']
+    seq = 'ACGT' * 37 + 'AC'
+    qual = 'I' * 150
+    with open(sam_fp, 'w') as sam:
+        sam.write("@HD\tVN:1.0\tSO:queryname\n")
+        for i in xrange(num_contigs):
+            sam.write("@SQ\tSN:ref%d\tLN:%d\n" % (i, contig_length))
+        for i in xrange(num_reads):
+            # 5% of the reads are not aligned
+            if rand.random() < 0.05:
+                sam.write("%s\t4\t*\t0\t0\t*\t*\t0\t0\t%s\t%s\tYT:Z:UU\n" % (
+                    _read_id(i), seq, qual))
+                continue
+            sam.write("%s\t%d\tref%d\t%d\t%d\t%s\t*\t0\t0\t%s\t%s\t"
+                      "NM:i:%d\tAS:i:%d\n" % (
+                          _read_id(i), rand.choice([0, 16]),
+                          rand.randrange(num_contigs),
+                          rand.randrange(1, contig_length - 150),
+                          rand.randrange(61), rand.choice(cigars), seq, qual,
+                          rand.randrange(5), rand.randrange(200, 301)))
+
+
+def write_reads(reads_fp, num_reads, read_length=150, seed=0):
+    """Write synthetic reads (FASTA) named as in write_ground_truth and
+       write_sam, with a few ambiguous nucleotides
+
+       Parameters:
+       -----------
+       reads_fp : string
+          output filepath
+       num_reads : integer
+          number of reads
+       read_length : integer, optional
+          length of each read
+       seed : integer, optional
+          seed of the random number generator
+    """
+    rand = random.Random(seed)
+    with open(reads_fp, 'w') as reads:
+        for i in xrange(num_reads):
+            seq = [rand.choice('ACGT') for j in xrange(read_length)]
+            for j in xrange(rand.randrange(3)):
+                seq[rand.randrange(read_length)] = 'N'
+            reads.write(">%s\n%s\n" % (_read_id(i), ''.join(seq)))
+
+
+# files of a dataset written by write_dataset
+DATASET_FILES = {'reads': 'reads.fasta',
+                 'origins': 'origins.sam',
+                 'ground_truth': 'ground_truth.blast',
+                 'observed_sam': 'tool1.sam',
+                 'observed_blast': 'tool1.blast',
+                 'observed_sam_2': 'tool2.sam',
+                 'ssearch': 'ssearch.m8'}
+
+# random nucleotides reads are cut from
+_POOL_SIZE = 1 << 16
+
+
+def _poisson(rand, mean):
+    """Number of events of a Poisson process (Knuth's method, small means)"""
+    limit = 2.718281828459045 ** -mean
+    count = 0
+    product = rand.random()
+    while product > limit:
+        count += 1
+        product *= rand.random()
+    return count
+
+
+def _blast_line(read_id, contig, start, read_length, mismatches, gaps,
+                bitscore, reverse=False):
+    end = start + read_length - 1
+    if reverse:
+        start, end = end, start
+    return "%s\t%s\t%.2f\t%d\t%d\t%d\t%d\t%d\t%d\t%d\t%.1e\t%.1f\n" % (
+        read_id, contig, 100.0 * (read_length - mismatches) / read_length,
+        read_length, mismatches, gaps, 1, read_length, start, end, 1e-70,
+        bitscore)
+
+
+def _sam_line(read_id, contig, position, cigar, seq, qual, mismatches,
+              score):
+    return "%s\t0\t%s\t%d\t60\t%s\t*\t0\t0\t%s\t%s\tNM:i:%d\tAS:i:%d\n" % (
+        read_id, contig, position, cigar, seq, qual, mismatches, score)
+
+
+def write_dataset(output_dir, num_reads, hits_per_read=5, repeat_fraction=0.1,
+                  error_rate=0.01, misaligned_fraction=0.05,
+                  unaligned_fraction=0.05, better_hit_fraction=0.01,
+                  num_contigs=10, contig_length=5000000, read_length=150,
+                  seed=0):
+    """Write a matching set of synthetic reads and alignments
+
+       Each read is cut from a random contig and start (its origin, on the
+       forward strand), with sequencing errors (substitutions, some of them
+       N's, and 1-nt indels). Reads from repeats also align equally well to
+       a second location. The files written in output_dir are named as in
+       DATASET_FILES:
+          - reads: FASTA with Mason-style labels (contig=, orig_begin=)
+          - origins: SAM alignment of each read to its origin
+          - ground_truth: BLAST alignments of each read, sorted by read id,
+            the origin (and repeat location) first, then hits_per_read - 1
+            (or - 2) lower-scoring random hits
+          - observed_sam, observed_blast: alignments of a tool, one per
+            aligned read, at the origin or a few nucleotides off it, at a
+            random location for misaligned reads, missing for unaligned
+            reads (flag 4 in SAM)
+          - observed_sam_2: alignments of a second tool
+          - ssearch: SSEARCH alignments (BLAST tabular) grouped by read,
+            best hit first, the best hit off the origin for a fraction of
+            the reads
+
+       Parameters:
+       -----------
+       output_dir : string
+          directory of the output files (created if missing)
+       num_reads : integer
+          number of reads
+       hits_per_read : integer, optional
+          number of ground-truth and SSEARCH alignments per read
+       repeat_fraction : float, optional
+          fraction of reads from repeats (tied best alignments)
+       error_rate : float, optional
+          sequencing errors per nucleotide
+       misaligned_fraction : float, optional
+          fraction of aligned reads a tool aligns to a random location
+       unaligned_fraction : float, optional
+          fraction of reads a tool does not align
+       better_hit_fraction : float, optional
+          fraction of reads with an SSEARCH hit better than their origin
+       num_contigs : integer, optional
+          number of reference contigs
+       contig_length : integer, optional
+          length of each reference contig
+       read_length : integer, optional
+          length of each read
+       seed : integer, optional
+          seed of the random number generators
+
+       Returns:
+       --------
+       dataset : dict
+          filepath of each file, keyed as DATASET_FILES
+    """
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    dataset = dict((name, os.path.join(output_dir, file_name))
+                   for name, file_name in DATASET_FILES.iteritems())
+    rand = random.Random(seed)
+    # each tool has its own generator, so that its alignments do not change
+    # with the parameters of the other files
+    tools = [random.Random(seed + 1), random.Random(seed + 2)]
+    pool = ''.join(rand.choice('ACGT') for i in xrange(_POOL_SIZE))
+    qual = 'I' * read_length
+    contigs = ["ref%d" % i for i in xrange(num_contigs)]
+    last_start = contig_length - 2 * read_length
+
+    files = dict((name, open(fp, 'w')) for name, fp in dataset.iteritems())
+    try:
+        for name in ['origins', 'observed_sam', 'observed_sam_2']:
+            files[name].write("@HD\tVN:1.0\tSO:queryname\n")
+            for contig in contigs:
+                files[name].write("@SQ\tSN:%s\tLN:%d\n" %
+                                  (contig, contig_length))
+
+        for i in xrange(num_reads):
+            read_id = _read_id(i)
+            contig = rand.choice(contigs)
+            start = rand.randint(1, last_start)
+
+            # sequencing errors
+            offset = rand.randrange(_POOL_SIZE - read_length)
+            seq = list(pool[offset:offset + read_length])
+            num_errors = _poisson(rand, error_rate * read_length)
+            mismatches = 0
+            indel = None
+            for j in xrange(num_errors):
+                kind = rand.random()
+                if kind < 0.9 or indel is not None:
+                    position = rand.randrange(read_length)
+                    if kind < 0.1:
+                        seq[position] = 'N'
+                    else:
+                        seq[position] = rand.choice(
+                            'ACGT'.replace(seq[position], ''))
+                    mismatches += 1
+                else:
+                    indel = ('I' if kind < 0.95 else 'D',
+                             rand.randrange(1, read_length - 1))
+            seq = ''.join(seq)
+            if indel is None:
+                cigar = "%dM" % read_length
+            elif indel[0] == 'I':
+                cigar = "%dM1I%dM" % (indel[1], read_length - indel[1] - 1)
+            else:
+                cigar = "%dM1D%dM" % (indel[1], read_length - indel[1])
+            gaps = 0 if indel is None else 1
+            score = 2 * read_length - 8 * mismatches - 10 * gaps
+            bitscore = 1.8 * read_length - 7.0 * mismatches - 9.0 * gaps
+
+            files['reads'].write(
+                ">%s contig=%s haplotype=0 length=%d orig_begin=%d "
+                "orig_end=%d\n%s\n" % (read_id, contig, read_length, start,
+                                        start + read_length, seq))
+            files['origins'].write(_sam_line(read_id, contig, start, cigar,
+                                             seq, qual, mismatches, score))
+
+            # best locations of the read: its origin and a repeat
+            locations = [(contig, start)]
+            if rand.random() < repeat_fraction:
+                locations.append((rand.choice(contigs),
+                                  rand.randint(1, last_start)))
+            hits = [_blast_line(read_id, location[0], location[1],
+                                read_length, mismatches, gaps, bitscore)
+                    for location in locations]
+            lower = bitscore
+            for j in xrange(hits_per_read - len(hits)):
+                lower -= rand.randrange(1, 20) * 0.5
+                hits.append(_blast_line(read_id, rand.choice(contigs),
+                                        rand.randint(1, last_start),
+                                        read_length, mismatches + 2 * j + 2,
+                                        gaps, lower,
+                                        reverse=rand.random() < 0.5))
+            files['ground_truth'].writelines(hits[:hits_per_read])
+            if rand.random() < better_hit_fraction:
+                hits.insert(0, _blast_line(read_id, rand.choice(contigs),
+                                           rand.randint(1, last_start),
+                                           read_length, 0, 0,
+                                           bitscore + 5.0))
+            files['ssearch'].writelines(hits[:hits_per_read])
+
+            for tool, sam_name in zip(tools, ['observed_sam',
+                                              'observed_sam_2']):
+                if tool.random() < unaligned_fraction:
+                    files[sam_name].write(
+                        "%s\t4\t*\t0\t0\t*\t*\t0\t0\t%s\t%s\tYT:Z:UU\n" %
+                        (read_id, seq, qual))
+                    continue
+                if tool.random() < misaligned_fraction:
+                    location = (tool.choice(contigs),
+                                tool.randint(1, last_start))
+                else:
+                    location = tool.choice(locations)
+                    # a few nucleotides off the origin for some reads
+                    if tool.random() < 0.2:
+                        location = (location[0],
+                                    max(1, location[1] +
+                                        tool.randint(-5, 5)))
+                files[sam_name].write(_sam_line(read_id, location[0],
+                                                location[1], cigar, seq,
+                                                qual, mismatches, score))
+                if sam_name == 'observed_sam':
+                    files['observed_blast'].write(_blast_line(
+                        read_id, location[0], location[1], read_length,
+                        mismatches, gaps, bitscore))
+    finally:
+        for f in files.itervalues():
+            f.close()
+    return dataset
+
+
+@click.command()
+@click.argument('output_fp', required=True,
+                type=click.Path(resolve_path=True, writable=True))
+@click.option('--num_reads', type=int, default=100000, show_default=True,
+              help='number of reads')
+@click.option('--hits_per_read', type=int, default=5, show_default=True,
+              help='number of ground-truth alignments per read')
+@click.option('--seed', type=int, default=0, show_default=True,
+              help='seed of the random number generator')
+@click.option('--dataset', is_flag=True, default=False, show_default=True,
+              help='write a matching set of files into the directory '
+                   'output_fp instead of ground-truth alignments only')
+@click.option('--repeat_fraction', type=float, default=0.1,
+              show_default=True, help='fraction of reads from repeats')
+@click.option('--error_rate', type=float, default=0.01, show_default=True,
+              help='sequencing errors per nucleotide')
+@click.option('--misaligned_fraction', type=float, default=0.05,
+              show_default=True,
+              help='fraction of aligned reads aligned to a random location')
+@click.option('--unaligned_fraction', type=float, default=0.05,
+              show_default=True, help='fraction of reads not aligned')
+@click.option('--better_hit_fraction', type=float, default=0.01,
+              show_default=True,
+              help='fraction of reads with an SSEARCH hit better than their '
+                   'origin')
+def _main(output_fp, num_reads, hits_per_read, seed, dataset,
+          repeat_fraction, error_rate, misaligned_fraction,
+          unaligned_fraction, better_hit_fraction):
+    """
+    """
+    if dataset:
+        write_dataset(output_fp, num_reads=num_reads,
+                      hits_per_read=hits_per_read,
+                      repeat_fraction=repeat_fraction,
+                      error_rate=error_rate,
+                      misaligned_fraction=misaligned_fraction,
+                      unaligned_fraction=unaligned_fraction,
+                      better_hit_fraction=better_hit_fraction, seed=seed)
+    else:
+        write_ground_truth(ground_truth_fp=output_fp,
+                           num_reads=num_reads,
+                           hits_per_read=hits_per_read,
+                           seed=seed)
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+"""Time the stages of a script (parsing, scoring, ...) and write a JSON
+   report of their wall and CPU time, records per second and peak memory
+
+   Stages are run in StageProfile.stage blocks. The peak RSS of each stage
+   is its own where Linux allows resetting it (/proc/self/clear_refs),
+   otherwise the peak of the process so far. Each stage can also be run
+   under cProfile, reporting its top functions by cumulative time.
+"""
+
+import cProfile
+import json
+import os
+import platform
+import pstats
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+# version of the layout of the report
+PROFILE_VERSION = 1
+
+
+def _peak_rss_mb():
+    """Peak RSS of the process since the last reset (VmHWM), in megabytes"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except IOError:
+        pass
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _reset_peak_rss():
+    """Reset the peak RSS of the process to its current RSS, return False
+       where this is not supported
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except IOError:
+        return False
+
+
+def _cpu_seconds(who):
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _top_functions(profiler, top):
+    """The top functions of a cProfile run by cumulative time"""
+    stats = pstats.Stats(profiler).stats
+    functions = sorted(stats.iteritems(), key=lambda item: item[1][3],
+                       reverse=True)[:top]
+    return [{'function': "%s:%d(%s)" % (os.path.basename(filename), line,
+                                        name),
+             'calls': calls,
+             'tottime': round(tottime, 4),
+             'cumtime': round(cumtime, 4)}
+            for (filename, line, name), (primitive_calls, calls, tottime,
+                                         cumtime, callers) in functions]
+
+
+class Stage(object):
+    """Measurements of a stage; records and counts are set by the caller"""
+
+    def __init__(self, name):
+        self.name = name
+        self.records = None
+        self.counts = {}
+        self.top_functions = None
+
+    def report(self):
+        report = {'stage': self.name,
+                  'wall_seconds': round(self.wall_seconds, 3),
+                  'cpu_seconds': round(self.cpu_seconds, 3),
+                  'children_cpu_seconds': round(self.children_cpu_seconds,
+                                                3),
+                  'peak_rss_mb': round(self.peak_rss_mb, 1),
+                  'peak_rss_scope': self.peak_rss_scope}
+        if self.records is not None:
+            report['records'] = self.records
+            report['records_per_second'] = \
+                int(round(self.records / self.wall_seconds)) \
+                if self.wall_seconds else None
+        if self.counts:
+            report['counts'] = self.counts
+        if self.top_functions is not None:
+            report['top_functions'] = self.top_functions
+        return report
+
+
+class StageProfile(object):
+    """Profile of the stages of a run
+
+       Parameters:
+       -----------
+       enabled : boolean, optional
+          measure the stages (stage blocks only run their code otherwise)
+       top : integer, optional
+          number of functions of the cProfile report of each stage, 0 not
+          to run stages under cProfile
+    """
+
+    def __init__(self, enabled=True, top=0):
+        self.enabled = enabled
+        self.top = top
+        self.stages = []
+        self._start = time.time()
+        self._start_cpu = _cpu_seconds(resource.RUSAGE_SELF)
+
+    @contextmanager
+    def stage(self, name):
+        """Measure the code of a with block as the stage name, yielding the
+           Stage whose records and counts the block may set
+        """
+        stage = Stage(name)
+        if not self.enabled:
+            yield stage
+            return
+        scope = 'stage' if _reset_peak_rss() else 'process'
+        profiler = cProfile.Profile() if self.top else None
+        start_cpu = _cpu_seconds(resource.RUSAGE_SELF)
+        start_children = _cpu_seconds(resource.RUSAGE_CHILDREN)
+        start = time.time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield stage
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            stage.wall_seconds = time.time() - start
+            stage.cpu_seconds = _cpu_seconds(resource.RUSAGE_SELF) - \
+                start_cpu
+            stage.children_cpu_seconds = \
+                _cpu_seconds(resource.RUSAGE_CHILDREN) - start_children
+            stage.peak_rss_mb = _peak_rss_mb()
+            stage.peak_rss_scope = scope
+            stage.top_functions = _top_functions(profiler, self.top) \
+                if profiler is not None else None
+            self.stages.append(stage)
+
+    def report(self, **info):
+        """The report of the stages measured so far, with the run info
+           given as keyword arguments (e.g. command line and inputs)
+        """
+        return {'version': PROFILE_VERSION,
+                'date': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'argv': sys.argv,
+                'info': info,
+                'wall_seconds': round(time.time() - self._start, 3),
+                'cpu_seconds': round(_cpu_seconds(resource.RUSAGE_SELF) -
+                                     self._start_cpu, 3),
+                # resetting the peak RSS of a stage may lower ru_maxrss
+                'peak_rss_mb': round(max(
+                    [resource.getrusage(resource.RUSAGE_SELF).ru_maxrss /
+                     1024.0] + [stage.peak_rss_mb for stage in self.stages]),
+                    1),
+                'stages': [stage.report() for stage in self.stages]}
+
+    def write(self, report_fp, **info):
+        """Write the report as JSON to report_fp"""
+        with open(report_fp, 'w') as report_f:
+            json.dump(self.report(**info), report_f, indent=2,
+                      sort_keys=True)
+            report_f.write('\n')
@@ -4,11 +4,262 @@
    usage: python suppl_compute_accuracy.py ground_truth.blast tool [sam,blast] tool_alignment.[sam,blast] total_reads
 """
 
+import gc
+import hashlib
+import heapq
+import json
+import marshal
+import math
+import mmap
+import os
+import struct
 import sys
+import time
+from array import array
+from itertools import izip
+from multiprocessing import Pool
+from tempfile import mkstemp
+
 import click
+import numpy as np
+
+from alignment_io import input_format, open_input
+from offsets import parse_offsets
+from read_ids import ReadIdCodec, ReadSample
+from sam_parser import parse_sam
+from stage_profile import StageProfile
+
+
+class GroundTruth(object):
+    """Columnar store of ground-truth BLAST alignments
+
+       Alignments of all reads are held in flat NumPy arrays, grouped by
+       read (CSR layout) and sorted by decreasing bitscore within each read.
+       Contig names are interned to small integer codes, and read ids to
+       their read number by a ReadIdCodec.
+
+       Attributes:
+       -----------
+       read_ids : sequence
+          read ids, indexed by read number (order of first appearance)
+       read_codec : ReadIdCodec
+          read number of each read id
+       contigs : list
+          contig names, indexed by contig code
+       offsets : numpy array (int64)
+          alignments of the i-th read are rows offsets[i]:offsets[i+1]
+       contig : numpy array (int32)
+          contig code of each alignment
+       start : numpy array (uint32)
+          subject start of each alignment (BLAST column 9)
+       end : numpy array (uint32)
+          subject end of each alignment (BLAST column 10)
+       bitscore : numpy array (float64)
+          bitscore of each alignment (BLAST column 12)
+       weight : numpy array (float64)
+          accuracy score of each alignment, its bitscore tier within the
+          read normalized by the number of unique bitscores of the read
+          (see compute_accuracy)
+    """
+
+    def __init__(self, read_index, contigs, offsets, contig, start, end,
+                 bitscore, weight, read_ids=None):
+        # one of the dictionary of read numbers by read id or the read ids
+        # (e.g. from a cache file) is given, the codec is built on first use
+        self._read_index = read_index
+        self._read_ids = read_ids
+        self._read_codec = None
+        self.contigs = contigs
+        self.offsets = offsets
+        self.contig = contig
+        self.start = start
+        self.end = end
+        self.bitscore = bitscore
+        self.weight = weight
+        self._start_index = None
+        self._end_index = None
+
+    @classmethod
+    def from_dict(cls, expected_alns):
+        """Build a store from a dictionary of BLAST alignments (keys are read
+           ids and values are lists of BLAST columns without the read id)
+        """
+        builder = _GroundTruthBuilder()
+        for read_id in expected_alns:
+            for aln in expected_alns[read_id]:
+                builder.add(read_id, aln[0], aln[7], aln[8], aln[10])
+        return builder.build()
+
+    @property
+    def read_codec(self):
+        """Codec of read numbers by read id"""
+        if self._read_codec is None:
+            if self._read_index is not None:
+                self._read_codec = ReadIdCodec.from_index(self._read_index)
+            else:
+                # read ids of simulated reads are coded from their number,
+                # without a dictionary of every read id
+                self._read_codec = ReadIdCodec(self._read_ids)
+        return self._read_codec
+
+    @property
+    def read_ids(self):
+        if self._read_ids is None:
+            self._read_ids = self.read_codec.read_ids
+        return self._read_ids
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __contains__(self, read_id):
+        return read_id in self.read_codec
+
+    def __iter__(self):
+        return iter(self.read_codec)
+
+    def keys(self):
+        return list(self.read_codec)
+
+    def rows(self, read_id):
+        """Return the (first, last + 1) rows of the alignments of read_id"""
+        i = self.read_codec.code(read_id)
+        if i < 0:
+            raise KeyError(read_id)
+        return int(self.offsets[i]), int(self.offsets[i+1])
+
+    def position_index(self, end=False):
+        """Return the alignments of each read sorted by contig and position,
+           as (keys, weights) arrays where keys are contig code << 32 | start
+           (or end) position. The rows of each read are the same as in the
+           store. The index is built on first use.
+        """
+        index = self._end_index if end else self._start_index
+        if index is None:
+            positions = self.end if end else self.start
+            counts = np.diff(self.offsets)
+            read = np.repeat(np.arange(len(counts)), counts)
+            order = np.lexsort((positions, self.contig, read))
+            keys = ((self.contig[order].astype(np.int64) << 32) |
+                    positions[order])
+            index = (keys, self.weight[order])
+            if end:
+                self._end_index = index
+            else:
+                self._start_index = index
+        return index
+
+    def near(self, lo, hi, contig, position, offset, end=False):
+        """Find the alignments in rows lo:hi on contig within +-offset of
+           position by binary search in the position index
+
+           Returns:
+           --------
+           positions, weights : lists
+              start (or end) positions and weights of the alignments found,
+              best weight first
+        """
+        keys, weights = self.position_index(end)
+        keys = keys[lo:hi]
+        contig_key = contig << 32
+        first = np.searchsorted(
+            keys, contig_key | max(position - offset, 0), side='left')
+        last = np.searchsorted(
+            keys, contig_key | min(position + offset, _MAX_POSITION),
+            side='right')
+        if first == last:
+            return [], []
+        window = weights[lo+first:lo+last]
+        order = np.argsort(-window, kind='mergesort')
+        return ((keys[first:last][order] & _MAX_POSITION).tolist(),
+                window[order].tolist())
+
+    def alignments(self, read_id):
+        """Return the alignments of read_id as a list of
+           (contig, start, end, bitscore) tuples, best bitscore first
+        """
+        lo, hi = self.rows(read_id)
+        return [(self.contigs[c], s, e, b) for c, s, e, b in
+                zip(self.contig[lo:hi].tolist(), self.start[lo:hi].tolist(),
+                    self.end[lo:hi].tolist(), self.bitscore[lo:hi].tolist())]
+
+
+# largest position in a contig (positions are stored as uint32)
+_MAX_POSITION = 0xffffffff
+
+# reads with more expected alignments than this are searched with the
+# position index of GroundTruth instead of a linear scan
+_INDEX_MIN_ALIGNMENTS = 64
+
+
+class _GroundTruthBuilder(object):
+    """Accumulates alignments into typed buffers and packs them into a
+       GroundTruth
+    """
+
+    def __init__(self):
+        self._read_index = {}
+        self._contig_index = {}
+        self._contigs = []
+        self._read = array('i')
+        self._contig = array('i')
+        self._start = array('I')
+        self._end = array('I')
+        self._bitscore = array('d')
+
+    def add(self, read_id, contig, start, end, bitscore):
+        read = self._read_index.setdefault(read_id, len(self._read_index))
+        code = self._contig_index.get(contig)
+        if code is None:
+            code = self._contig_index[contig] = len(self._contigs)
+            self._contigs.append(contig)
+        self._read.append(read)
+        self._contig.append(code)
+        self._start.append(int(start))
+        self._end.append(int(end))
+        self._bitscore.append(float(bitscore))
+
+    def build(self):
+        read = np.frombuffer(self._read, dtype=np.int32)
+        bitscore = np.frombuffer(self._bitscore, dtype=np.float64)
+        # group alignments by read and sort them by decreasing bitscore,
+        # lexsort is stable so ties keep their order in the file
+        order = np.lexsort((-bitscore, read))
+        counts = np.bincount(read, minlength=len(self._read_index))
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        bitscore = bitscore[order]
+        return GroundTruth(
+            read_index=self._read_index,
+            contigs=self._contigs,
+            offsets=offsets,
+            contig=np.frombuffer(self._contig, dtype=np.int32)[order],
+            start=np.frombuffer(self._start, dtype=np.uint32)[order],
+            end=np.frombuffer(self._end, dtype=np.uint32)[order],
+            bitscore=bitscore,
+            weight=_tier_weights(bitscore, offsets, counts))
+
+
+def _tier_weights(bitscore, offsets, counts):
+    """Compute the normalized weight of each alignment from bitscores sorted
+       in decreasing order within each read: with n unique bitscores in a
+       read, alignments in the best tier weigh n/n, the next tier (n-1)/n
+       and so on
+    """
+    # a new tier starts wherever the bitscore drops within a read
+    drop = np.zeros(len(bitscore), dtype=np.int32)
+    drop[1:] = bitscore[1:] < bitscore[:-1]
+    first = offsets[:-1][counts > 0]
+    drop[first] = 0
+    tier = np.cumsum(drop)
+    row_read_first = np.repeat(offsets[:-1], counts)
+    tier -= tier[row_read_first]
+    num_unique = np.repeat(tier[offsets[1:][counts > 0] - 1] + 1,
+                           counts[counts > 0])
+    return (num_unique - tier) / num_unique.astype(np.float64)
+
 
 def collect_ground_truth(ground_truth_alns_fp):
-    """Parses a file of ground truth alignments into a dictionary
+    """Parses a file of ground truth alignments into a columnar store
        (only BLAST)
 
        Parameters:
@@ -18,28 +269,240 @@ def collect_ground_truth(ground_truth_alns_fp):
 
        Returns:
        --------
-       expected_alns : dict
-          dictionary of ground-truth alignments
+       expected_alns : GroundTruth
+          ground-truth alignments grouped by read and sorted by
+          decreasing bitscore
     """
-    expected_alns = {}
+    builder = _GroundTruthBuilder()
     # collect ground-truth alignments
-    with open(ground_truth_alns_fp, 'U') as ground_truth_alns:
+    with open_input(ground_truth_alns_fp) as ground_truth_alns:
         for line in ground_truth_alns:
-            line = line.strip().split()
-            read_id = line[0]
-            if read_id in expected_alns:
-                expected_alns[read_id].append(line[1:])
-            else:
-                expected_alns[read_id] = [line[1:]]
+            line = line.split()
+            builder.add(line[0], line[1], line[8], line[9], line[11])
+
+    return builder.build()
+
+
+def load_ground_truth(ground_truth_alns_fp, cache="auto"):
+    """Loads ground-truth alignments through a binary cache file
 
-    # sort alignments for each read by highest bitscore
-    for read in expected_alns:
-        expected_alns[read].sort(key=lambda x: float(x[10]), reverse=True)
+       The parsed store is saved next to the BLAST file (with the suffix
+       .gtcache) and memory-mapped by later calls instead of parsing the
+       BLAST file again. The cache is keyed by the size, modification time
+       and MD5 digest of the BLAST file and rebuilt when it changes.
 
+       Parameters:
+       -----------
+       ground_truth_alns_fp : string
+          filepath of ground-truth BLAST alignments
+       cache : string, optional
+          "auto" to read the cache, or write it when missing or stale,
+          "off" to always parse the BLAST file and "rebuild" to parse it and
+          overwrite the cache
+
+       Returns:
+       --------
+       expected_alns : GroundTruth
+          ground-truth alignments (see collect_ground_truth)
+    """
+    if cache not in ("auto", "off", "rebuild"):
+        raise ValueError("%s is not a cache mode" % cache)
+    if cache == "off":
+        return collect_ground_truth(ground_truth_alns_fp)
+
+    cache_fp = ground_truth_alns_fp + GROUND_TRUTH_CACHE_SUFFIX
+    if cache == "auto":
+        expected_alns = read_ground_truth_cache(cache_fp, ground_truth_alns_fp)
+        if expected_alns is not None:
+            return expected_alns
+
+    # identify the source before parsing it, so that changes made while
+    # parsing invalidate the cache
+    source = _source_key(ground_truth_alns_fp)
+    expected_alns = collect_ground_truth(ground_truth_alns_fp)
+    try:
+        write_ground_truth_cache(expected_alns, cache_fp, source)
+    except (IOError, OSError) as e:
+        sys.stderr.write("WARNING: could not write ground-truth cache %s: %s\n"
+                         % (cache_fp, e))
     return expected_alns
 
 
-def collect_observed_alignments(observed_alns_fp, file_format="sam"):
+# suffix of the binary cache file written next to a ground-truth file
+GROUND_TRUTH_CACHE_SUFFIX = '.gtcache'
+_CACHE_MAGIC = 'GTCACHE2'
+# alignment of the arrays in the cache file (bytes)
+_CACHE_ALIGNMENT = 64
+
+
+def _source_key(ground_truth_alns_fp, digest=True):
+    """Return the size, modification time and MD5 digest of a file"""
+    stat = os.stat(ground_truth_alns_fp)
+    source = {'size': stat.st_size, 'mtime': stat.st_mtime}
+    if digest:
+        md5 = hashlib.md5()
+        with open(ground_truth_alns_fp, 'rb') as source_f:
+            for chunk in iter(lambda: source_f.read(1 << 20), b''):
+                md5.update(chunk)
+        source['md5'] = md5.hexdigest()
+    return source
+
+
+def _aligned(position):
+    return -(-position // _CACHE_ALIGNMENT) * _CACHE_ALIGNMENT
+
+
+def write_ground_truth_cache(expected_alns, cache_fp, source):
+    """Write a ground-truth store to a cache file
+
+       The file holds a magic string, the length of a JSON header describing
+       the source file, the contigs and the arrays, the header and the raw
+       arrays. The file is written to a temporary file renamed into place,
+       so readers never see a partial cache.
+    """
+    arrays = [('offsets', expected_alns.offsets),
+              ('contig', expected_alns.contig),
+              ('start', expected_alns.start),
+              ('end', expected_alns.end),
+              ('bitscore', expected_alns.bitscore),
+              ('weight', expected_alns.weight),
+              ('read_ids', np.asarray(expected_alns.read_ids, dtype=np.string_))]
+    # offsets of the arrays are relative to the end of the header
+    layout = []
+    data_size = 0
+    for name, values in arrays:
+        layout.append([name, values.dtype.str, len(values), data_size])
+        data_size = _aligned(data_size + values.nbytes)
+    # contig names are bytes, which need not be UTF-8: each byte is kept as
+    # the character of its Latin-1 code
+    header = json.dumps({'source': source,
+                         'contigs': expected_alns.contigs,
+                         'arrays': layout}, encoding='latin-1')
+
+    cache_dir = os.path.dirname(os.path.abspath(cache_fp))
+    f, tmp_fp = mkstemp(prefix='.gtcache_', dir=cache_dir)
+    try:
+        with os.fdopen(f, 'wb') as cache_f:
+            cache_f.write(_CACHE_MAGIC)
+            cache_f.write(struct.pack('<Q', len(header)))
+            cache_f.write(header)
+            data_start = _aligned(cache_f.tell())
+            for (name, values), (_, _, _, offset) in zip(arrays, layout):
+                cache_f.seek(data_start + offset)
+                cache_f.write(np.ascontiguousarray(values).tobytes())
+            cache_f.truncate(data_start + data_size)
+        os.rename(tmp_fp, cache_fp)
+    except:
+        os.remove(tmp_fp)
+        raise
+
+
+def read_ground_truth_cache(cache_fp, ground_truth_alns_fp=None):
+    """Memory-map a ground-truth store from a cache file
+
+       Returns:
+       --------
+       expected_alns : GroundTruth
+          the cached store, or None if the cache is missing, unreadable or
+          does not match the current ground_truth_alns_fp (size and
+          modification time, or MD5 digest when only the time differs, in
+          which case the cache is written again with the new time so that
+          later calls do not digest the file again)
+    """
+    try:
+        with open(cache_fp, 'rb') as cache_f:
+            if cache_f.read(len(_CACHE_MAGIC)) != _CACHE_MAGIC:
+                return None
+            header_len, = struct.unpack('<Q', cache_f.read(8))
+            header = json.loads(cache_f.read(header_len))
+            data_start = _aligned(cache_f.tell())
+            cache_map = mmap.mmap(cache_f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (IOError, OSError, ValueError, struct.error):
+        return None
+
+    refreshed_source = None
+    if ground_truth_alns_fp is not None:
+        source = header['source']
+        current = _source_key(ground_truth_alns_fp, digest=False)
+        if current['size'] != source['size']:
+            return None
+        if current['mtime'] != source['mtime']:
+            if _source_key(ground_truth_alns_fp)['md5'] != source['md5']:
+                return None
+            refreshed_source = dict(source, mtime=current['mtime'])
+
+    arrays = {}
+    for name, dtype, count, offset in header['arrays']:
+        arrays[name] = np.frombuffer(cache_map, dtype=np.dtype(str(dtype)),
+                                     count=count, offset=data_start + offset)
+    expected_alns = GroundTruth(
+        read_index=None,
+        contigs=[c.encode('latin-1') for c in header['contigs']],
+        offsets=arrays['offsets'],
+        contig=arrays['contig'],
+        start=arrays['start'],
+        end=arrays['end'],
+        bitscore=arrays['bitscore'],
+        weight=arrays['weight'],
+        read_ids=arrays['read_ids'])
+    if refreshed_source is not None:
+        # the store keeps the mapping of the replaced file
+        try:
+            write_ground_truth_cache(expected_alns, cache_fp,
+                                     refreshed_source)
+        except (IOError, OSError) as e:
+            sys.stderr.write("WARNING: could not write ground-truth cache "
+                             "%s: %s\n" % (cache_fp, e))
+    return expected_alns
+
+
+def _ground_truth_by_read(ground_truth_alns):
+    """Group the lines of a ground-truth BLAST file sorted by read id
+
+       Yields:
+       -------
+       read_id, contigs, starts, ends, weights
+          alignments of each read, sorted by decreasing bitscore, with the
+          weights of their bitscore tiers (see compute_accuracy)
+    """
+    previous_id = None
+    alignments = []
+    for line in ground_truth_alns:
+        line = line.split()
+        read_id = line[0]
+        if read_id != previous_id:
+            if alignments:
+                yield _read_alignments(previous_id, alignments)
+                alignments = []
+            if previous_id is not None and read_id < previous_id:
+                raise ValueError("ground truth is not sorted by read id: "
+                                 "%s after %s" % (read_id, previous_id))
+            previous_id = read_id
+        alignments.append((-float(line[11]), line[1], int(line[8]),
+                           int(line[9])))
+    if alignments:
+        yield _read_alignments(previous_id, alignments)
+
+
+def _read_alignments(read_id, alignments):
+    """Sort the (-bitscore, contig, start, end) alignments of a read and
+       compute their tier weights
+    """
+    # stable sort, ties keep their order in the file
+    alignments.sort(key=lambda x: x[0])
+    num_unique_bitscores = float(len(set(x[0] for x in alignments)))
+    weights = []
+    weight = num_unique_bitscores
+    for index in range(len(alignments)):
+        if index > 0 and alignments[index][0] > alignments[index-1][0]:
+            weight -= 1
+        weights.append(weight/num_unique_bitscores)
+    return (read_id, [x[1] for x in alignments], [x[2] for x in alignments],
+            [x[3] for x in alignments], weights)
+
+
+def collect_observed_alignments(observed_alns_fp, file_format="sam",
+                                processes=1):
     """Parses a file of observed alignments into a dictionary
        (BLAST or SAM)
 
@@ -49,51 +512,277 @@ def collect_observed_alignments(observed_alns_fp, file_format="sam"):
           filepath to observed alignments
        file_format : string
           file format of alignments (blast or sam)
+       processes : integer, optional
+          number of processes parsing chunks of the file in parallel
+          (plain text files only, compressed files are parsed serially)
 
        Returns:
        --------
        observed_alns : dict
           dictionary of observed alignments
     """
+    if file_format not in ("sam", "blast"):
+        raise ValueError("%s file format not supported" % file_format)
+
+    # compressed files cannot be split at byte offsets
+    if processes > 1 and input_format(observed_alns_fp) == 'text':
+        return _collect_observed_parallel(observed_alns_fp, file_format,
+                                          processes)
+
     observed_alns = {}
 
-    with open(observed_alns_fp, 'U') as observed_alns_f:
-        if file_format == "sam":
-            for line in observed_alns_f:
-                if line.startswith('@'):
-                    continue
-                line = line.strip().split('\t')
-                contig = line[2].split()
-                if contig:
-                    contig = contig[0]
-                # no alignment found for this read
-                if contig == "*":
-                    continue
-
-                read_id = line[0].split()
-                if read_id:
-                    read_id = read_id[0]
-                if read_id not in observed_alns:
-                    observed_alns[read_id] = line[1:]
-                else:
-                    raise ValueError("Only 1 alignment per read: %s" % read_id)
-
-        elif file_format == "blast":
-            for line in observed_alns_f:
-                line = line.strip().split('\t')
-                contig = line[1]
-                read_id = line[0]
-                if read_id not in observed_alns:
-                    observed_alns[read_id] = line[1:]
-                else:
-                    raise ValueError("Only 1 alignment per read: %s" % read_id)
+    with open_input(observed_alns_fp) as observed_alns_f:
+        for read_id, alignment in _parse_observed(observed_alns_f, file_format):
+            if read_id not in observed_alns:
+                observed_alns[read_id] = alignment
+            else:
+                raise ValueError("Only 1 alignment per read: %s" % read_id)
+
+    return observed_alns
+
+
+# size of the chunks of observed alignment files parsed in parallel (bytes)
+_OBSERVED_CHUNK_SIZE = 32 << 20
+
+
+def _line_aligned_chunks(fp, num_chunks):
+    """Split a file into at most num_chunks (start, end) byte ranges, each
+       starting at the beginning of a line
+    """
+    size = os.path.getsize(fp)
+    boundaries = [0]
+    with open(fp, 'rb') as f:
+        for i in range(1, num_chunks):
+            position = max(size * i // num_chunks, boundaries[-1])
+            if position >= size:
+                break
+            # move to the start of the first line at or after position
+            f.seek(position - 1)
+            f.readline()
+            position = f.tell()
+            if position > boundaries[-1] and position < size:
+                boundaries.append(position)
+    boundaries.append(size)
+    return zip(boundaries[:-1], boundaries[1:])
+
+
+def _parse_observed_chunk(args):
+    """Parse the lines of a byte range of an observed alignments file into a
+       dictionary (in a worker process), returned marshalled as it is much
+       faster to transfer than a pickled dictionary
+    """
+    observed_alns_fp, file_format, start, end = args
+    with open(observed_alns_fp, 'rb') as observed_alns_f:
+        observed_alns_f.seek(start)
+        lines = observed_alns_f.read(end - start).splitlines()
+    observed_alns = {}
+    for read_id, alignment in _parse_observed(lines, file_format):
+        if read_id not in observed_alns:
+            observed_alns[read_id] = alignment
         else:
-            raise ValueError("%s file format not supported" % file_format)
+            raise ValueError("Only 1 alignment per read: %s" % read_id)
+    return marshal.dumps(observed_alns, 2)
+
+
+def _collect_observed_parallel(observed_alns_fp, file_format, processes):
+    """Parse line-aligned chunks of an observed alignments file in a process
+       pool and merge them, checking for reads aligned in several chunks
+    """
+    num_chunks = max(processes,
+                     -(-os.path.getsize(observed_alns_fp) // _OBSERVED_CHUNK_SIZE))
+    tasks = [(observed_alns_fp, file_format, start, end)
+             for start, end in _line_aligned_chunks(observed_alns_fp,
+                                                    num_chunks)]
+    observed_alns = {}
+    pool = Pool(processes)
+    # the merged dictionary holds millions of lists, which would otherwise
+    # trigger repeated full garbage collections
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for chunk_alns in pool.imap(_parse_observed_chunk, tasks):
+            chunk_alns = marshal.loads(chunk_alns)
+            duplicates = observed_alns.viewkeys() & chunk_alns.viewkeys()
+            if duplicates:
+                raise ValueError("Only 1 alignment per read: %s" %
+                                 min(duplicates))
+            observed_alns.update(chunk_alns)
+    finally:
+        pool.terminate()
+        if gc_enabled:
+            gc.enable()
 
     return observed_alns
 
 
-def compute_accuracy(expected_alns, observed_alns, file_format="sam", offset=0):
+def collect_observed_hits(observed_alns_fp, file_format="sam", top_k=1,
+                          processes=1):
+    """Parses a file of observed alignments with several alignments (hits)
+       per read, keeping the best top_k hits of each read (BLAST or SAM)
+
+       Hits are ranked by the AS tag (SAM) or the bitscore (BLAST), in a
+       heap of at most top_k hits per read while the file is read, so
+       memory is bounded by top_k times the number of reads. SAM secondary
+       alignments (flag 0x100) are hits of their read and rank after its
+       primary alignment at equal score; supplementary alignments (flag
+       0x800) are parts of another hit and are skipped. Hits of equal
+       score otherwise keep their order in the file.
+
+       Parameters:
+       -----------
+       observed_alns_fp : string
+          filepath to observed alignments
+       file_format : string, optional
+          file format of alignments (blast or sam)
+       top_k : integer, optional
+          number of hits kept per read
+       processes : integer, optional
+          number of processes parsing chunks of the file in parallel
+          (plain text files only, compressed files are parsed serially)
+
+       Returns:
+       --------
+       observed_alns : dict
+          list of the best hits of each read id, best first
+    """
+    if file_format not in ("sam", "blast"):
+        raise ValueError("%s file format not supported" % file_format)
+    if top_k < 1:
+        raise ValueError("top_k must be at least 1: %s" % top_k)
+
+    if processes > 1 and input_format(observed_alns_fp) == 'text':
+        num_chunks = max(processes, -(-os.path.getsize(observed_alns_fp) //
+                                      _OBSERVED_CHUNK_SIZE))
+        tasks = [(observed_alns_fp, file_format, start, end, top_k)
+                 for start, end in _line_aligned_chunks(observed_alns_fp,
+                                                        num_chunks)]
+        heaps = {}
+        pool = Pool(processes)
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for chunk_heaps in pool.imap(_select_hits_chunk, tasks):
+                for read_id, heap in marshal.loads(chunk_heaps).iteritems():
+                    # a read whose hits span two chunks
+                    if read_id in heaps:
+                        heap = heapq.nlargest(top_k, heaps[read_id] + heap)
+                    heaps[read_id] = heap
+        finally:
+            pool.terminate()
+            if gc_enabled:
+                gc.enable()
+    else:
+        with open_input(observed_alns_fp) as observed_alns_f:
+            heaps = _select_hits(_parse_observed_hits(observed_alns_f,
+                                                      file_format), top_k)
+
+    for read_id, heap in heaps.iteritems():
+        heap.sort(reverse=True)
+        heaps[read_id] = [alignment for key, alignment in heap]
+    return heaps
+
+
+# rank of hits without a score
+_NO_SCORE = float('-inf')
+
+
+def _select_hits(hits, top_k, first_order=0):
+    """Keep the best top_k (key, alignment) hits of each read in a heap
+       (smallest key first), the key being (score, primary, -order)
+    """
+    heaps = {}
+    for order, (read_id, score, primary, alignment) in enumerate(
+            hits, first_order):
+        hit = ((_NO_SCORE if score is None else score, primary, -order),
+               alignment)
+        heap = heaps.get(read_id)
+        if heap is None:
+            heaps[read_id] = [hit]
+        elif len(heap) < top_k:
+            heapq.heappush(heap, hit)
+        elif hit[0] > heap[0][0]:
+            heapq.heapreplace(heap, hit)
+    return heaps
+
+
+def _select_hits_chunk(args):
+    """Select the best hits of the reads of a byte range of an observed
+       alignments file (in a worker process), returned marshalled
+    """
+    observed_alns_fp, file_format, start, end, top_k = args
+    with open(observed_alns_fp, 'rb') as observed_alns_f:
+        observed_alns_f.seek(start)
+        lines = observed_alns_f.read(end - start).splitlines()
+    # the byte offset of the chunk orders hits of equal score across chunks
+    return marshal.dumps(_select_hits(_parse_observed_hits(lines,
+                                                           file_format),
+                                      top_k, first_order=start), 2)
+
+
+def _parse_observed_hits(observed_alns_f, file_format="sam"):
+    """Parse the lines of an observed alignments file with several hits per
+       read (BLAST or SAM)
+
+       Yields:
+       -------
+       read_id, score, primary, alignment
+          the AS tag (None if missing) or bitscore of each hit, whether it
+          is a primary alignment and the alignment fields following the
+          read id; supplementary SAM alignments are skipped
+    """
+    if file_format == "sam":
+        for record in parse_sam(observed_alns_f, aligned_only=True):
+            flag = record.flag
+            if flag & 0x800:
+                continue
+            yield (record.read_id, record.alignment_score, not flag & 0x100,
+                   record.fields[1:])
+
+    elif file_format == "blast":
+        for line in observed_alns_f:
+            line = line.strip().split('\t')
+            yield line[0], float(line[11]), True, line[1:]
+    else:
+        raise ValueError("%s file format not supported" % file_format)
+
+
+def _parse_observed(observed_alns_f, file_format="sam"):
+    """Parse the lines of an observed alignments file (BLAST or SAM)
+
+       Yields:
+       -------
+       read_id, alignment
+          the alignment fields following the read id, for every aligned read
+    """
+    if file_format == "sam":
+        # reads without an alignment found are skipped
+        for record in parse_sam(observed_alns_f, aligned_only=True):
+            yield record.read_id, record.fields[1:]
+
+    elif file_format == "blast":
+        for line in observed_alns_f:
+            line = line.strip().split('\t')
+            yield line[0], line[1:]
+    else:
+        raise ValueError("%s file format not supported" % file_format)
+
+
+def _observed_position(alignment, file_format):
+    """Return the contig, position and strand (True for reverse-complement)
+       of an observed alignment
+    """
+    if file_format == "sam":
+        return alignment[1], int(alignment[2]), False
+    elif file_format == "blast":
+        # read mapped as reverse-complement when sstart > send
+        return (alignment[0], int(alignment[7]),
+                int(alignment[7]) - int(alignment[8]) > 0)
+    else:
+        raise ValueError("%s file format not supported" % file_format)
+
+
+def compute_accuracy(expected_alns, observed_alns, file_format="sam", offset=0,
+                     hits=None):
     """For each observed alignment, compute the accuracy score based on the list of
        expected alignments. The accuracy score is between [0,1] and is weighted based
        on the quality of the alignment given by the bit score.
@@ -110,9 +799,10 @@ def compute_accuracy(expected_alns, observed_alns, file_format="sam", offset=0):
 
        Parameters:
        -----------
-       expected_alns : dictionary
-          dictionary of expected alignments, keys are read ids and values are
-          a list of of BLAST alignments
+       expected_alns : GroundTruth or dictionary
+          store of expected alignments (see collect_ground_truth), or a
+          dictionary with read ids as keys and lists of BLAST alignments
+          as values
        observed_alns : dictionary
           dictionary of observed alignments, keys are read ids and values are
           a list of SAM or BLAST alignments
@@ -121,6 +811,11 @@ def compute_accuracy(expected_alns, observed_alns, file_format="sam", offset=0):
        offset : integer, optional
           the maximum difference between the expected alignment position and
           the observed
+       hits : string, optional
+          None if observed_alns holds one alignment per read, or "best" or
+          "any" if it holds lists of hits per read, best first (see
+          collect_observed_hits), to score the best hit or the best score
+          of any hit
 
        Returns:
        --------
@@ -128,80 +823,755 @@ def compute_accuracy(expected_alns, observed_alns, file_format="sam", offset=0):
           the total accuracy score between [0,1] for all alignments in observed
           alignments
     """
-    total_accuracy_score = 0.0
     all_accuracy_scores = []
-    false_negative = set()
-    false_positive = set()
-    true_positive = set()
 
-    if file_format == "sam":
-        obs_contig_index = 1
-        obs_pos_index = 2
-    elif file_format == "blast":
-        obs_contig_index = 0
-        obs_pos_index = 7
+    if hits is None:
+        for obs_contig, obs_pos, exp_contigs, exp_positions, weights in \
+                _expected_for_observed(expected_alns, observed_alns,
+                                       file_format, offset):
+            weight = _match_weight(obs_contig, obs_pos, exp_contigs,
+                                   exp_positions, weights, offset)
+            if weight is not None:
+                all_accuracy_scores.append(weight)
+    else:
+        for expected in _expected_for_observed(expected_alns, observed_alns,
+                                               file_format, offset, hits):
+            matched = [weight for weight in
+                       (_match_weight(*(hit + (offset,))) for hit in expected)
+                       if weight is not None]
+            if matched:
+                all_accuracy_scores.append(max(matched))
+
+    total_accuracy_score = float(sum(all_accuracy_scores)/len(observed_alns))
+        
+    return total_accuracy_score*100.0
+
+
+def compute_accuracy_curve(expected_alns, observed_alns, file_format="sam",
+                           max_offset=10, hits=None):
+    """Compute the accuracy score of compute_accuracy for every offset from 0
+       to max_offset in a single pass over the observed alignments.
+
+       For each read, the smallest distance between the observed position and
+       an expected alignment on the same contig is recorded per bitscore tier.
+       The read scores the weight of the best tier within the offset, so its
+       contribution is a step function of the offset, accumulated for all
+       reads into a cumulative curve.
+
+       Parameters:
+       -----------
+       expected_alns : GroundTruth or dictionary
+          expected alignments (see compute_accuracy)
+       observed_alns : dictionary
+          dictionary of observed alignments, keys are read ids and values are
+          a list of SAM or BLAST alignments
+       file_format : string, optional
+          file format of observed alignments (SAM or BLAST)
+       max_offset : integer, optional
+          the largest offset of the curve
+       hits : string, optional
+          None, "best" or "any" (see compute_accuracy)
+
+       Returns:
+       --------
+       accuracy_curve : list
+          total accuracy score (%) for offsets 0, 1, ..., max_offset
+    """
+    if max_offset < 0:
+        raise ValueError("max_offset must be positive: %s" % max_offset)
+    # steps[d] is the change of the summed scores from offset d-1 to d
+    steps = [0.0] * (max_offset + 2)
+
+    if hits is None:
+        for obs_contig, obs_pos, exp_contigs, exp_positions, weights in \
+                _expected_for_observed(expected_alns, observed_alns,
+                                       file_format, max_offset):
+            _add_score_steps(steps, obs_contig, obs_pos, exp_contigs,
+                             exp_positions, weights)
     else:
+        for expected in _expected_for_observed(expected_alns, observed_alns,
+                                               file_format, max_offset, hits):
+            if len(expected) == 1:
+                _add_score_steps(steps, *expected[0])
+            elif expected:
+                _add_hits_score_steps(steps, expected)
+
+    return _accuracy_curve(steps, len(observed_alns))
+
+
+def _match_weight(obs_contig, obs_pos, exp_contigs, exp_positions, weights,
+                  offset):
+    """Return the weight of the first (best) expected alignment matching the
+       observed contig and position within offset, or None
+    """
+    for index in range(len(weights)):
+        if ((obs_contig == exp_contigs[index]) and
+                (abs(obs_pos - exp_positions[index]) <= offset)):
+            return weights[index]
+    return None
+
+
+def _add_score_steps(steps, obs_contig, obs_pos, exp_contigs, exp_positions,
+                     weights):
+    """Add the accuracy score of a read as a step function of the offset to
+       steps, where steps[d] is the change of the score from offset d-1 to d
+       and the last element stands for offsets out of range
+    """
+    unreached = len(steps) - 1
+    # distance at which a better tier starts to match
+    reach = unreached
+    tier_weight = None
+    tier_distance = unreached
+    for index in range(len(weights) + 1):
+        if index == len(weights) or weights[index] != tier_weight:
+            # the previous tier scores from its distance until a better
+            # tier matches
+            if tier_distance < reach:
+                steps[tier_distance] += tier_weight
+                steps[reach] -= tier_weight
+                reach = tier_distance
+            if index == len(weights) or reach == 0:
+                break
+            tier_weight = weights[index]
+            tier_distance = unreached
+        if obs_contig == exp_contigs[index]:
+            distance = abs(obs_pos - exp_positions[index])
+            if distance < tier_distance:
+                tier_distance = distance
+
+
+def _add_hits_score_steps(steps, expected):
+    """Add the accuracy score of a read with several hits to steps (see
+       _add_score_steps). The read scores the best weight matched by any of
+       its hits, so each tier scores from its smallest distance to a hit
+       until a better tier matches.
+    """
+    unreached = len(steps) - 1
+    tier_distances = {}
+    for obs_contig, obs_pos, exp_contigs, exp_positions, weights in expected:
+        for index in range(len(weights)):
+            if obs_contig == exp_contigs[index]:
+                distance = abs(obs_pos - exp_positions[index])
+                if distance < tier_distances.get(weights[index], unreached):
+                    tier_distances[weights[index]] = distance
+    reach = unreached
+    for weight in sorted(tier_distances, reverse=True):
+        distance = tier_distances[weight]
+        if distance < reach:
+            steps[distance] += weight
+            steps[reach] -= weight
+            reach = distance
+
+
+def _accuracy_curve(steps, num_observed):
+    """Accumulate score steps into the total accuracy score (%) per offset"""
+    accuracy_curve = []
+    total_score = 0.0
+    for offset in range(len(steps) - 1):
+        total_score += steps[offset]
+        accuracy_curve.append(total_score/num_observed*100.0)
+    return accuracy_curve
+
+
+def _expected_for_observed(expected_alns, observed_alns, file_format, window,
+                           hits=None):
+    """For each observed alignment of a read in the ground truth, yield the
+       observed contig code and position with the contig codes, positions and
+       weights of the expected alignments of the read (positions on the
+       strand of the observed alignment), best weight first.
+
+       For reads with many expected alignments, only those on the observed
+       contig within +-window of the observed position are yielded, found by
+       binary search in the position index of the store.
+
+       With hits "best" or "any", observed_alns holds lists of hits per read
+       (see collect_observed_hits) and the alignments of all hits ("any") or
+       of the best one are yielded as a list per read.
+    """
+    if file_format not in ("sam", "blast"):
         raise ValueError("%s file format not supported" % file_format)
+    if hits not in (None, "best", "any"):
+        raise ValueError("%s is not a hits mode" % hits)
+
+    if not isinstance(expected_alns, GroundTruth):
+        expected_alns = GroundTruth.from_dict(expected_alns)
+    contig_index = dict((c, i) for i, c in enumerate(expected_alns.contigs))
 
-    for read_id in observed_alns:
-        if read_id not in expected_alns:
+    # the read numbers of all observed reads are coded at once
+    read_ids = list(observed_alns)
+    offsets = expected_alns.offsets
+    for read_id, read in izip(read_ids,
+                              expected_alns.read_codec.encode(
+                                  read_ids).tolist()):
+        if read < 0:
             #print "WARNING: alignment %s in observed but not expected" % read_id
             continue
-        obs_contig = observed_alns[read_id][obs_contig_index]
-        obs_pos = int(observed_alns[read_id][obs_pos_index])
-        if file_format == "blast":
-            # read mapped as reverse-complement
-            if (int(observed_alns[read_id][7]) - int(observed_alns[read_id][8]) > 0):
-                obs_strand = 16
-            else:
-                obs_strand = 0
-        # compute the total number of unique bitscores in list of expected alignments
-        unique_bitscores = set()
-        for exp_aln in expected_alns[read_id]:
-            unique_bitscores.add(exp_aln[10])
-        num_unique_bitscores = float(len(unique_bitscores))
-        # find the expected alignment for this read
-        index = 0
-        weight = num_unique_bitscores
-        for exp_aln in expected_alns[read_id]:
-            exp_contig = exp_aln[0]
-            if ((file_format == "blast") and (obs_strand == 16)):
-                exp_pos = int(exp_aln[8])
-            else:
-                exp_pos = int(exp_aln[7])
-            # alignment found, compute accuracy score and go to next read
-            if ((obs_contig == exp_contig) and (abs(obs_pos - exp_pos) <= offset)):
-                accuracy_score = float(weight/num_unique_bitscores)
-                all_accuracy_scores.append(accuracy_score)
-                break
-            if index < len(expected_alns[read_id]) - 1:
-                # decrement the weight
-                if float(expected_alns[read_id][index+1][10]) < float(exp_aln[10]):
-                    weight -= 1
-            index += 1
+        lo, hi = int(offsets[read]), int(offsets[read+1])
+        if hits is None:
+            expected = _expected_for_alignment(
+                expected_alns, contig_index, lo, hi, observed_alns[read_id],
+                file_format, window)
+            if expected is not None:
+                yield expected
+            continue
+        alignments = observed_alns[read_id]
+        if hits == "best":
+            alignments = alignments[:1]
+        expected = [_expected_for_alignment(expected_alns, contig_index, lo,
+                                            hi, alignment, file_format,
+                                            window)
+                    for alignment in alignments]
+        yield [e for e in expected if e is not None]
 
-    total_accuracy_score = float(sum(all_accuracy_scores)/len(observed_alns))
-        
-    return total_accuracy_score*100.0
+
+def _expected_for_alignment(expected_alns, contig_index, lo, hi, alignment,
+                            file_format, window):
+    """The observed contig code and position of an alignment with the
+       expected alignments of its read in rows lo:hi of the store (see
+       _expected_for_observed), or None if none can match
+    """
+    obs_contig, obs_pos, reverse = _observed_position(alignment, file_format)
+    obs_contig = contig_index.get(obs_contig)
+    if hi - lo > _INDEX_MIN_ALIGNMENTS:
+        if obs_contig is None:
+            return None
+        exp_positions, weights = expected_alns.near(
+            lo, hi, obs_contig, obs_pos, window, end=reverse)
+        exp_contigs = [obs_contig] * len(weights)
+    else:
+        exp_contigs = expected_alns.contig[lo:hi].tolist()
+        # read mapped as reverse-complement, compare to the end position
+        if reverse:
+            exp_positions = expected_alns.end[lo:hi].tolist()
+        else:
+            exp_positions = expected_alns.start[lo:hi].tolist()
+        # weights of the bitscore tiers are precomputed by the store
+        weights = expected_alns.weight[lo:hi].tolist()
+    return obs_contig, obs_pos, exp_contigs, exp_positions, weights
 
 
 def compute_precision(expected_alns, observed_alns):
     """
     """
-    expected_alns_keys = set(expected_alns.keys())
-    observed_alns_keys = set(observed_alns.keys())
-
     # compute true positive, false positive and false negative read counts
-    tp = len(observed_alns_keys & expected_alns_keys)
-    fp = len(observed_alns_keys - expected_alns_keys)
-    fn = len(expected_alns_keys - observed_alns_keys)
+    # (read ids are unique in both, so the observed reads coded as reads of
+    # the ground truth are the true positives)
+    if isinstance(expected_alns, GroundTruth):
+        read_codec = expected_alns.read_codec
+    else:
+        read_codec = ReadIdCodec(list(expected_alns))
+    tp = int(np.count_nonzero(read_codec.encode(observed_alns) >= 0))
+    fp = len(observed_alns) - tp
+    fn = len(expected_alns) - tp
+
+    p, r, f = _precision_recall(tp, fp, fn)
+
+    return tp, fp, fn, p, r, f
+
 
-    # compute precision, recall and F-measure for read counts
+def _precision_recall(tp, fp, fn):
+    """Compute precision, recall and F-measure for read counts"""
     p = tp / float(tp + fp)
     r = tp / float(tp + fn)
     f = float(2 * p * r) / float(p + r)
 
-    return tp, fp, fn, p, r, f
+    return p, r, f
+
+
+def evaluate_alignments(expected_alns, observed_alns, file_format="sam",
+                        offsets=(0,), profile=None, hits=None):
+    """Compute the read counts, precision, recall, F-measure and accuracy
+       scores of observed alignments
+
+       Parameters:
+       -----------
+       profile : StageProfile, optional
+          profile measuring the accuracy and precision stages
+       hits : string, optional
+          None, "best" or "any" (see compute_accuracy)
+
+       Returns:
+       --------
+       num_observed, tp, fp, fn, p, r, f, accuracies
+          number of aligned reads, the results of compute_precision and the
+          total accuracy score (%) for each offset
+    """
+    if profile is None:
+        profile = StageProfile(enabled=False)
+
+    with profile.stage('accuracy') as stage:
+        stage.records = len(observed_alns)
+        if len(offsets) == 1:
+            accuracies = [compute_accuracy(expected_alns=expected_alns,
+                                           observed_alns=observed_alns,
+                                           file_format=file_format,
+                                           offset=offsets[0],
+                                           hits=hits)]
+        else:
+            accuracy_curve = compute_accuracy_curve(
+                expected_alns=expected_alns,
+                observed_alns=observed_alns,
+                file_format=file_format,
+                max_offset=max(offsets),
+                hits=hits)
+            accuracies = [accuracy_curve[o] for o in offsets]
+
+    with profile.stage('precision') as stage:
+        stage.records = len(observed_alns)
+        tp, fp, fn, p, r, f = compute_precision(expected_alns, observed_alns)
+
+    return len(observed_alns), tp, fp, fn, p, r, f, accuracies
+
+
+def format_result(num_observed, total_reads, tp, fp, fn, p, r, f, accuracies):
+    """Format the results of a tool as a row of the accuracy table (without
+       the tool columns), each field followed by a tab
+    """
+    total_reads_mapped = float(num_observed)/float(total_reads)
+
+    return ("%s\t%.2f\t%s\t%s\t%s\t%.3f\t%.3f\t%.3f\t" %
+            (num_observed, total_reads_mapped, tp, fp, fn, p, r, f) +
+            "".join("%.2f\t" % accuracy for accuracy in accuracies))
+
+
+def stream_accuracy(expected_alns_fp, observed_alns_fp, file_format="sam",
+                    offsets=(0,), checkpoint_fp=None, resume=False,
+                    checkpoint_interval=300):
+    """Compute the accuracy scores and read counts of compute_accuracy and
+       compute_precision by reading both files in lockstep, in constant
+       memory. Both files must be sorted by read id (in byte order, e.g. with
+       LC_ALL=C sort).
+
+       With a checkpoint file, the position reached in both files and the
+       running counts and sums are saved to it every checkpoint_interval
+       seconds, so that an interrupted run can be resumed from its last
+       checkpoint with the same result as an uninterrupted run. The
+       checkpoint is removed when the run completes.
+
+       Parameters:
+       -----------
+       expected_alns_fp : string
+          filepath of ground-truth BLAST alignments
+       observed_alns_fp : string
+          filepath to observed alignments
+       file_format : string, optional
+          file format of observed alignments (SAM or BLAST)
+       offsets : list, optional
+          offsets to compute the accuracy score for
+       checkpoint_fp : string, optional
+          filepath of the checkpoint (JSON)
+       resume : boolean, optional
+          continue from checkpoint_fp if it exists
+       checkpoint_interval : number, optional
+          seconds between checkpoints
+
+       Returns:
+       --------
+       num_observed, tp, fp, fn : integers
+          number of aligned reads, true positive, false positive and false
+          negative read counts
+       accuracies : list
+          total accuracy score (%) for each offset
+    """
+    max_offset = max(offsets)
+    state = {'expected_offset': 0,
+             'observed_offset': 0,
+             'previous_id': None,
+             'num_observed': 0,
+             'tp': 0,
+             'fn': 0,
+             # summed in the order of the reads, as sum() of the scores
+             'accuracy_sum': 0,
+             'steps': [0.0] * (max_offset + 2)}
+    sources = None
+    if checkpoint_fp is not None:
+        sources = {'expected': _source_key(expected_alns_fp, digest=False),
+                   'observed': _source_key(observed_alns_fp, digest=False),
+                   'file_format': file_format,
+                   'offsets': list(offsets)}
+        if resume:
+            state = read_checkpoint(checkpoint_fp, sources) or state
+
+    steps = state['steps']
+    accuracy_sum = state['accuracy_sum']
+    num_observed = state['num_observed']
+    tp = state['tp']
+    fn = state['fn']
+    previous_id = state['previous_id']
+    last_checkpoint = time.time()
+
+    with _open_lines(expected_alns_fp, state['expected_offset'],
+                     checkpoint_fp is not None) as ground_truth_alns:
+        with _open_lines(observed_alns_fp, state['observed_offset'],
+                         checkpoint_fp is not None) as observed_alns_f:
+            expected = _ground_truth_by_read(ground_truth_alns)
+            if checkpoint_fp is not None:
+                expected = _groups_with_offsets(expected, ground_truth_alns)
+            exp_read = next(expected, None)
+            for read_id, alignment in _parse_observed(observed_alns_f,
+                                                      file_format):
+                if previous_id is not None and read_id <= previous_id:
+                    if read_id == previous_id:
+                        raise ValueError("Only 1 alignment per read: %s" %
+                                         read_id)
+                    raise ValueError("observed alignments are not sorted by "
+                                     "read id: %s after %s" %
+                                     (read_id, previous_id))
+                previous_id = read_id
+                num_observed += 1
+                # expected reads without an observed alignment
+                while exp_read is not None and exp_read[0] < read_id:
+                    fn += 1
+                    exp_read = next(expected, None)
+                if exp_read is not None and exp_read[0] == read_id:
+                    tp += 1
+                    obs_contig, obs_pos, reverse = _observed_position(
+                        alignment, file_format)
+                    exp_positions = exp_read[3] if reverse else exp_read[2]
+                    if len(offsets) == 1:
+                        weight = _match_weight(obs_contig, obs_pos,
+                                               exp_read[1], exp_positions,
+                                               exp_read[4], max_offset)
+                        if weight is not None:
+                            accuracy_sum += weight
+                    else:
+                        _add_score_steps(steps, obs_contig, obs_pos,
+                                         exp_read[1], exp_positions,
+                                         exp_read[4])
+                    exp_read = next(expected, None)
+
+                if checkpoint_fp is not None and \
+                        num_observed % _CHECKPOINT_CHECK_RECORDS == 0 and \
+                        time.time() - last_checkpoint >= checkpoint_interval:
+                    write_checkpoint(checkpoint_fp, sources, {
+                        # the pending expected read is read again on resume
+                        'expected_offset': expected.offset(exp_read),
+                        'observed_offset': observed_alns_f.offset,
+                        'previous_id': previous_id,
+                        'num_observed': num_observed,
+                        'tp': tp,
+                        'fn': fn,
+                        'accuracy_sum': accuracy_sum,
+                        'steps': steps})
+                    last_checkpoint = time.time()
+            while exp_read is not None:
+                fn += 1
+                exp_read = next(expected, None)
+
+    if len(offsets) == 1:
+        accuracies = [float(accuracy_sum/num_observed)*100.0]
+    else:
+        accuracy_curve = _accuracy_curve(steps, num_observed)
+        accuracies = [accuracy_curve[o] for o in offsets]
+
+    if checkpoint_fp is not None and os.path.exists(checkpoint_fp):
+        os.remove(checkpoint_fp)
+
+    return num_observed, tp, num_observed - tp, fn, accuracies
+
+
+# observed records between two checks of the time of the last checkpoint
+_CHECKPOINT_CHECK_RECORDS = 1000
+_CHECKPOINT_VERSION = 1
+
+
+class _OffsetLines(object):
+    """Lines of a file, counting the bytes read (of the decompressed data for
+       compressed files) from the start of the file
+    """
+
+    def __init__(self, f, offset=0):
+        self._f = f
+        # start and end of the last line read
+        self._position = [offset, offset]
+        # a generator costs much less per line than a next method
+        self._lines = self._count(f, self._position)
+
+    @staticmethod
+    def _count(f, position):
+        end = position[1]
+        for line in f:
+            position[0] = end
+            end += len(line)
+            position[1] = end
+            yield line
+
+    @property
+    def offset(self):
+        return self._position[1]
+
+    @property
+    def line_start(self):
+        return self._position[0]
+
+    def __iter__(self):
+        return self._lines
+
+    def next(self):
+        return next(self._lines)
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _open_lines(fp, offset=0, count_offsets=True):
+    """Open a file for reading its lines from a byte offset, as returned by
+       the offset of _OffsetLines (a plain text file is opened as is when
+       offsets are not needed)
+    """
+    if not count_offsets:
+        return open_input(fp)
+    if input_format(fp) == 'text':
+        f = open(fp, 'rb')
+        f.seek(offset)
+        return _OffsetLines(f, offset)
+    # compressed data cannot be sought, the lines before offset are skipped
+    lines = _OffsetLines(open_input(fp))
+    while lines.offset < offset:
+        try:
+            next(lines)
+        except StopIteration:
+            break
+    if lines.offset != offset:
+        lines.close()
+        raise ValueError("%s does not have a line starting at %d" %
+                         (fp, offset))
+    return lines
+
+
+class _groups_with_offsets(object):
+    """Reads of _ground_truth_by_read with the byte offset of the first line
+       of the last read yielded, to read it again on resume
+    """
+
+    def __init__(self, groups, lines):
+        self._groups = groups
+        self._lines = lines
+        self._start = lines.offset
+        self._next_start = lines.offset
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        group = next(self._groups)
+        self._start = self._next_start
+        # the first line of the next read was read to end this read
+        self._next_start = self._lines.line_start
+        return group
+
+    def offset(self, read):
+        """Offset to resume from with read pending (None once all reads
+           were used)
+        """
+        return self._start if read is not None else self._lines.offset
+
+
+def write_checkpoint(checkpoint_fp, sources, state):
+    """Save the state of stream_accuracy with the identity of its inputs,
+       replacing checkpoint_fp at once
+    """
+    f, tmp_fp = mkstemp(prefix='.checkpoint_',
+                        dir=os.path.dirname(os.path.abspath(checkpoint_fp)))
+    try:
+        with os.fdopen(f, 'w') as checkpoint_f:
+            # floats are written with repr, which reads back to the same value
+            json.dump({'version': _CHECKPOINT_VERSION,
+                       'sources': sources,
+                       'state': state}, checkpoint_f, sort_keys=True)
+        os.rename(tmp_fp, checkpoint_fp)
+    except:
+        os.remove(tmp_fp)
+        raise
+
+
+def read_checkpoint(checkpoint_fp, sources):
+    """State saved by write_checkpoint, None if there is no checkpoint
+
+       Raises ValueError if the checkpoint is of other inputs or options.
+    """
+    try:
+        checkpoint_f = open(checkpoint_fp)
+    except IOError:
+        return None
+    with checkpoint_f:
+        checkpoint = json.load(checkpoint_f)
+    if checkpoint.get('version') != _CHECKPOINT_VERSION or \
+            checkpoint.get('sources') != json.loads(json.dumps(sources)):
+        raise ValueError("checkpoint %s is not of these inputs and options" %
+                         checkpoint_fp)
+    state = checkpoint['state']
+    if state['previous_id'] is not None:
+        state['previous_id'] = str(state['previous_id'])
+    return state
+
+
+def sample_accuracy(expected_alns_fp, observed_alns_fp, file_format="sam",
+                    offsets=(0,), fraction=0.01, seed=0, confidence=0.95):
+    """Estimate the read counts, precision, recall, F-measure and accuracy
+       scores of evaluate_alignments from a sample of the reads, with their
+       confidence intervals
+
+       Both files are read in any order, keeping the alignments of the
+       reads of a ReadSample only, so that memory holds the sample. Each
+       metric is a ratio of sums over reads (e.g. precision is true
+       positive reads over observed reads), estimated by the ratio of the
+       sums over the sampled reads; its confidence interval is the normal
+       interval of the linearized variance of the ratio under Bernoulli
+       sampling of the reads with probability fraction.
+
+       Parameters:
+       -----------
+       expected_alns_fp : string
+          filepath of ground-truth BLAST alignments
+       observed_alns_fp : string
+          filepath to observed alignments
+       file_format : string, optional
+          file format of observed alignments (SAM or BLAST)
+       offsets : list, optional
+          offsets to compute the accuracy score for
+       fraction : float, optional
+          fraction of reads sampled, in (0, 1]
+       seed : integer, optional
+          seed of the sample
+       confidence : float, optional
+          confidence level of the intervals
+
+       Returns:
+       --------
+       num_observed, tp, fp, fn : integers
+          estimated number of aligned reads and read counts (the counts of
+          the sample divided by fraction)
+       p, r, f : floats
+          estimated precision, recall and F-measure
+       accuracies : list
+          estimated total accuracy score (%) for each offset
+       intervals : dict
+          (low, high) confidence interval of precision, recall, fmeasure
+          and accuracy_<offset>
+    """
+    if file_format not in ("sam", "blast"):
+        raise ValueError("%s file format not supported" % file_format)
+    if not 0 < confidence < 1:
+        raise ValueError("the confidence level must be in (0, 1): %s" %
+                         confidence)
+    sample = ReadSample(fraction, seed)
+    max_offset = max(offsets)
+
+    builder = _GroundTruthBuilder()
+    with open_input(expected_alns_fp) as ground_truth_alns:
+        for line in sample.lines(ground_truth_alns):
+            line = line.split()
+            builder.add(line[0], line[1], line[8], line[9], line[11])
+    expected_alns = builder.build()
+    observed_alns = {}
+    with open_input(observed_alns_fp) as observed_alns_f:
+        for read_id, alignment in _parse_observed(
+                sample.lines(observed_alns_f), file_format):
+            if read_id in observed_alns:
+                raise ValueError("Only 1 alignment per read: %s" % read_id)
+            observed_alns[read_id] = alignment
+
+    # per read of the sample: observed reads first, then the expected reads
+    # without an observed alignment
+    read_ids = list(observed_alns)
+    reads = expected_alns.read_codec.encode(read_ids)
+    num_observed = len(read_ids)
+    true_positive = reads >= 0
+    num_fn = len(expected_alns) - int(np.count_nonzero(true_positive))
+    scores = np.zeros((num_observed + num_fn, len(offsets)))
+    contig_index = dict((c, i) for i, c in enumerate(expected_alns.contigs))
+    for index, (read_id, read) in enumerate(izip(read_ids, reads.tolist())):
+        if read < 0:
+            continue
+        expected = _expected_for_alignment(
+            expected_alns, contig_index, int(expected_alns.offsets[read]),
+            int(expected_alns.offsets[read+1]), observed_alns[read_id],
+            file_format, max_offset)
+        if expected is not None:
+            steps = [0.0] * (max_offset + 2)
+            _add_score_steps(steps, *expected)
+            scores[index] = np.cumsum(steps)[offsets]
+
+    observed = np.zeros(num_observed + num_fn)
+    observed[:num_observed] = 1
+    tp = np.zeros(num_observed + num_fn)
+    tp[:num_observed] = true_positive
+    expected = tp.copy()
+    expected[num_observed:] = 1
+
+    z = _normal_quantile(0.5 + confidence / 2.0)
+    p, p_interval = _ratio_interval(tp, observed, fraction, z, 1.0)
+    r, r_interval = _ratio_interval(tp, expected, fraction, z, 1.0)
+    # F-measure is 2 tp / (2 tp + fp + fn), where tp + fp are the observed
+    # reads and tp + fn the expected reads
+    f, f_interval = _ratio_interval(2 * tp, observed + expected, fraction, z,
+                                    1.0)
+    intervals = {'precision': p_interval,
+                 'recall': r_interval,
+                 'fmeasure': f_interval}
+    accuracies = []
+    for column, o in enumerate(offsets):
+        accuracy, intervals['accuracy_%d' % o] = _ratio_interval(
+            scores[:, column], observed, fraction, z, 100.0)
+        accuracies.append(accuracy)
+
+    num_tp = int(np.count_nonzero(true_positive))
+    return (int(round(num_observed / fraction)),
+            int(round(num_tp / fraction)),
+            int(round((num_observed - num_tp) / fraction)),
+            int(round(num_fn / fraction)),
+            p, r, f, accuracies, intervals)
+
+
+def _ratio_interval(a, b, fraction, z, scale):
+    """Estimate sum(a)/sum(b) of all reads from the values of the sampled
+       reads, with its confidence interval (z standard errors, clipped to
+       [0, scale]) and the estimate scaled by scale
+    """
+    total = b.sum()
+    if not total:
+        raise ValueError("no read of the sample to estimate a ratio, "
+                         "increase the sample fraction")
+    ratio = a.sum() / total
+    deviations = a - ratio * b
+    half_width = z * math.sqrt((1 - fraction) *
+                               np.dot(deviations, deviations)) / total
+    return (ratio * scale, (max(ratio - half_width, 0.0) * scale,
+                            min(ratio + half_width, 1.0) * scale))
+
+
+def _normal_quantile(probability):
+    """Quantile of the standard normal distribution, by bisection of its
+       cumulative distribution function
+    """
+    low, high = -10.0, 10.0
+    for _ in range(100):
+        middle = (low + high) / 2.0
+        if 0.5 * (1 + math.erf(middle / math.sqrt(2))) < probability:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2.0
+
+
+def _cache_mode(no_cache, rebuild_cache):
+    """Translate the cache options of the command line to a cache mode of
+       load_ground_truth
+    """
+    if no_cache and rebuild_cache:
+        raise ValueError("--no_cache and --rebuild_cache are mutually exclusive")
+    if no_cache:
+        return "off"
+    if rebuild_cache:
+        return "rebuild"
+    return "auto"
 
 
 @click.command()
@@ -215,30 +1585,162 @@ def compute_precision(expected_alns, observed_alns):
               help='tool which generated observed_alns_fp')
 @click.option('--offset', type=int, required=False,
               help='maximum absolute difference between expected and observed origin position')
+@click.option('--offsets', type=str, required=False,
+              help='comma-separated offsets (or ranges, e.g. 0-50) to output '
+                   'one accuracy column each, computed in a single pass')
 @click.option('--observed_aln_format', type=str, default='sam', show_default=True,
               required=False, help='file format of observed_alns_fp')
 @click.option('--total_reads', type=int, required=True,
               help='total number of sequences used in alignment for generating observed_alns_fp')
-def _main(expected_alns_fp, observed_alns_fp, tool, offset, observed_aln_format, total_reads):
+@click.option('--stream', is_flag=True, default=False, show_default=True,
+              help='read both files in lockstep in constant memory, both must '
+                   'be sorted by read id (LC_ALL=C sort)')
+@click.option('--no_cache', is_flag=True, default=False, show_default=True,
+              help='parse expected_alns_fp without reading or writing its '
+                   'binary cache (%s)' % GROUND_TRUTH_CACHE_SUFFIX)
+@click.option('--rebuild_cache', is_flag=True, default=False, show_default=True,
+              help='parse expected_alns_fp and overwrite its binary cache')
+@click.option('--processes', type=int, default=1, show_default=True,
+              help='number of processes parsing observed_alns_fp')
+@click.option('--top_k', type=int, required=False,
+              help='allow several alignments per read in observed_alns_fp, '
+                   'keeping the best top_k of each read by AS tag or '
+                   'bitscore (SAM supplementary alignments are skipped)')
+@click.option('--hits', type=click.Choice(['best', 'any']), default='best',
+              show_default=True,
+              help='with --top_k, score the best hit of each read or the best '
+                   'score of any of its top_k hits')
+@click.option('--profile', 'profile_fp', required=False,
+              type=click.Path(resolve_path=True, writable=True),
+              help='write a JSON report of the time, records per second and '
+                   'peak memory of each stage to this file')
+@click.option('--profile_top', type=int, default=0, show_default=True,
+              help='with --profile, run each stage under cProfile and report '
+                   'its top functions by cumulative time')
+@click.option('--checkpoint', 'checkpoint_fp', required=False,
+              type=click.Path(resolve_path=True, writable=True),
+              help='with --stream, save the progress of the run to this file '
+                   'periodically (removed when the run completes)')
+@click.option('--resume', is_flag=True, default=False, show_default=True,
+              help='continue the run from its --checkpoint file if it exists')
+@click.option('--checkpoint_interval', type=float, default=300,
+              show_default=True, help='seconds between two checkpoints')
+@click.option('--sample', type=float, required=False,
+              help='estimate the results from this fraction of the reads, '
+                   'selected by a hash of their read id, and write their '
+                   'confidence intervals to stderr')
+@click.option('--sample_seed', type=int, default=0, show_default=True,
+              help='seed of the reads selected by --sample')
+@click.option('--confidence', type=float, default=0.95, show_default=True,
+              help='confidence level of the intervals of --sample')
+def _main(expected_alns_fp, observed_alns_fp, tool, offset, offsets, observed_aln_format, total_reads,
+          stream, no_cache, rebuild_cache, processes, top_k, hits, profile_fp,
+          profile_top, checkpoint_fp, resume, checkpoint_interval, sample,
+          sample_seed, confidence):
     """
     """
     allowed_alignment_types = ["sam", "blast"]
     if observed_aln_format not in allowed_alignment_types:
         raise ValueError("%s is not supported" % observed_aln_format)
 
-    expected_alns = collect_ground_truth(ground_truth_alns_fp=expected_alns_fp)
-    observed_alns = collect_observed_alignments(observed_alns_fp=observed_alns_fp, file_format=observed_aln_format)
-    accuracy = compute_accuracy(expected_alns=expected_alns,
-                                observed_alns=observed_alns,
-                                file_format=observed_aln_format,
-                                offset=offset)
+    if offsets is not None:
+        if offset is not None:
+            raise ValueError("--offset and --offsets are mutually exclusive")
+        offsets = parse_offsets(offsets)
+    elif offset is not None:
+        offsets = [offset]
+    else:
+        offsets = [0]
+
+    if top_k is None:
+        hits = None
+    elif stream:
+        raise ValueError("--top_k is not supported with --stream")
+    if checkpoint_fp is not None and not stream:
+        raise ValueError("--checkpoint is only supported with --stream")
+    if resume and checkpoint_fp is None:
+        raise ValueError("--resume requires --checkpoint")
+    if sample is not None and (stream or top_k is not None):
+        raise ValueError("--sample is not supported with --stream or --top_k")
 
-    tp, fp, fn, p, r, f = compute_precision(expected_alns, observed_alns)
+    profile = StageProfile(enabled=profile_fp is not None, top=profile_top)
+    if sample is not None:
+        with profile.stage('sample_accuracy') as stage:
+            (num_observed, tp, fp, fn, p, r, f, accuracies,
+             intervals) = sample_accuracy(
+                expected_alns_fp=expected_alns_fp,
+                observed_alns_fp=observed_alns_fp,
+                file_format=observed_aln_format,
+                offsets=offsets,
+                fraction=sample,
+                seed=sample_seed,
+                confidence=confidence)
+            stage.records = num_observed
+        sys.stderr.write("# estimated from %g of the reads (seed %d), "
+                         "%g confidence intervals\n"
+                         % (sample, sample_seed, confidence))
+        for name, value in ([('precision', p), ('recall', r),
+                             ('fmeasure', f)] +
+                            [('accuracy_%d' % o, accuracy)
+                             for o, accuracy in zip(offsets, accuracies)]):
+            sys.stderr.write("%s\t%.3f\t%.3f\t%.3f\n"
+                             % ((name, value) + intervals[name]))
+    elif stream:
+        with profile.stage('stream_accuracy') as stage:
+            num_observed, tp, fp, fn, accuracies = stream_accuracy(
+                expected_alns_fp=expected_alns_fp,
+                observed_alns_fp=observed_alns_fp,
+                file_format=observed_aln_format,
+                offsets=offsets,
+                checkpoint_fp=checkpoint_fp,
+                resume=resume,
+                checkpoint_interval=checkpoint_interval)
+            stage.records = num_observed
+        p, r, f = _precision_recall(tp, fp, fn)
+    else:
+        with profile.stage('ground_truth') as stage:
+            expected_alns = load_ground_truth(ground_truth_alns_fp=expected_alns_fp,
+                                              cache=_cache_mode(no_cache, rebuild_cache))
+            stage.records = len(expected_alns.contig)
+            stage.counts = {'reads': len(expected_alns),
+                            'alignments': len(expected_alns.contig),
+                            'contigs': len(expected_alns.contigs)}
+        with profile.stage('observed') as stage:
+            if top_k is None:
+                observed_alns = collect_observed_alignments(observed_alns_fp=observed_alns_fp,
+                                                            file_format=observed_aln_format,
+                                                            processes=processes)
+            else:
+                observed_alns = collect_observed_hits(observed_alns_fp=observed_alns_fp,
+                                                      file_format=observed_aln_format,
+                                                      top_k=top_k,
+                                                      processes=processes)
+                if profile.enabled:
+                    stage.counts['hits'] = sum(len(read_hits) for read_hits
+                                               in observed_alns.itervalues())
+            stage.records = len(observed_alns)
+            stage.counts['observed_alns'] = len(observed_alns)
+        num_observed, tp, fp, fn, p, r, f, accuracies = evaluate_alignments(
+            expected_alns=expected_alns,
+            observed_alns=observed_alns,
+            file_format=observed_aln_format,
+            offsets=offsets,
+            profile=profile,
+            hits=hits)
 
-    total_reads_mapped = float(len(observed_alns))/float(total_reads)
+    sys.stdout.write(format_result(num_observed, total_reads, tp, fp, fn,
+                                   p, r, f, accuracies))
 
-    sys.stdout.write("%s\t%.2f\t%s\t%s\t%s\t%.3f\t%.3f\t%.3f\t%.2f\t" %
-        (len(observed_alns), total_reads_mapped, tp, fp, fn, p, r, f, accuracy))
+    if profile_fp is not None:
+        profile.write(profile_fp, tool=tool,
+                      expected_alns_fp=expected_alns_fp,
+                      expected_alns_size=os.path.getsize(expected_alns_fp),
+                      observed_alns_fp=observed_alns_fp,
+                      observed_alns_size=os.path.getsize(observed_alns_fp),
+                      observed_aln_format=observed_aln_format,
+                      offsets=offsets, stream=stream, processes=processes,
+                      top_k=top_k, hits=hits, sample=sample,
+                      sample_seed=sample_seed)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+"""
+Unit tests for alignment_io.py
+==============================
+"""
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, Evguenia Kopylova
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+
+from skbio.util import remove_files
+from tempfile import mkstemp
+from os import close
+import gzip
+import struct
+import zlib
+
+import alignment_io
+from alignment_io import input_format, open_input
+from suppl_compute_accuracy import (collect_observed_alignments,
+                                    stream_accuracy)
+from test_suppl_compute_accuracy import (expected_alignments_1,
+                                         observed_sam_alignments_1,
+                                         observed_blast_alignments_sorted)
+
+
+def bgzf_compress(data, block_size=100):
+    """BGZF blocks of data, with a small block size to span many blocks"""
+    blocks = []
+    for i in range(0, len(data), block_size) + [len(data)]:
+        chunk = data[i:i + block_size]
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        cdata = compressor.compress(chunk) + compressor.flush()
+        blocks.append(struct.pack('<BBBBIBBHBBHH', 31, 139, 8, 4, 0, 0, 255,
+                                  6, 66, 67, 2, len(cdata) + 25) +
+                      cdata + struct.pack('<II', zlib.crc32(chunk) & 0xffffffff,
+                                          len(chunk)))
+    return ''.join(blocks)
+
+
+def bam_encode(header, references, records):
+    """Uncompressed BAM data of SAM header text and (read_id, flag, ref_id,
+       pos, mapq, cigar, seq, qual, tags) records
+    """
+    data = [alignment_io.BAM_MAGIC, struct.pack('<i', len(header)), header,
+            struct.pack('<i', len(references))]
+    for name, length in references:
+        data.append(struct.pack('<i', len(name) + 1) + name + '\0' +
+                    struct.pack('<i', length))
+    codes = dict((c, i) for i, c in enumerate(alignment_io._SEQ_BASES))
+    for read_id, flag, ref_id, pos, mapq, cigar, seq, qual, tags in records:
+        cigar_ops = [length << 4 | alignment_io._CIGAR_OPS.index(op)
+                     for length, op in cigar]
+        padded = seq + '=' * (len(seq) % 2)
+        packed = ''.join(chr(codes[padded[i]] << 4 | codes[padded[i + 1]])
+                         for i in range(0, len(padded), 2))
+        record = (struct.pack('<iiBBHHHiiii', ref_id, pos - 1,
+                              len(read_id) + 1, mapq, 0, len(cigar_ops), flag,
+                              len(seq), -1, -1, 0) +
+                  read_id + '\0' +
+                  struct.pack('<%dI' % len(cigar_ops), *cigar_ops) + packed +
+                  (''.join(chr(ord(q) - 33) for q in qual) or
+                   '\xff' * len(seq)) + tags)
+        data.append(struct.pack('<i', len(record)) + record)
+    return ''.join(data)
+
+
+class AlignmentIOTests(TestCase):
+    """ Tests for alignment_io.py functionality """
+
+    def setUp(self):
+        """
+        """
+        self.files_to_remove = []
+
+    def tearDown(self):
+        remove_files(self.files_to_remove)
+
+    def _write(self, suffix, data):
+        f, fp = mkstemp(prefix='alignment_io_', suffix=suffix)
+        close(f)
+        with open(fp, 'wb') as tmp:
+            tmp.write(data)
+        self.files_to_remove.append(fp)
+        return fp
+
+    def _write_gzip(self, data):
+        f, fp = mkstemp(prefix='alignment_io_', suffix='.gz')
+        close(f)
+        # two gzip members, as written by concatenating gzip files
+        half = len(data) // 2
+        for i, part in enumerate([data[:half], data[half:]]):
+            member = gzip.open(fp, 'ab' if i else 'wb')
+            member.write(part)
+            member.close()
+        self.files_to_remove.append(fp)
+        return fp
+
+    def test_open_input_compressed(self):
+        """ Lines of gzip and BGZF files are the lines of the plain text
+        """
+        text_fp = self._write('.sam', observed_sam_alignments_1)
+        gzip_fp = self._write_gzip(observed_sam_alignments_1)
+        bgzf_fp = self._write('.sam.gz',
+                              bgzf_compress(observed_sam_alignments_1))
+
+        self.assertEqual('text', input_format(text_fp))
+        self.assertEqual('gzip', input_format(gzip_fp))
+        self.assertEqual('bgzf', input_format(bgzf_fp))
+        with open_input(text_fp) as text_f:
+            lines = list(text_f)
+        for fp in [gzip_fp, bgzf_fp]:
+            for threads in [1, 3]:
+                with open_input(fp, threads=threads) as input_f:
+                    self.assertEqual(lines, list(input_f))
+
+    def test_open_input_bam(self):
+        """ BAM records are decoded into SAM lines after the header
+        """
+        header = "@HD\tVN:1.0\n@SQ\tSN:ref1\tLN:5000\n@SQ\tSN:ref2\tLN:300\n"
+        records = [
+            ('s1', 0, 0, 1400, 60, [(4, 'S'), (90, 'M'), (1, 'I'), (5, 'M')],
+             'ACGTN' * 20, 'I' * 100,
+             'ASC\xc8' + 'NMi' + struct.pack('<i', 2) + 'XAZtool\0' +
+             'XBBs' + struct.pack('<ihh', 2, 7, -3)),
+            ('s2', 16, 1, 25, 3, [(11, 'M')], 'ACGTTGCAACG', '',
+             'ASs' + struct.pack('<h', 180)),
+            ('s3', 4, -1, 0, 0, [], '', '', '')]
+        data = bam_encode(header, [('ref1', 5000), ('ref2', 300)], records)
+        raw_bam_fp = self._write('.bam', data)
+        bam_fp = self._write('.bam', bgzf_compress(data, block_size=37))
+
+        self.assertEqual('raw_bam', input_format(raw_bam_fp))
+        self.assertEqual('bam', input_format(bam_fp))
+        expected = header.splitlines(True) + [
+            "s1\t0\tref1\t1400\t60\t4S90M1I5M\t*\t0\t0\t%s\t%s\tAS:i:200\t"
+            "NM:i:2\tXA:Z:tool\tXB:B:s,7,-3\n" % ('ACGTN' * 20, 'I' * 100),
+            "s2\t16\tref2\t25\t3\t11M\t*\t0\t0\tACGTTGCAACG\t*\tAS:i:180\n",
+            "s3\t4\t*\t0\t0\t*\t*\t0\t0\t*\t*\n"]
+        for fp in [raw_bam_fp, bam_fp]:
+            with open_input(fp) as input_f:
+                self.assertEqual(expected, list(input_f))
+
+    def test_compressed_alignments(self):
+        """ The accuracy scripts read compressed ground truth and observed
+            alignments, with parallel parsing falling back to serial
+        """
+        exp_fp = self._write_gzip(expected_alignments_1)
+        obs_fp = self._write('.blast.gz',
+                             bgzf_compress(observed_blast_alignments_sorted))
+        obs_text_fp = self._write('.blast', observed_blast_alignments_sorted)
+
+        self.assertEqual(collect_observed_alignments(obs_text_fp, "blast"),
+                         collect_observed_alignments(obs_fp, "blast",
+                                                     processes=2))
+        exp_text_fp = self._write('.txt', expected_alignments_1)
+        self.assertEqual(stream_accuracy(exp_text_fp, obs_text_fp, "blast"),
+                         stream_accuracy(exp_fp, obs_fp, "blast"))
+
+    def test_open_input_errors(self):
+        """ Errors of the decompression thread are raised in the parser
+        """
+        data = bgzf_compress("read\tline\n" * 200)
+        fp = self._write('.gz', data[:-40])
+        with self.assertRaises(ValueError):
+            with open_input(fp) as input_f:
+                list(input_f)
+
+
+if __name__ == '__main__':
+    main()
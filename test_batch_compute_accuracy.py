@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+Unit tests for batch_compute_accuracy.py
+========================================
+"""
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, Evguenia Kopylova
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+
+from skbio.util import remove_files
+from tempfile import mkstemp
+from os import close
+
+from batch_compute_accuracy import parse_tools, batch_compute_accuracy
+from test_suppl_compute_accuracy import (expected_alignments_1,
+                                         observed_sam_alignments_1,
+                                         observed_blast_alignments_1)
+
+
+class BatchComputeAccuracyTests(TestCase):
+    """ Tests for batch_compute_accuracy.py functionality """
+
+    def setUp(self):
+        """
+        """
+        self.files_to_remove = []
+        self.exp_alns_1_fp = self._write('exp_alns_1_', '.txt',
+                                         expected_alignments_1)
+        self.obs_sam_alns_1_fp = self._write('obs_alns_1_', '.sam',
+                                             observed_sam_alignments_1)
+        self.obs_blast_alns_1_fp = self._write('obs_alns_1_', '.blast',
+                                               observed_blast_alignments_1)
+        self.tools_fp = self._write(
+            'tools_', '.txt',
+            "# tool\tparameters\tobserved\tformat\tusertime\twalltime\n"
+            "tool1\tdefault\t%s\tsam\t12\t15\n"
+            "tool2\t-k 5\t%s\tblast\n" % (self.obs_sam_alns_1_fp,
+                                         self.obs_blast_alns_1_fp))
+
+    def tearDown(self):
+        remove_files(self.files_to_remove)
+
+    def _write(self, prefix, suffix, data):
+        f, fp = mkstemp(prefix=prefix, suffix=suffix)
+        close(f)
+        with open(fp, 'w') as tmp:
+            tmp.write(data)
+        self.files_to_remove.append(fp)
+        return fp
+
+    def test_parse_tools(self):
+        """
+        """
+        tools = parse_tools(self.tools_fp)
+
+        self.assertEqual(
+            [('tool1', 'default', self.obs_sam_alns_1_fp, 'sam', ['12', '15']),
+             ('tool2', '-k 5', self.obs_blast_alns_1_fp, 'blast', [])],
+            tools)
+
+    def test_batch_compute_accuracy(self):
+        """ Rows are output in the order of the tools, with the same results
+            in worker processes as in the main process
+        """
+        tools = parse_tools(self.tools_fp)
+
+        rows = list(batch_compute_accuracy(self.exp_alns_1_fp, tools,
+                                           total_reads=4, cache="off"))
+        rows_parallel = list(batch_compute_accuracy(self.exp_alns_1_fp, tools,
+                                                    total_reads=4,
+                                                    processes=2, cache="off"))
+
+        self.assertEqual(
+            ["tool1\tdefault\t3\t0.75\t3\t0\t0\t1.000\t1.000\t1.000\t"
+             "100.00\t100.00\t100.00\t12\t15\n",
+             "tool2\t-k 5\t3\t0.75\t3\t0\t0\t1.000\t1.000\t1.000\t"
+             "100.00\t100.00\t100.00\t\n"],
+            rows)
+        self.assertEqual(rows, rows_parallel)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Unit tests for benchmarks.py
+============================
+"""
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, Evguenia Kopylova
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+
+import json
+import subprocess
+import sys
+from os.path import abspath, dirname
+
+from benchmarks import COMMANDS, STARTUP_BUDGETS, startup_seconds
+
+
+class BenchmarksTests(TestCase):
+    """ Tests for benchmarks.py functionality """
+
+    def _imported(self, args):
+        """Heavy modules imported by a fresh interpreter running benchmarks.py
+           with args
+        """
+        return json.loads(subprocess.check_output(
+            [sys.executable, '-c', imported_script, json.dumps(args)],
+            cwd=dirname(abspath(__file__))))
+
+    def test_help_imports(self):
+        """ The help of benchmarks.py imports none of the heavy modules, and
+            the help of a subcommand only the module of the subcommand and
+            its dependencies, never matplotlib or skbio
+        """
+        self.assertEqual([], self._imported(['--help']))
+        for command in sorted(COMMANDS):
+            imported = self._imported([command, '--help'])
+            self.assertEqual([], [module for module in imported
+                                  if module not in ('numpy',
+                                                    'suppl_compute_accuracy')],
+                             command)
+        self.assertEqual([], self._imported(['compare', '--help']))
+        # the plotting scripts do not import the scoring code
+        for command in ['graph', 'graph3d']:
+            self.assertEqual(['numpy'], self._imported([command, '--help']))
+
+    def test_startup_budgets(self):
+        """ Every subcommand has a startup budget, timed by
+            python benchmark_suite.py startup rather than by the tests
+        """
+        self.assertEqual(set([None]) | set(COMMANDS), set(STARTUP_BUDGETS))
+        self.assertRaises(ValueError, startup_seconds, 'plot')
+
+
+imported_script = """import json, sys
+from StringIO import StringIO
+import benchmarks
+# the help is not part of the output
+sys.stdout = StringIO()
+try:
+    benchmarks.cli.main(json.loads(sys.argv[1]))
+except SystemExit:
+    pass
+sys.stdout = sys.__stdout__
+print(json.dumps([module for module in ['numpy', 'matplotlib',
+                  'mpl_toolkits.mplot3d', 'brewer2mpl', 'skbio',
+                  'suppl_compute_accuracy']
+                  if module in sys.modules]))
+"""
+
+
+if __name__ == '__main__':
+    main()
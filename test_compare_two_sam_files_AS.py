@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Unit tests for compare_two_sam_files_AS.py
+==========================================
+"""
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, Evguenia Kopylova
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+
+from skbio.util import remove_files
+from tempfile import mkstemp
+from os import close
+
+from compare_two_sam_files_AS import collect_inputs
+from fasta_index import FASTA_INDEX_SUFFIX
+from test_compute_stats_unique_alignments import reads, alignments
+
+
+class CompareTwoSamFilesASTests(TestCase):
+    """ Tests for compare_two_sam_files_AS.py functionality """
+
+    def setUp(self):
+        """
+        """
+        self.files_to_remove = []
+        self.reads_fp = self._write('reads_', '.fasta', reads)
+        self.files_to_remove.append(self.reads_fp + FASTA_INDEX_SUFFIX)
+        self.s1_fp = self._write('alns_1_', '.sam', alignments)
+        self.s2_fp = self._write('alns_2_', '.sam', alignments_2)
+
+    def tearDown(self):
+        remove_files(self.files_to_remove, error_on_missing=False)
+
+    def _write(self, prefix, suffix, data):
+        f, fp = mkstemp(prefix=prefix, suffix=suffix)
+        close(f)
+        with open(fp, 'w') as tmp:
+            tmp.write(data)
+        self.files_to_remove.append(fp)
+        return fp
+
+    def test_collect_inputs(self):
+        """ The reads and both SAM files give the same tables whether they
+            are parsed concurrently or one after another
+        """
+        tables = list(collect_inputs(self.reads_fp, self.s1_fp, self.s2_fp,
+                                     'tool1', 'tool2'))
+
+        for processes in [2, 3]:
+            self.assertEqual(tables, list(collect_inputs(
+                self.reads_fp, self.s1_fp, self.s2_fp, 'tool1', 'tool2',
+                processes=processes)))
+        expected_mapping, s1_mapping, s2_mapping = tables
+        self.assertEqual({'s1': [10], 's2': [10], 's3': [8], 's4': [20]},
+                         expected_mapping)
+        self.assertEqual(['ref1', 300, '4M1I6M', 11, 1, 22], s1_mapping['s2'])
+        self.assertEqual(['s1', 's2', 's4', 's5'], sorted(s1_mapping))
+        self.assertEqual({'s1': ['ref1', 104, '10M', 10, 0, 9]}, s2_mapping)
+
+    def test_collect_inputs_error(self):
+        """ Errors of a parsing process are raised
+        """
+        with open(self.s2_fp, 'a') as tmp:
+            tmp.write(alignments_2)
+        for processes in [1, 3]:
+            with self.assertRaises(ValueError):
+                list(collect_inputs(self.reads_fp, self.s1_fp, self.s2_fp,
+                                    'tool1', 'tool2', processes=processes))
+
+
+alignments_2 = "s1\t0\tref1\t104\t60\t10M\t*\t0\t0\tA\tI\tAS:i:9\n"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+Unit tests for compute_stats_unique_alignments.py
+=================================================
+"""
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, Evguenia Kopylova
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+
+from skbio.util import remove_files
+from tempfile import mkstemp
+from os import close
+
+import numpy as np
+
+from compute_stats_unique_alignments import (alignment_stats,
+                                             cigar_arrays,
+                                             collect_alignments,
+                                             collect_reads)
+from fasta_index import FASTA_INDEX_SUFFIX
+from sam_parser import cigar_stats
+
+
+class ComputeStatsUniqueAlignmentsTests(TestCase):
+    """ Tests for compute_stats_unique_alignments.py functionality """
+
+    def setUp(self):
+        """
+        """
+        self.files_to_remove = []
+        self.reads_fp = self._write('reads_', '.fasta', reads)
+        self.files_to_remove.append(self.reads_fp + FASTA_INDEX_SUFFIX)
+        self.sam_fp = self._write('alns_', '.sam', alignments)
+
+    def tearDown(self):
+        remove_files(self.files_to_remove, error_on_missing=False)
+
+    def _write(self, prefix, suffix, data):
+        f, fp = mkstemp(prefix=prefix, suffix=suffix)
+        close(f)
+        with open(fp, 'w') as tmp:
+            tmp.write(data)
+        self.files_to_remove.append(fp)
+        return fp
+
+    def test_cigar_arrays(self):
+        """ CIGAR strings decoded together give the statistics of each
+            string decoded alone
+        """
+        cigars = ['150M', '5S145M', '70M1I10M3D69M', '*', '', '12M100N3I2D1M',
+                  '1=2X3M']
+        align_len, num_indel = cigar_arrays(cigars)
+
+        self.assertEqual([cigar_stats(cigar) for cigar in cigars],
+                         zip(align_len.tolist(), num_indel.tolist()))
+        self.assertRaises(ValueError, cigar_arrays, ['10M5', 'S'])
+
+    def test_alignment_stats(self):
+        """ Statistics of the reads aligned once, in the order of a
+            dictionary of their ids
+        """
+        expected_mapping = collect_reads(self.reads_fp)
+        self.assertEqual({'s1': [10, 0], 's2': [10, 2], 's3': [8, 0],
+                          's4': [20, 1]},
+                         expected_mapping)
+
+        stats = collect_alignments(self.sam_fp, expected_mapping, 'tool')
+        order = list({'s1': 0, 's2': 0, 's4': 0})
+        read_length = dict(zip(['s1', 's2', 's4'], [10, 10, 20]))
+        self.assertEqual([read_length[read] for read in order],
+                         stats['read_length'].tolist())
+
+        coverage = dict(zip(['s1', 's2', 's4'], [0.5, 1.1, 1.0]))
+        self.assertEqual((3, 1, sum(coverage[read] for read in order), 0.5,
+                          1.1, 3, 49, 40, 2),
+                         alignment_stats(stats, 15))
+
+        with open(self.sam_fp, 'a') as tmp:
+            tmp.write(alignments.splitlines()[-1] + '\n')
+        self.assertRaises(ValueError, collect_alignments, self.sam_fp,
+                          expected_mapping, 'tool')
+
+    def test_alignment_stats_order(self):
+        """ The low and high coverage follow the order reads are visited in
+        """
+        stats = dict((name, np.array(values)) for name, values in [
+            ('read_length', [10, 10, 10]), ('num_amb_nt', [0, 0, 0]),
+            ('align_len', [9, 8, 10]), ('num_indel', [0, 0, 0]),
+            ('sw_score', [1, 1, 1])])
+        # reads lowering the low coverage are not candidates for the high
+        self.assertEqual((0.8, 1.0), alignment_stats(stats, 0)[3:5])
+        stats['align_len'] = np.array([10, 9, 8])
+        self.assertEqual((0.8, 1.0), alignment_stats(stats, 0)[3:5])
+        stats['align_len'] = np.array([9, 10, 9])
+        self.assertEqual((0.9, 1.0), alignment_stats(stats, 0)[3:5])
+        stats['align_len'] = np.array([8, 9])
+        stats['read_length'] = np.array([10, 10])
+        self.assertEqual((0.8, 0.9), alignment_stats(stats, 0)[3:5])
+        stats['align_len'] = np.array([9, 8])
+        self.assertEqual((0.8, 0.0), alignment_stats(stats, 0)[3:5])
+
+
+reads = """>s1 extra
+ACGTACGTAC
+>s2
+ACGTNNGTAC
+>s3
+ACGTACGT
+>s4
+ACGTACGTACNCGTACGTAC
+"""
+
+alignments = """@HD\tVN:1.0
+s1\t0\tref1\t100\t60\t5S5M\t*\t0\t0\tA\tI\tNM:i:0\tAS:i:10
+s2\t0\tref1\t300\t60\t4M1I6M\t*\t0\t0\tA\tI\tAS:i:22
+s3\t4\t*\t0\t0\t*\t*\t0\t0\tA\tI
+s5\t0\tref2\t5\t60\t10M\t*\t0\t0\tA\tI\tAS:i:18
+s4\t16\tref2\t9\t60\t20M\t*\t0\t0\tA\tI\tAS:i:17
+"""
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Unit tests for external_sort.py
+===============================
+"""
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, Evguenia Kopylova
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+
+from skbio.util import remove_files
+from tempfile import mkdtemp, mkstemp
+from os import close, listdir, rmdir
+import random
+
+import external_sort
+from external_sort import external_sort as sort_lines, hit_key, \
+    sort_alignments
+
+
+class ExternalSortTests(TestCase):
+    """ Tests for external_sort.py functionality """
+
+    def setUp(self):
+        """
+        """
+        rand = random.Random(0)
+        self.lines = ["r%d\tref1\t99.0\t150\t1\t0\t1\t150\t%d\t%d\t1e-70\t%.1f\n"
+                      % (rand.randrange(50), i, i + 149,
+                         rand.randrange(10) * 10.0) for i in range(500)]
+        # stable sort: equal bitscores of a read keep their input order
+        self.expected = sorted(self.lines, key=hit_key)
+        self.tmp_dir = mkdtemp(prefix='external_sort_test_')
+        self.files_to_remove = []
+
+    def tearDown(self):
+        remove_files(self.files_to_remove, error_on_missing=False)
+        rmdir(self.tmp_dir)
+
+    def test_hit_key(self):
+        """ Lines sort by read id, then by descending bitscore
+        """
+        self.assertEqual(('r1', -20.5), hit_key(
+            'r1\tref1\t99.0\t10\t0\t0\t1\t10\t5\t14\t1e-5\t20.5\n'))
+        self.assertRaises(ValueError, hit_key, 'r1\tref1\t99.0\n')
+
+    def test_external_sort_in_memory(self):
+        """ Lines fitting in the buffer are sorted without temporary files
+        """
+        self.assertEqual(self.expected,
+                         list(sort_lines(self.lines + ['\n'],
+                                         tmp_dir=self.tmp_dir)))
+        self.assertEqual([], listdir(self.tmp_dir))
+
+    def test_external_sort_runs(self):
+        """ Lines spilled to many runs, merged in several passes, give the
+            stable sort of the lines and the runs are removed
+        """
+        merge_width = external_sort._MERGE_WIDTH
+        external_sort._MERGE_WIDTH = 3
+        try:
+            # about 20 lines per run
+            sorted_lines = list(sort_lines(self.lines, buffer_mb=0.005,
+                                           tmp_dir=self.tmp_dir))
+        finally:
+            external_sort._MERGE_WIDTH = merge_width
+        self.assertEqual(self.expected, sorted_lines)
+        self.assertEqual([], listdir(self.tmp_dir))
+
+    def test_sort_alignments(self):
+        """ A file is sorted into another, a last line without a newline
+            included
+        """
+        f, input_fp = mkstemp(prefix='external_sort_', suffix='.m8')
+        close(f)
+        output_fp = input_fp + '.sorted'
+        self.files_to_remove.extend([input_fp, output_fp])
+        with open(input_fp, 'w') as tmp:
+            tmp.write(''.join(self.lines).rstrip('\n'))
+
+        sort_alignments(input_fp, output_fp, buffer_mb=0.01,
+                        tmp_dir=self.tmp_dir)
+        with open(output_fp) as sorted_f:
+            self.assertEqual(self.expected, sorted_f.readlines())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+Unit tests for fasta_index.py
+=============================
+"""
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, Evguenia Kopylova
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+
+from skbio.parse.sequences import parse_fasta
+from skbio.util import remove_files
+from tempfile import mkstemp
+from os import close, utime
+from os.path import exists
+import gzip
+
+from fasta_index import (build_fasta_index, load_fasta_index,
+                         read_fasta_index, read_lengths,
+                         FASTA_INDEX_SUFFIX)
+
+
+class FastaIndexTests(TestCase):
+    """ Tests for fasta_index.py functionality """
+
+    def setUp(self):
+        """
+        """
+        self.files_to_remove = []
+        self.reads_fp = self._write('.fasta', reads)
+        self.index_fp = self.reads_fp + FASTA_INDEX_SUFFIX
+        self.files_to_remove.append(self.index_fp)
+
+    def tearDown(self):
+        remove_files(self.files_to_remove, error_on_missing=False)
+
+    def _write(self, suffix, data):
+        f, fp = mkstemp(prefix='fasta_index_', suffix=suffix)
+        close(f)
+        with open(fp, 'w') as tmp:
+            tmp.write(data)
+        self.files_to_remove.append(fp)
+        return fp
+
+    def test_build_fasta_index(self):
+        """ Lengths and N counts of multi-line records are those of the
+            parsed sequences, and offsets point at the sequences
+        """
+        index = build_fasta_index(self.reads_fp)
+
+        with open(self.reads_fp, 'U') as reads_f:
+            parsed = [(label.split()[0], len(seq), seq.count('N'))
+                      for label, seq in parse_fasta(reads_f)]
+        self.assertEqual(parsed, [(name, length, num_amb_nt)
+                                  for name, length, _, num_amb_nt in index])
+        self.assertEqual([('s1', 14, 15, 1), ('s2', 16, 35, 0),
+                          ('s4', 4, 56, 4)], index)
+        self.assertEqual('ACGTA', reads[index[0][2]:index[0][2] + 5])
+
+        gzip_fp = self._write('.fasta.gz', '')
+        with gzip.open(gzip_fp, 'wb') as gzip_f:
+            gzip_f.write(reads)
+        self.assertEqual(index, build_fasta_index(gzip_fp))
+
+        self.assertRaises(ValueError, build_fasta_index,
+                          self._write('.fasta', reads + '>s2\nAC\n'))
+
+    def test_load_fasta_index(self):
+        """ The index is written next to the FASTA file, read back while
+            the FASTA file is unchanged and rebuilt when it changes
+        """
+        index = load_fasta_index(self.reads_fp)
+
+        self.assertTrue(exists(self.index_fp))
+        self.assertEqual(index, read_fasta_index(self.index_fp,
+                                                 self.reads_fp))
+        self.assertEqual(index, load_fasta_index(self.reads_fp))
+
+        with open(self.reads_fp, 'a') as tmp:
+            tmp.write('>s5\nACGN\n')
+        utime(self.reads_fp, (0, 0))
+        self.assertEqual(None, read_fasta_index(self.index_fp, self.reads_fp))
+        self.assertEqual(('s5', 4, 65, 1), load_fasta_index(self.reads_fp)[-1])
+
+    def test_read_lengths(self):
+        """ Read lengths come from the FASTA index, or from the CIGAR string
+            or sequence of a SAM file
+        """
+        self.assertEqual([('s1', 14, 1), ('s2', 16, 0), ('s4', 4, 4)],
+                         read_lengths(self.reads_fp))
+
+        sam_fp = self._write('.sam', reads_sam)
+        self.assertEqual([('r1', 12, 1), ('r2', 9, 0), ('r3', 4, 0)],
+                         read_lengths(sam_fp))
+
+
+reads = """>s1 first read
+ACGTACGT
+ACGNAC
+>s2
+ACGTACGTACGTACGT
+>s4
+NNNN
+"""
+
+reads_sam = """@HD\tVN:1.0
+r1\t0\tref1\t100\t60\t2H8M2S\t*\t0\t0\tACGTANGTAC\tIIIIIIIIII
+r1\t256\tref1\t900\t0\t10M\t*\t0\t0\t*\t*
+r2\t4\t*\t0\t0\t*\t*\t0\t0\tACGTACGTA\tIIIIIIIII
+r3\t16\tref1\t5\t60\t4M\t*\t0\t0\t*\t*
+"""
+
+
+if __name__ == '__main__':
+    main()
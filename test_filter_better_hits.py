@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+"""
+Unit tests for filter_better_hits.py
+====================================
+"""
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, Evguenia Kopylova
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+
+from skbio.util import remove_files
+from tempfile import mkstemp
+from os import close
+
+from external_sort import external_sort
+from filter_better_hits import (alignments_grouped, collect_origins,
+                                filter_better_hits, shard_range,
+                                _shard_lines)
+
+
+class FilterBetterHitsTests(TestCase):
+    """ Tests for filter_better_hits.py functionality """
+
+    def setUp(self):
+        """
+        """
+        self.files_to_remove = []
+        self.illumina_fp = self._write('.fasta', illumina_reads)
+        self.alignments_fp = self._write('.m8', alignments)
+
+    def tearDown(self):
+        remove_files(self.files_to_remove, error_on_missing=False)
+
+    def _write(self, suffix, data):
+        f, fp = mkstemp(prefix='filter_better_hits_', suffix=suffix)
+        close(f)
+        with open(fp, 'w') as tmp:
+            tmp.write(data)
+        self.files_to_remove.append(fp)
+        return fp
+
+    def test_collect_origins(self):
+        """ The origin of each read is parsed from the Mason labels, the SAM
+            file or the CureSim labels
+        """
+        origins = collect_origins('illumina', self.illumina_fp)
+        self.assertEqual(5, len(origins))
+        self.assertEqual(('ref2', 300), origins.origin(origins.index('r3')))
+        self.assertEqual(None, origins.index('r6'))
+        self.assertFalse(origins.match_position)
+
+        origins = collect_origins('454', self._write('.sam', reads_sam))
+        self.assertEqual(('ref1', 500), origins.origin(origins.index('r5')))
+        self.assertTrue(origins.match_position)
+
+        origins = collect_origins('ion', self._write('.fasta', ion_reads))
+        self.assertEqual(('ref2', 400),
+                         origins.origin(origins.index('ref2_read_4_400_0')))
+        self.assertEqual(None, origins.index('ref2_read_4_400'))
+        self.assertEqual(0, len(collect_origins('ion',
+                                                self._write('.fasta', ''))))
+
+        self.assertRaises(ValueError, collect_origins, 'pacbio',
+                          self.illumina_fp)
+        self.assertRaises(ValueError, collect_origins, 'illumina',
+                          self._write('.fasta', illumina_reads +
+                                      illumina_reads.split('\n', 2)[2]))
+
+    def test_filter_better_hits(self):
+        """ Reads whose best hit is off their origin, or tied with another
+            hit, are output once
+        """
+        origins = collect_origins('illumina', self.illumina_fp)
+        with open(self.alignments_fp) as alignments_f:
+            self.assertEqual(['r2', 'r3', 'r4'],
+                             list(filter_better_hits(origins, alignments_f)))
+
+        # the best hit of r5 is on the contig but not the start of its origin
+        origins = collect_origins('454', self._write('.sam', reads_sam))
+        self.assertEqual(['r3', 'r4'],
+                         list(filter_better_hits(origins,
+                                                 alignments.splitlines())))
+
+    def test_filter_better_hits_errors(self):
+        """ Alignments of unknown or ungrouped reads are errors
+        """
+        origins = collect_origins('illumina', self.illumina_fp)
+        lines = alignments.splitlines()
+        self.assertRaises(ValueError, list,
+                          filter_better_hits(origins, lines + [lines[0]]))
+        self.assertRaises(ValueError, list,
+                          filter_better_hits(origins, ['r6\tref1' +
+                                                       '\t0' * 10]))
+
+    def test_alignments_grouped(self):
+        """ Alignments not grouped by read, or not best hit first, are
+            sorted into the order the filter expects
+        """
+        origins = collect_origins('illumina', self.illumina_fp)
+        lines = alignments.splitlines(True)
+        self.assertTrue(alignments_grouped(origins, lines))
+
+        ungrouped = lines[1:] + lines[:1]
+        worst_first = lines[1::-1] + lines[2:]
+        for unsorted in [ungrouped, worst_first]:
+            self.assertFalse(alignments_grouped(origins, unsorted))
+            self.assertEqual(['r2', 'r3', 'r4'],
+                             list(filter_better_hits(
+                                 origins, external_sort(unsorted))))
+
+    def test_shard_range(self):
+        """ Shards start at the first alignment of a read and together
+            give the output of a single run
+        """
+        origins = collect_origins('illumina', self.illumina_fp)
+        for num_shards in range(1, 8):
+            ranges = [shard_range(self.alignments_fp, shard, num_shards)
+                      for shard in range(num_shards)]
+            self.assertEqual(0, ranges[0][0])
+            self.assertEqual(len(alignments), ranges[-1][1])
+            for (_, end), (start, _) in zip(ranges, ranges[1:]):
+                self.assertEqual(end, start)
+                self.assertTrue(start in read_starts + [len(alignments)])
+            filtered = []
+            for start, end in ranges:
+                filtered.extend(filter_better_hits(
+                    origins, _shard_lines(self.alignments_fp, start, end)))
+            self.assertEqual(['r2', 'r3', 'r4'], filtered)
+
+        self.assertRaises(ValueError, shard_range, self.alignments_fp, 2, 2)
+
+
+illumina_reads = """>r1 contig=ref1 haplotype=0 length=10 orig_begin=100 orig_end=110
+ACGTACGTAC
+>r2 contig=ref1 haplotype=0 length=10 orig_begin=200 orig_end=210
+ACGTACGTAC
+>r3 contig=ref2 haplotype=0 length=10 orig_begin=300 orig_end=310
+ACGTACGTAC
+>r4 contig=ref2 haplotype=0 length=10 orig_begin=400 orig_end=410
+ACGTACGTAC
+>r5 contig=ref1 haplotype=0 length=10 orig_begin=500 orig_end=510
+ACGTACGTAC
+"""
+
+reads_sam = """@HD\tVN:1.0
+r1\t0\tref1\t100\t60\t10M\t*\t0\t0\tA\tI
+r2\t0\tref1\t200\t60\t10M\t*\t0\t0\tA\tI
+r3\t0\tref2\t300\t60\t10M\t*\t0\t0\tA\tI
+r4\t0\tref2\t400\t60\t10M\t*\t0\t0\tA\tI
+r5\t0\tref1\t500\t60\t10M\t*\t0\t0\tA\tI
+"""
+
+ion_reads = """>ref1_read_1_100_0
+ACGT
+>ref2_read_4_400_0
+ACGT
+"""
+
+alignments = """r1\tref1\t100\t10\t0\t0\t1\t10\t100\t109\t1e-5\t20.0
+r1\tref2\t90\t10\t1\t0\t1\t10\t900\t909\t1e-4\t18.0
+r2\tref2\t100\t10\t0\t0\t1\t10\t200\t209\t1e-5\t20.0
+r3\tref2\t100\t10\t0\t0\t1\t10\t300\t309\t1e-5\t20.0
+r3\tref1\t100\t10\t0\t0\t1\t10\t50\t59\t1e-5\t20.0
+r3\tref1\t100\t10\t0\t0\t1\t10\t70\t79\t1e-5\t20.0
+r4\tref1\t100\t10\t0\t0\t1\t10\t400\t409\t1e-5\t20.0
+r4\tref1\t100\t10\t0\t0\t1\t10\t400\t409\t1e-5\t20.0
+r5\tref1\t100\t10\t0\t0\t1\t10\t505\t514\t1e-5\t20.0
+r5\tref2\t100\t10\t0\t0\t1\t10\t505\t514\t1e-5\t19.0
+"""
+
+# byte offsets of the first alignment of each read, and the end of the file
+read_starts = [0, 83, 125, 247, 331]
+
+if __name__ == '__main__':
+    main()
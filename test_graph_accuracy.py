@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+"""
+Unit tests for graph_accuracy.py
+================================
+"""
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, Evguenia Kopylova
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+
+from skbio.util import remove_files
+from tempfile import mkstemp
+from os import close
+from os.path import exists
+import numpy as np
+
+from graph_accuracy import (graph_accuracy, load_accuracy_table,
+                            output_filepath, render_figures)
+
+
+class GraphAccuracyTests(TestCase):
+    """ Tests for graph_accuracy.py functionality """
+
+    def setUp(self):
+        """
+        """
+        self.files_to_remove = []
+        self.accuracy_fp = self._write('.txt', accuracy_table)
+
+    def tearDown(self):
+        remove_files(self.files_to_remove, error_on_missing=False)
+
+    def _write(self, suffix, data):
+        f, fp = mkstemp(prefix='graph_accuracy_', suffix=suffix)
+        close(f)
+        with open(fp, 'w') as tmp:
+            tmp.write(data)
+        self.files_to_remove.append(fp)
+        return fp
+
+    def test_load_accuracy_table(self):
+        """ Columns are parsed once into typed arrays, tools are coded in the
+            order of their first row
+        """
+        table = load_accuracy_table(self.accuracy_fp, [0, 5, 10])
+
+        self.assertEqual(5, len(table))
+        self.assertEqual(['bwa', 'bowtie2', 'sortmerna'], table.tools)
+        self.assertEqual([0, 0, 1, 2, 0], list(table.tool_codes))
+        self.assertEqual([0.969, 0.959, 0.975, 0.919, 0.947],
+                         list(table.fmeasure))
+        self.assertEqual([80.12, 85.5, 90.01], list(table.accuracy[0]))
+        self.assertEqual([120, 60, 200, 20, 40], list(table.usertime))
+        self.assertEqual([130, 70, 210, 25, 45], list(table.walltime))
+        # 81.25 / 100 is a tie rounded away from zero
+        self.assertEqual([0.801, 0.781, 0.821, 0.701, 0.813],
+                         list(table.accuracy_at(0)))
+        self.assertRaises(ValueError, table.accuracy_at, 1)
+        self.assertEqual([[0, 1, 4], [2], [3]],
+                         [list(rows) for rows in table.rows_by_tool()])
+
+        # a table without time columns
+        table = load_accuracy_table(self.accuracy_fp, [0, 5, 10, 15, 20])
+        self.assertEqual([120, 60, 200, 20, 40], list(table.accuracy[:, 3]))
+        self.assertTrue(np.isnan(table.usertime).all())
+
+        self.assertRaises(ValueError, load_accuracy_table, self.accuracy_fp,
+                          range(7))
+
+    def test_render_figures(self):
+        """ Every offset and platform is rendered from one load of each
+            table, identical to a figure rendered on its own
+        """
+        table = load_accuracy_table(self.accuracy_fp)
+        output_template = self.accuracy_fp + '_{platform}_{offset}.png'
+        self.files_to_remove.extend(
+            [output_filepath(output_template, offset, platform)
+             for offset in [0, 10]
+             for platform in ['Illumina', 'Roche 454', 'single']])
+
+        written = render_figures([('Illumina', table), ('Roche 454', table)],
+                                 output_template, [0, 10])
+
+        self.assertEqual([self.accuracy_fp + '_Illumina_0.png',
+                          self.accuracy_fp + '_Illumina_10.png',
+                          self.accuracy_fp + '_Roche_454_0.png',
+                          self.accuracy_fp + '_Roche_454_10.png'], written)
+        for offset in [0, 10]:
+            single_fp = output_filepath(output_template, offset, 'single')
+            graph_accuracy(self.accuracy_fp, single_fp, offset=offset)
+            with open(single_fp, 'rb') as single_f:
+                single = single_f.read()
+            for platform in ['Illumina', 'Roche 454']:
+                with open(output_filepath(output_template, offset,
+                                          platform), 'rb') as batch_f:
+                    self.assertEqual(single, batch_f.read())
+
+        # points close together, whose limits depend on the markers
+        clustered_fp = self._write('.txt', clustered_accuracy_table)
+        clustered = load_accuracy_table(clustered_fp)
+        clustered_template = clustered_fp + '_{offset}.png'
+        self.files_to_remove.extend(
+            [output_filepath(clustered_template, offset, 'Illumina')
+             for offset in [0, 5, 10, 'single']])
+        written = render_figures([('Illumina', clustered)],
+                                 clustered_template, [0, 5, 10])
+        single_fp = output_filepath(clustered_template, 'single', 'Illumina')
+        for offset, output_fp in zip([0, 5, 10], written):
+            graph_accuracy(clustered_fp, single_fp, offset=offset)
+            with open(single_fp, 'rb') as single_f:
+                with open(output_fp, 'rb') as batch_f:
+                    self.assertEqual(single_f.read(), batch_f.read())
+
+        # figures would overwrite each other
+        self.assertRaises(ValueError, render_figures, [('Illumina', table)],
+                          self.accuracy_fp + '.png', [0, 10])
+        self.assertRaises(ValueError, render_figures, [('Illumina', table)],
+                          output_template, [1])
+
+
+accuracy_table = """# tool\tparameters\tresults\taccuracy\ttimes
+bwa\tdefault\t95000\t0.95\t94000\t1000\t5000\t0.989\t0.949\t0.969\t80.12\t85.50\t90.01\t120\t130
+bwa\tfast\t94000\t0.94\t92000\t2000\t6000\t0.979\t0.939\t0.959\t78.12\t83.50\t88.01\t60\t70
+bowtie2\tdefault\t96000\t0.96\t95000\t1000\t4000\t0.990\t0.960\t0.975\t82.12\t86.50\t91.01\t200\t210
+sortmerna\tdefault\t90000\t0.90\t85000\t5000\t10000\t0.944\t0.895\t0.919\t70.12\t75.50\t80.01\t20\t25
+bwa\tsens\t93000\t0.93\t90000\t3000\t7000\t0.968\t0.928\t0.947\t81.25\t79.50\t84.01\t40\t45
+"""
+
+clustered_accuracy_table = """bwa\tdefault\t95000\t0.95\t94000\t1000\t5000\t0.989\t0.969\t0.979\t96.12\t96.50\t97.01\t120\t130
+bwa\tfast\t94000\t0.94\t92000\t2000\t6000\t0.979\t0.959\t0.969\t95.12\t95.50\t96.01\t60\t70
+bowtie2\tdefault\t96000\t0.96\t95000\t1000\t4000\t0.990\t0.980\t0.985\t96.42\t97.50\t98.01\t200\t210
+sortmerna\tdefault\t90000\t0.90\t85000\t5000\t10000\t0.974\t0.965\t0.962\t95.52\t96.20\t96.81\t20\t25
+"""
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Unit tests for graph_accuracy_3d.py
+===================================
+"""
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, Evguenia Kopylova
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+
+from skbio.util import remove_files
+from tempfile import mkstemp
+from os import close
+
+from graph_accuracy import load_accuracy_table
+from graph_accuracy_3d import (render_variant, render_variants,
+                               variant_filepath)
+
+
+class GraphAccuracy3dTests(TestCase):
+    """ Tests for graph_accuracy_3d.py functionality """
+
+    def setUp(self):
+        """
+        """
+        f, self.accuracy_fp = mkstemp(prefix='graph_accuracy_3d_',
+                                      suffix='.txt')
+        close(f)
+        with open(self.accuracy_fp, 'w') as tmp:
+            tmp.write(accuracy_table)
+        self.files_to_remove = [self.accuracy_fp]
+
+    def tearDown(self):
+        remove_files(self.files_to_remove, error_on_missing=False)
+
+    def test_render_variants(self):
+        """ Variants rendered by a pool of processes are those rendered one
+            at a time, named by the fields of the output template
+        """
+        table = load_accuracy_table(self.accuracy_fp, [0, 5])
+        output_template = self.accuracy_fp + '_{platform}_{offset}_{time}.png'
+        variants = [('Ion Torrent PGM', offset, time) for offset in [0, 5]
+                    for time in ['Walltime', 'Usertime']]
+        output_fps = [variant_filepath(output_template, *variant)
+                      for variant in variants]
+        self.files_to_remove.extend(output_fps)
+        single_fp = self.accuracy_fp + '.png'
+        self.files_to_remove.append(single_fp)
+
+        self.assertEqual(output_fps, render_variants(
+            [('Ion Torrent PGM', table)], output_template, [0, 5],
+            ['Walltime', 'Usertime'], processes=2))
+        self.assertEqual(self.accuracy_fp + '_Ion_Torrent_PGM_5_Usertime.png',
+                         output_fps[-1])
+        for (platform, offset, time), output_fp in zip(variants, output_fps):
+            render_variant(table, single_fp, offset, time)
+            with open(single_fp, 'rb') as single_f:
+                with open(output_fp, 'rb') as output_f:
+                    self.assertEqual(single_f.read(), output_f.read())
+
+        # variants would overwrite each other
+        self.assertRaises(ValueError, render_variants,
+                          [('Illumina', table)], single_fp, [0],
+                          ['Walltime', 'Usertime'])
+        # the table has no time columns with 3 accuracy offsets
+        self.assertRaises(ValueError, render_variant,
+                          load_accuracy_table(self.accuracy_fp, [0, 5, 10]),
+                          single_fp)
+
+
+accuracy_table = """bwa\tdefault\t95000\t0.95\t94000\t1000\t5000\t0.989\t0.949\t0.969\t80.12\t85.50\t120\t130
+bwa\tfast\t94000\t0.94\t92000\t2000\t6000\t0.979\t0.939\t0.959\t78.12\t83.50\t60\t70
+bowtie2\tdefault\t96000\t0.96\t95000\t1000\t4000\t0.990\t0.960\t0.975\t82.12\t86.50\t200\t210
+sortmerna\tdefault\t90000\t0.90\t85000\t5000\t10000\t0.944\t0.895\t0.919\t70.12\t75.50\t20\t25
+"""
+
+
+if __name__ == '__main__':
+    main()
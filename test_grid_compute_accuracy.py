@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+"""
+Unit tests for grid_compute_accuracy.py
+=======================================
+"""
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, Evguenia Kopylova
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+
+from skbio.util import remove_files
+from tempfile import mkdtemp, mkstemp
+from os import close
+import os
+import shutil
+
+import batch_compute_accuracy
+from batch_compute_accuracy import batch_compute_accuracy as batch
+from grid_compute_accuracy import grid_compute_accuracy, parse_grid
+from test_suppl_compute_accuracy import (expected_alignments_1,
+                                         observed_sam_alignments_1,
+                                         observed_blast_alignments_1)
+
+
+class GridComputeAccuracyTests(TestCase):
+    """ Tests for grid_compute_accuracy.py functionality """
+
+    def setUp(self):
+        """
+        """
+        self.files_to_remove = []
+        self.cache_dir = mkdtemp(prefix='accuracy_cache_')
+        self.exp_alns_1_fp = self._write('exp_alns_1_', '.txt',
+                                         expected_alignments_1)
+        self.obs_sam_alns_1_fp = self._write('obs_alns_1_', '.sam',
+                                             observed_sam_alignments_1)
+        self.obs_blast_alns_1_fp = self._write('obs_alns_1_', '.blast',
+                                               observed_blast_alignments_1)
+        self.tools_fp = self._write(
+            'tools_', '.txt',
+            "tool1\tdefault\t%s\tsam\t12\t15\n"
+            "tool2\t-k 5\t%s\tblast\n" % (self.obs_sam_alns_1_fp,
+                                         self.obs_blast_alns_1_fp))
+        self.grid_fp = self._write(
+            'grid_', '.txt',
+            "# platform\tground truth\ttotal reads\ttools\n"
+            "Illumina\t%s\t4\t%s\n"
+            "Roche 454\t%s\t5\t%s\n" % (self.exp_alns_1_fp, self.tools_fp,
+                                        self.exp_alns_1_fp, self.tools_fp))
+
+    def tearDown(self):
+        remove_files(self.files_to_remove)
+        shutil.rmtree(self.cache_dir)
+
+    def _write(self, prefix, suffix, data):
+        f, fp = mkstemp(prefix=prefix, suffix=suffix)
+        close(f)
+        with open(fp, 'w') as tmp:
+            tmp.write(data)
+        self.files_to_remove.append(fp)
+        return fp
+
+    def test_grid_compute_accuracy(self):
+        """ Cells are evaluated once per content of their inputs, loading
+            each ground truth once, with the rows of batch_compute_accuracy
+        """
+        platforms = parse_grid(self.grid_fp)
+        self.assertEqual(['Illumina', 'Roche 454'],
+                         [platform[0] for platform in platforms])
+
+        loads = []
+        load_ground_truth = batch_compute_accuracy.load_ground_truth
+
+        def count_loads(*args, **kwargs):
+            loads.append(args[0])
+            return load_ground_truth(*args, **kwargs)
+        batch_compute_accuracy.load_ground_truth = count_loads
+        try:
+            tables, counts = grid_compute_accuracy(platforms, self.cache_dir,
+                                                   cache="off")
+        finally:
+            batch_compute_accuracy.load_ground_truth = load_ground_truth
+
+        self.assertEqual([self.exp_alns_1_fp], loads)
+        self.assertEqual({'cached': 0, 'evaluated': 4}, counts)
+        tools = platforms[0][3]
+        self.assertEqual(
+            [('Illumina', list(batch(self.exp_alns_1_fp, tools, 4,
+                                     cache="off"))),
+             ('Roche 454', list(batch(self.exp_alns_1_fp, tools, 5,
+                                      cache="off")))],
+            tables)
+
+        # unchanged cells are read from the cache
+        self.assertEqual((tables, {'cached': 4, 'evaluated': 0}),
+                         grid_compute_accuracy(platforms, self.cache_dir,
+                                               processes=2, cache="off"))
+
+        # new content of an observed file or other offsets are evaluated
+        with open(self.obs_blast_alns_1_fp, 'w') as tmp:
+            tmp.write(observed_blast_alignments_1.split('\n', 1)[1])
+        tables, counts = grid_compute_accuracy(platforms, self.cache_dir,
+                                               cache="off")
+        self.assertEqual({'cached': 2, 'evaluated': 2}, counts)
+        self.assertEqual(list(batch(self.exp_alns_1_fp, tools, 4,
+                                    cache="off")), tables[0][1])
+        self.assertEqual({'cached': 0, 'evaluated': 4},
+                         grid_compute_accuracy(platforms, self.cache_dir,
+                                               offsets=[0], cache="off")[1])
+
+        grid_fp = self._write('grid_', '.txt',
+                              "MinION\t%s\t4\t%s\n" % (self.exp_alns_1_fp,
+                                                       self.tools_fp))
+        self.assertRaises(ValueError, parse_grid, grid_fp)
+
+    def test_relative_paths(self):
+        """ Relative filepaths of a grid and its tools are relative to their
+            file, whatever the current directory
+        """
+        spec_dir = mkdtemp(prefix='grid_spec_')
+        cwd = os.getcwd()
+        try:
+            os.mkdir(os.path.join(spec_dir, 'runs'))
+            for fp, data in [('truth.txt', expected_alignments_1),
+                             ('runs/tool1.sam', observed_sam_alignments_1)]:
+                with open(os.path.join(spec_dir, fp), 'w') as tmp:
+                    tmp.write(data)
+            with open(os.path.join(spec_dir, 'runs', 'tools.txt'),
+                      'w') as tmp:
+                tmp.write("tool1\tdefault\ttool1.sam\tsam\n")
+            grid_fp = os.path.join(spec_dir, 'grid.txt')
+            with open(grid_fp, 'w') as tmp:
+                tmp.write("Illumina\ttruth.txt\t4\truns/tools.txt\n")
+
+            os.chdir(self.cache_dir)
+            platforms = parse_grid(grid_fp)
+            self.assertEqual(
+                [('Illumina', os.path.join(spec_dir, 'truth.txt'), 4,
+                  [('tool1', 'default',
+                    os.path.join(spec_dir, 'runs', 'tool1.sam'), 'sam',
+                    [])])],
+                platforms)
+            tables, counts = grid_compute_accuracy(platforms, self.cache_dir,
+                                                   cache="off")
+            # the same cells are found from another directory
+            os.chdir(spec_dir)
+            self.assertEqual((tables, {'cached': 1, 'evaluated': 0}),
+                             grid_compute_accuracy(parse_grid('grid.txt'),
+                                                   self.cache_dir,
+                                                   cache="off"))
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(spec_dir)
+
+
+if __name__ == '__main__':
+    main()
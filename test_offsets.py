@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+"""
+Unit tests for offsets.py
+=========================
+"""
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, Evguenia Kopylova
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+
+from offsets import parse_offsets
+
+
+class OffsetsTests(TestCase):
+    """ Tests for offsets.py functionality """
+
+    def test_parse_offsets(self):
+        self.assertEqual(parse_offsets("0,5,10"), [0, 5, 10])
+        self.assertEqual(parse_offsets("0-3,10"), [0, 1, 2, 3, 10])
+
+
+if __name__ == '__main__':
+    main()
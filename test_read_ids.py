@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+Unit tests for read_ids.py
+==========================
+"""
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, Evguenia Kopylova
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+
+import numpy as np
+
+from read_ids import ReadIdCodec, ReadSample
+
+
+class ReadIdCodecTests(TestCase):
+    """ Tests for read_ids.py functionality """
+
+    def test_numeric(self):
+        """ Read ids of a prefix and fixed digits are coded from their
+            number, in a table or sorted when the numbers are sparse
+        """
+        read_ids = ['seq.000000828', 'seq.000001026', 'seq.000001004']
+        queries = ['seq.000001004', 'seq.000012323', 'seq.00001004',
+                   'seq.0000010041', 'seq.00000102a', 'read.00000828',
+                   'seq.000000828']
+        sparse_ids = ['seq.%09d' % (i * 100003) for i in range(5000, 5003)]
+
+        for ids in [read_ids, np.array(read_ids, dtype=np.string_),
+                    sparse_ids]:
+            codec = ReadIdCodec(ids)
+            self.assertTrue(codec.numeric)
+            self.assertEqual(3, len(codec))
+            self.assertEqual(list(ids), list(codec))
+            self.assertEqual([0, 1, 2], [codec.code(read_id)
+                                         for read_id in ids])
+            self.assertEqual([0, 1, 2], codec.encode(ids).tolist())
+            self.assertFalse('seq.000000001' in codec)
+        self.assertEqual([2, -1, -1, -1, -1, -1, 0],
+                         ReadIdCodec(read_ids).encode(queries).tolist())
+        self.assertEqual([-1] * 7,
+                         ReadIdCodec(sparse_ids).encode(queries).tolist())
+        self.assertEqual(
+            [-1, 1], ReadIdCodec(sparse_ids).encode(
+                ['seq.000000001', sparse_ids[1]]).tolist())
+        self.assertEqual([], ReadIdCodec(read_ids).encode([]).tolist())
+
+    def test_dictionary(self):
+        """ Other read ids are coded through a dictionary
+        """
+        read_ids = ['seq.1', 'seq.10', 'r2']
+        codec = ReadIdCodec(read_ids)
+        self.assertFalse(codec.numeric)
+        self.assertEqual([1, -1, 2, 0],
+                         codec.encode(['seq.10', 'seq.2', 'r2',
+                                       'seq.1']).tolist())
+        self.assertEqual(-1, codec.code('seq.100'))
+
+        codec = ReadIdCodec.from_index({'b': 1, 'a': 0})
+        self.assertEqual(['a', 'b'], list(codec))
+        self.assertEqual([1, -1], codec.encode(['b', 'c']).tolist())
+        self.assertEqual(0, len(ReadIdCodec([])))
+
+
+class ReadSampleTests(TestCase):
+    """ Tests for the read samples of read_ids.py """
+
+    def test_read_sample(self):
+        """ A fraction of read ids is selected by hash, the same for every
+            file of the reads
+        """
+        read_ids = ['seq.%09d' % i for i in range(10000)]
+        sample = ReadSample(0.2, seed=1)
+        selected = [read_id for read_id in read_ids if read_id in sample]
+        self.assertTrue(1800 < len(selected) < 2200)
+        self.assertEqual(selected, [read_id for read_id in read_ids
+                                    if read_id in ReadSample(0.2, seed=1)])
+        self.assertNotEqual(selected, [read_id for read_id in read_ids
+                                       if read_id in ReadSample(0.2)])
+        self.assertEqual(read_ids, [read_id for read_id in read_ids
+                                    if read_id in ReadSample(1)])
+
+        lines = ['@HD\tVN:1.0\n'] + ['%s\tref1\t%d\n' % (read_id, hit)
+                                     for read_id in read_ids[:50]
+                                     for hit in range(2)]
+        self.assertEqual(['%s\tref1\t%d\n' % (read_id, hit)
+                          for read_id in read_ids[:50] if read_id in sample
+                          for hit in range(2)],
+                         list(sample.lines(lines)))
+        self.assertEqual(100, len(list(ReadSample(1).lines(lines))))
+        # a description after the read id does not change its sample
+        described = [line.replace('\t', ' desc=x\t', 1) for line in lines]
+        self.assertEqual([line.replace('\t', ' desc=x\t', 1)
+                          for line in sample.lines(lines)],
+                         list(sample.lines(described)))
+
+        self.assertRaises(ValueError, ReadSample, 0)
+        self.assertRaises(ValueError, ReadSample, 1.5)
+
+
+if __name__ == '__main__':
+    main()
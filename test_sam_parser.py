@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Unit tests for sam_parser.py
+============================
+"""
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, Evguenia Kopylova
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+
+from sam_parser import cigar_stats, parse_sam
+
+
+class SamParserTests(TestCase):
+    """ Tests for sam_parser.py functionality """
+
+    def test_cigar_stats(self):
+        """ The alignment length counts M and I events, the number of indels
+            counts I and D events
+        """
+        self.assertEqual((150, 0), cigar_stats('150M'))
+        self.assertEqual((145, 0), cigar_stats('5S145M'))
+        self.assertEqual((150, 2), cigar_stats('70M1I10M3D69M'))
+        self.assertEqual((0, 0), cigar_stats('*'))
+
+    def test_parse_sam(self):
+        """ Header lines are skipped, read ids and contigs are the first word
+            of their column and optional fields are found by tag in any
+            column
+        """
+        sam = ["@HD\tVN:1.0\n",
+               "@SQ\tSN:ref1\tLN:5000\n",
+               "s1 extra label\t0\tref1\t1400\t60\t5S90M2I3M\t*\t0\t0\tACGT\t"
+               "IIII\tNM:i:2\tAS:i:180\tXS:f:1.5\n",
+               "s2\t4\t*\t0\t0\t*\t*\t0\t0\tACGT\tIIII\n",
+               "s3\t16\tref1 chromosome\t25\t3\t11M\t*\t0\t0\tACGT\tIIII\t"
+               "AS:i:22\tXT:Z:U\n"]
+
+        records = list(parse_sam(sam))
+        self.assertEqual(['s1', 's2', 's3'], [r.read_id for r in records])
+        self.assertEqual(['ref1', '*', 'ref1'], [r.contig for r in records])
+        s1, s2, s3 = records
+        self.assertEqual((0, 1400, '5S90M2I3M'), (s1.flag, s1.position,
+                                                  s1.cigar))
+        self.assertEqual((95, 1), (s1.align_len, s1.num_indel))
+        self.assertEqual(180, s1.alignment_score)
+        self.assertEqual(1.5, s1.tag('XS'))
+        self.assertEqual(22, s3.alignment_score)
+        self.assertEqual('U', s3.tag('XT'))
+        self.assertEqual(None, s2.alignment_score)
+        self.assertEqual(0, s2.tag('AS', 0))
+        self.assertEqual(None, s1.tag('XT'))
+
+        self.assertEqual(['s1', 's3'],
+                         [r.read_id for r in parse_sam(sam, aligned_only=True)])
+
+
+if __name__ == '__main__':
+    main()
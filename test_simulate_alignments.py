@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Unit tests for simulate_alignments.py
+=====================================
+"""
+
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, Evguenia Kopylova
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from filter_better_hits import collect_origins, filter_better_hits
+from simulate_alignments import write_dataset
+from suppl_compute_accuracy import (collect_ground_truth,
+                                    collect_observed_alignments,
+                                    compute_accuracy, compute_precision)
+
+
+class SimulateAlignmentsTests(TestCase):
+    """ Tests for simulate_alignments.py functionality """
+
+    def setUp(self):
+        """
+        """
+        self.output_dir = mkdtemp(prefix='simulate_alignments_')
+
+    def tearDown(self):
+        rmtree(self.output_dir)
+
+    def test_write_dataset(self):
+        """ The files of a dataset describe the same reads, with the
+            configured fractions of unaligned, misaligned and repeat reads
+        """
+        dataset = write_dataset(self.output_dir, num_reads=2000,
+                                hits_per_read=4, repeat_fraction=0.2,
+                                misaligned_fraction=0.1,
+                                unaligned_fraction=0.1,
+                                better_hit_fraction=0.05)
+        expected_alns = collect_ground_truth(dataset['ground_truth'])
+        self.assertEqual(2000, len(expected_alns))
+        self.assertTrue(all(len(expected_alns.alignments(read_id)) == 4
+                            for read_id in expected_alns))
+
+        observed_sam = collect_observed_alignments(dataset['observed_sam'])
+        observed_blast = collect_observed_alignments(
+            dataset['observed_blast'], file_format='blast')
+        self.assertEqual(sorted(observed_sam), sorted(observed_blast))
+        tp, fp, fn = compute_precision(expected_alns, observed_sam)[:3]
+        self.assertEqual(0, fp)
+        self.assertTrue(150 < fn < 250)
+
+        # reads off their origin only by misalignment, or a few nucleotides
+        accuracy = compute_accuracy(expected_alns, observed_sam, offset=5)
+        self.assertTrue(85 < accuracy < 95)
+        self.assertEqual(accuracy, compute_accuracy(
+            expected_alns, observed_blast, file_format='blast', offset=5))
+        self.assertTrue(compute_accuracy(expected_alns, observed_sam) <
+                        accuracy)
+
+        # reads from repeats and with a better SSEARCH hit
+        origins = collect_origins('454', dataset['origins'])
+        with open(dataset['ssearch']) as ssearch_f:
+            filtered = list(filter_better_hits(origins, ssearch_f))
+        self.assertTrue(400 < len(filtered) < 600)
+
+        # the same seed gives the same files
+        with open(dataset['observed_sam_2']) as sam_f:
+            observed_2 = sam_f.read()
+        write_dataset(self.output_dir, num_reads=2000, hits_per_read=4,
+                      repeat_fraction=0.2, misaligned_fraction=0.1,
+                      unaligned_fraction=0.1, better_hit_fraction=0.05)
+        with open(dataset['observed_sam_2']) as sam_f:
+            self.assertEqual(observed_2, sam_f.read())
+
+
+if __name__ == '__main__':
+    main()
@@ -15,13 +15,31 @@ Unit tests for suppl_compute_accuracy.py
 from unittest import TestCase, main
 
 from skbio.util import remove_files
-from tempfile import mkstemp
-from os import close
+from tempfile import mkdtemp, mkstemp
+from os import close, utime
+from os.path import exists, join
+import json
+import shutil
+
+from click.testing import CliRunner
 
 from suppl_compute_accuracy import (collect_ground_truth,
                                     collect_observed_alignments,
+                                    collect_observed_hits,
                                     compute_accuracy,
-                                    compute_precision)
+                                    compute_accuracy_curve,
+                                    compute_precision,
+                                    stream_accuracy,
+                                    sample_accuracy,
+                                    evaluate_alignments,
+                                    load_ground_truth,
+                                    read_ground_truth_cache,
+                                    GroundTruth,
+                                    GROUND_TRUTH_CACHE_SUFFIX,
+                                    _main)
+import suppl_compute_accuracy
+from read_ids import ReadSample
+from simulate_alignments import write_dataset
 
 
 # Test class and cases
@@ -82,11 +100,121 @@ class SupplComputeAccuracyTests(TestCase):
         given_alns = collect_ground_truth(self.exp_alns_1_fp)
 
         self.assertEqual(len(exp_alns), len(given_alns))
+        self.assertEqual(given_alns.contigs, ['ref1'])
 
         for aln in given_alns:
             self.assertTrue(aln in exp_alns)
-            # list of lists must be sorted by decreasing bit score
-            self.assertEqual(exp_alns[aln], given_alns[aln])
+            # alignments must be sorted by decreasing bit score
+            self.assertEqual(
+                [(x[0], int(x[7]), int(x[8]), float(x[10])) for x in exp_alns[aln]],
+                given_alns.alignments(aln))
+
+    def test_ground_truth_from_dict(self):
+        """ A store built from a dictionary of alignments must equal the
+            store parsed from the same alignments on disk
+        """
+        given_alns = collect_ground_truth(self.exp_alns_1_fp)
+        exp_alns = {}
+        for line in expected_alignments_1.splitlines():
+            line = line.split('\t')
+            exp_alns.setdefault(line[0], []).append(line[1:])
+
+        from_dict = GroundTruth.from_dict(exp_alns)
+
+        self.assertEqual(sorted(given_alns.keys()), sorted(from_dict.keys()))
+        for aln in given_alns:
+            self.assertEqual(given_alns.alignments(aln),
+                             from_dict.alignments(aln))
+
+    def test_ground_truth_weights(self):
+        """ Each expected alignment weighs its bitscore tier normalized by
+            the number of unique bitscores of the read
+        """
+        given_alns = collect_ground_truth(self.exp_alns_1_fp)
+
+        exp_weights = {'seq.000000828': [1.0, 1/2.0],
+                       'seq.000001026': [1.0, 2/3.0, 2/3.0, 2/3.0, 1/3.0],
+                       'seq.000001004': [1.0, 1.0, 1.0, 1.0, 1.0]}
+
+        for aln in exp_weights:
+            lo, hi = given_alns.rows(aln)
+            self.assertEqual(exp_weights[aln],
+                             given_alns.weight[lo:hi].tolist())
+
+    def test_load_ground_truth_cache(self):
+        """ The ground truth is cached next to the BLAST file, read back
+            from the cache and rebuilt when the BLAST file changes
+        """
+        cache_fp = self.exp_alns_1_fp + GROUND_TRUTH_CACHE_SUFFIX
+        self.files_to_remove.append(cache_fp)
+        parsed_alns = collect_ground_truth(self.exp_alns_1_fp)
+
+        self.assertIsNone(read_ground_truth_cache(cache_fp))
+        load_ground_truth(self.exp_alns_1_fp, cache="off")
+        self.assertFalse(exists(cache_fp))
+
+        load_ground_truth(self.exp_alns_1_fp)
+        cached_alns = read_ground_truth_cache(cache_fp, self.exp_alns_1_fp)
+        self.assertIsNotNone(cached_alns)
+        self.assertEqual(sorted(parsed_alns.keys()),
+                         sorted(cached_alns.keys()))
+        for aln in parsed_alns:
+            self.assertEqual(parsed_alns.alignments(aln),
+                             cached_alns.alignments(aln))
+            lo, hi = parsed_alns.rows(aln)
+            cached_lo, cached_hi = cached_alns.rows(aln)
+            self.assertEqual(parsed_alns.weight[lo:hi].tolist(),
+                             cached_alns.weight[cached_lo:cached_hi].tolist())
+        # the read ids of the cache are coded from their number
+        self.assertTrue(cached_alns.read_codec.numeric)
+        self.assertFalse('seq.000000001' in cached_alns)
+        obs_alns = collect_observed_alignments(self.obs_sam_alns_1_fp)
+        self.assertEqual(compute_precision(parsed_alns, obs_alns),
+                         compute_precision(cached_alns, obs_alns))
+
+        # same content with a new modification time keeps the cache, which
+        # records the new time so that the file is digested only once
+        utime(self.exp_alns_1_fp, (0, 0))
+        self.assertIsNotNone(
+            read_ground_truth_cache(cache_fp, self.exp_alns_1_fp))
+        source_key = suppl_compute_accuracy._source_key
+
+        def no_digest(fp, digest=True):
+            self.assertFalse(digest)
+            return source_key(fp, digest)
+        suppl_compute_accuracy._source_key = no_digest
+        try:
+            self.assertIsNotNone(
+                read_ground_truth_cache(cache_fp, self.exp_alns_1_fp))
+        finally:
+            suppl_compute_accuracy._source_key = source_key
+
+        # new content invalidates the cache
+        with open(self.exp_alns_1_fp, 'a') as tmp:
+            tmp.write("seq.000000001\tref2\t99.00\t150\t1\t0\t1\t150\t"
+                      "100\t249\t1e-70\t280.0\n")
+        self.assertIsNone(read_ground_truth_cache(cache_fp, self.exp_alns_1_fp))
+        reloaded_alns = load_ground_truth(self.exp_alns_1_fp)
+        self.assertEqual(4, len(reloaded_alns))
+        self.assertEqual(
+            [('ref2', 100, 249, 280.0)],
+            read_ground_truth_cache(cache_fp, self.exp_alns_1_fp).alignments(
+                'seq.000000001'))
+
+    def test_ground_truth_cache_contigs(self):
+        """ Contig names that are not UTF-8 are cached as they are
+        """
+        f, exp_fp = mkstemp(prefix='exp_alns_latin_', suffix='.txt')
+        close(f)
+        cache_fp = exp_fp + GROUND_TRUTH_CACHE_SUFFIX
+        self.files_to_remove.extend([exp_fp, cache_fp])
+        with open(exp_fp, 'w') as tmp:
+            tmp.write("seq.000000001\tr\xe9f1\t99.00\t150\t1\t0\t1\t150\t"
+                      "100\t249\t1e-70\t280.0\n")
+        load_ground_truth(exp_fp)
+        self.assertEqual([('r\xe9f1', 100, 249, 280.0)],
+                         read_ground_truth_cache(cache_fp, exp_fp).alignments(
+                             'seq.000000001'))
 
     def test_collect_observed_sam_alignments(self):
         """
@@ -125,6 +253,99 @@ class SupplComputeAccuracyTests(TestCase):
             self.assertTrue(aln in exp_blast_alns)
             self.assertEqual(exp_blast_alns[aln], obs_alns[aln])      
 
+    def test_collect_observed_alignments_parallel(self):
+        """ Parsing chunks of the file in parallel must give the same
+            alignments as parsing it serially, and detect reads aligned
+            twice in different chunks
+        """
+        for fp, file_format in [(self.obs_sam_alns_1_fp, "sam"),
+                                (self.obs_blast_alns_1_fp, "blast")]:
+            obs_alns = collect_observed_alignments(fp, file_format)
+            for processes in [2, 3]:
+                self.assertEqual(obs_alns,
+                                 collect_observed_alignments(fp, file_format,
+                                                             processes))
+
+        with open(self.obs_blast_alns_1_fp, 'a') as tmp:
+            tmp.write(observed_blast_alignments_1.splitlines()[0] + "\n")
+        with self.assertRaises(ValueError):
+            collect_observed_alignments(self.obs_blast_alns_1_fp, "blast", 3)
+
+    def test_collect_observed_hits(self):
+        """ The best top_k hits of each read are kept by AS tag, primary
+            alignments first at equal score, supplementary ones skipped,
+            serially or in parallel
+        """
+        f, hits_fp = mkstemp(prefix='obs_hits_', suffix='.sam')
+        close(f)
+        self.files_to_remove.append(hits_fp)
+        with open(hits_fp, 'w') as tmp:
+            tmp.write(observed_sam_hits)
+
+        obs_hits = collect_observed_hits(hits_fp, top_k=2)
+        self.assertEqual([['0', 'ref1', '568163'], ['256', 'ref1', '524183']],
+                         [hit[:3] for hit in obs_hits['seq.000001026']])
+        self.assertEqual(['999', '2428041'],
+                         [hit[2] for hit in obs_hits['seq.000000828']])
+        self.assertEqual(1, len(obs_hits['seq.000001004']))
+        self.assertEqual(['568163'],
+                         [hit[2] for hit in collect_observed_hits(
+                             hits_fp, top_k=1)['seq.000001026']])
+        for processes in [2, 3]:
+            self.assertEqual(obs_hits, collect_observed_hits(
+                hits_fp, top_k=2, processes=processes))
+
+        blast_hits = collect_observed_hits(self.obs_blast_alns_1_fp, "blast",
+                                           top_k=3)
+        self.assertEqual(collect_observed_alignments(self.obs_blast_alns_1_fp,
+                                                     "blast"),
+                         dict((read_id, hits[0]) for read_id, hits in
+                              blast_hits.iteritems()))
+        self.assertRaises(ValueError, collect_observed_hits, hits_fp,
+                          top_k=0)
+
+    def test_compute_accuracy_hits(self):
+        """ Reads with several hits score their best hit, or the best score
+            of any hit, at each offset
+        """
+        f, hits_fp = mkstemp(prefix='obs_hits_', suffix='.sam')
+        close(f)
+        self.files_to_remove.append(hits_fp)
+        with open(hits_fp, 'w') as tmp:
+            tmp.write(observed_sam_hits)
+        exp_alns = collect_ground_truth(self.exp_alns_1_fp)
+
+        obs_hits = collect_observed_hits(hits_fp, top_k=2)
+        self.assertAlmostEqual((2/3. + 0 + 1) / 3 * 100,
+                               compute_accuracy(exp_alns, obs_hits, offset=5,
+                                                hits="best"))
+        self.assertAlmostEqual(100.0, compute_accuracy(exp_alns, obs_hits,
+                                                       offset=5, hits="any"))
+        self.assertAlmostEqual(2 / 3. * 100,
+                               compute_accuracy(exp_alns, obs_hits, offset=0,
+                                                hits="any"))
+        for hits in ["best", "any"]:
+            curve = compute_accuracy_curve(exp_alns, obs_hits, max_offset=6,
+                                           hits=hits)
+            for offset in range(7):
+                self.assertAlmostEqual(compute_accuracy(exp_alns, obs_hits,
+                                                        offset=offset,
+                                                        hits=hits),
+                                       curve[offset])
+
+        # a single hit per read scores as one alignment per read
+        obs_best = collect_observed_hits(hits_fp, top_k=1)
+        self.assertAlmostEqual(
+            compute_accuracy(exp_alns, obs_hits, offset=5, hits="best"),
+            compute_accuracy(exp_alns, obs_best, offset=5, hits="any"))
+        self.assertAlmostEqual(
+            compute_accuracy(exp_alns, obs_best, offset=5, hits="best"),
+            compute_accuracy(exp_alns, dict(
+                (read_id, hits[0]) for read_id, hits in obs_best.iteritems()),
+                offset=5))
+        self.assertRaises(ValueError, compute_accuracy, exp_alns, obs_hits,
+                          hits="all")
+
     def test_compute_accuracy_100_sam(self):
         """ Given a set of expected alignments, each observed alignment
             should achieve an accuracy score of 100.0%, thus a total of
@@ -299,6 +520,386 @@ class SupplComputeAccuracyTests(TestCase):
 
         self.assertEqual(float("%0.1f" % accuracy), 72.2)
 
+    def test_compute_accuracy_collected_sam(self):
+        """ Accuracy and precision computed directly on the ground-truth
+            store parsed from disk (observed alignments in SAM format)
+        """
+        exp_alns = collect_ground_truth(self.exp_alns_1_fp)
+        obs_alns = collect_observed_alignments(self.obs_sam_alns_1_fp)
+
+        accuracy = compute_accuracy(exp_alns, obs_alns)
+        tp, fp, fn, p, r, f = compute_precision(exp_alns, obs_alns)
+
+        self.assertEqual(accuracy, 100.0)
+        self.assertEqual((tp, fp, fn), (3, 0, 0))
+
+    def test_compute_accuracy_curve(self):
+        """ The accuracy curve must match compute_accuracy at every offset,
+            with observed alignments shifted from their expected positions
+        """
+        exp_alns = collect_ground_truth(self.exp_alns_1_fp)
+        obs_alns = {
+            # 4 nt from second best
+            'seq.000000828': ['ref1', '98.61', '72', '1', '0', '1', '72', '2426637', '2426708', '5e-30', '125'],
+            # 2 nt from second best
+            'seq.000001026': ['ref1', '97.33', '150', '1', '1', '1', '150', '568165', '568311', '5e-68', '251'],
+            # reverse-complement, 9 nt from best
+            'seq.000001004': ['ref1', '99.33', '150', '1', '0', '150', '1', '2290818', '2290669', '2e-72', '266'],
+            'seq.000012323': ['ref1', '99.33', '150', '1', '0', '1', '150', '525642', '525791', '2e-72', '266']}
+
+        curve = compute_accuracy_curve(exp_alns, obs_alns,
+                                       file_format="blast", max_offset=12)
+
+        self.assertEqual(len(curve), 13)
+        for offset in range(13):
+            self.assertAlmostEqual(
+                curve[offset],
+                compute_accuracy(exp_alns, obs_alns, file_format="blast",
+                                 offset=offset))
+        self.assertEqual(curve[0], 0.0)
+        # (1/2 + 2/3 + 1)/4
+        self.assertAlmostEqual(curve[12], 54.1666666667)
+
+    def test_compute_accuracy_repeats(self):
+        """ Reads with many expected alignments are searched through the
+            position index, which must score as the linear scan would
+        """
+        # 80 hits on two contigs in 6 bitscore tiers, forward and reverse,
+        # more than _INDEX_MIN_ALIGNMENTS for the first read
+        hits = []
+        for i in range(80):
+            start = 1000 + (i % 20) * 100 + i // 20
+            if i % 2:
+                sstart, send = start + 149, start
+            else:
+                sstart, send = start, start + 149
+            hits.append(['ref%d' % (i % 2 + 1), '99.00', '150', '1', '0',
+                         '1', '150', str(sstart), str(send), '1e-70',
+                         str(300.0 - (i % 6) * 10)])
+        exp_alns = {'seq.000000001': hits,
+                    'seq.000000002': hits[:5]}
+
+        def brute_force(obs_contig, obs_pos, reverse, offset):
+            num_unique = float(len(set(x[10] for x in hits)))
+            scores = [(num_unique - (300.0 - float(x[10])) / 10) / num_unique
+                      for x in hits
+                      if x[0] == obs_contig and
+                      abs(obs_pos - int(x[8 if reverse else 7])) <= offset]
+            return max(scores) if scores else 0.0
+
+        searches = []
+        near = GroundTruth.near
+
+        def count_searches(*args, **kwargs):
+            searches.append(args[1:])
+            return near(*args, **kwargs)
+        GroundTruth.near = count_searches
+        try:
+            for obs_contig, obs_pos, reverse in [('ref1', 1400, False),
+                                                 ('ref2', 1503, True),
+                                                 ('ref2', 1855, False),
+                                                 ('ref1', 1, False),
+                                                 ('ref3', 1300, False)]:
+                obs_end = obs_pos - 149 if reverse else obs_pos + 149
+                obs_alns = {'seq.000000001': [
+                    obs_contig, '99.00', '150', '1', '0', '1', '150',
+                    str(obs_pos), str(obs_end), '1e-70', '300']}
+                curve = compute_accuracy_curve(exp_alns, obs_alns,
+                                               file_format="blast",
+                                               max_offset=5)
+                for offset in range(6):
+                    exp_score = brute_force(obs_contig, obs_pos, reverse,
+                                            offset)
+                    self.assertAlmostEqual(
+                        exp_score * 100.0,
+                        compute_accuracy(exp_alns, obs_alns,
+                                         file_format="blast", offset=offset))
+                    self.assertAlmostEqual(exp_score * 100.0, curve[offset])
+        finally:
+            GroundTruth.near = near
+        # every observed alignment on a known contig is searched in the index
+        self.assertEqual(4 * 7, len(searches))
+
+    def test_position_index(self):
+        """ The binary search of the position index finds the alignments of a
+            read that a scan of its rows finds, by start or end position
+        """
+        hits = []
+        for i in range(80):
+            start = 1000 + (i % 20) * 100 + i // 20
+            if i % 2:
+                sstart, send = start + 149, start
+            else:
+                sstart, send = start, start + 149
+            hits.append(['ref%d' % (i % 3 + 1), '99.00', '150', '1', '0',
+                         '1', '150', str(sstart), str(send), '1e-70',
+                         str(300.0 - (i % 6) * 10)])
+        expected_alns = GroundTruth.from_dict({'seq.000000001': hits[:7],
+                                               'seq.000000002': hits,
+                                               'seq.000000003': hits[40:]})
+
+        for read_id in ['seq.000000001', 'seq.000000002', 'seq.000000003']:
+            lo, hi = expected_alns.rows(read_id)
+            for end in [False, True]:
+                positions = (expected_alns.end if end
+                             else expected_alns.start)[lo:hi].tolist()
+                for contig, position, offset in [
+                        ('ref1', 1000, 0), ('ref2', 1100, 0),
+                        ('ref1', 1300, 0), ('ref1', 1902, 3),
+                        ('ref2', 1249, 2), ('ref3', 1200, 150),
+                        ('ref1', 0, 2000), ('ref2', 1500, 99)]:
+                    contig = expected_alns.contigs.index(contig)
+                    scan = sorted(
+                        (p, w) for c, p, w in
+                        zip(expected_alns.contig[lo:hi].tolist(), positions,
+                            expected_alns.weight[lo:hi].tolist())
+                        if c == contig and abs(p - position) <= offset)
+                    found_positions, weights = expected_alns.near(
+                        lo, hi, contig, position, offset, end=end)
+                    self.assertEqual(scan, sorted(zip(found_positions,
+                                                      weights)))
+                    self.assertEqual(sorted(weights, reverse=True), weights)
+
+    def test_stream_accuracy(self):
+        """ Streaming both sorted files must give the read counts and
+            accuracy of the dictionary-based functions
+        """
+        f, obs_fp = mkstemp(prefix='obs_alns_sorted_', suffix='.blast')
+        close(f)
+        self.files_to_remove.append(obs_fp)
+        with open(obs_fp, 'w') as tmp:
+            tmp.write(observed_blast_alignments_sorted)
+
+        exp_alns = collect_ground_truth(self.exp_alns_1_fp)
+        obs_alns = collect_observed_alignments(obs_fp, file_format="blast")
+
+        for offsets in [[0], [150], [0, 150, 1500]]:
+            num_observed, tp, fp, fn, accuracies = stream_accuracy(
+                self.exp_alns_1_fp, obs_fp, file_format="blast",
+                offsets=offsets)
+
+            self.assertEqual((num_observed, tp, fp, fn),
+                             (len(obs_alns),) +
+                             compute_precision(exp_alns, obs_alns)[:3])
+            self.assertEqual(len(offsets), len(accuracies))
+            for offset, accuracy in zip(offsets, accuracies):
+                self.assertAlmostEqual(
+                    compute_accuracy(exp_alns, obs_alns, file_format="blast",
+                                     offset=offset),
+                    accuracy)
+
+    def test_stream_accuracy_unsorted(self):
+        """ Streaming observed alignments not sorted by read id must fail
+        """
+        with self.assertRaises(ValueError):
+            stream_accuracy(self.exp_alns_1_fp, self.obs_blast_alns_1_fp,
+                            file_format="blast")
+
+    def test_sample_accuracy(self):
+        """ A sample of every read estimates the exact results, a sample of
+            some reads the results of its reads scaled to all reads
+        """
+        exp_alns = collect_ground_truth(self.exp_alns_1_fp)
+        obs_alns = collect_observed_alignments(self.obs_sam_alns_1_fp)
+        results = evaluate_alignments(exp_alns, obs_alns, offsets=[0, 5])
+
+        (num_observed, tp, fp, fn, p, r, f, accuracies,
+         intervals) = sample_accuracy(self.exp_alns_1_fp,
+                                      self.obs_sam_alns_1_fp, offsets=[0, 5],
+                                      fraction=1)
+        self.assertEqual(results[:4], (num_observed, tp, fp, fn))
+        for exact, estimate in zip(results[4:7] + tuple(results[7]),
+                                   [p, r, f] + accuracies):
+            self.assertAlmostEqual(exact, estimate)
+        self.assertEqual(['accuracy_0', 'accuracy_5', 'fmeasure',
+                          'precision', 'recall'], sorted(intervals))
+        for low, high in intervals.values():
+            self.assertAlmostEqual(low, high)
+
+        sample = ReadSample(0.5, seed=3)
+        sampled_alns = dict((read_id, alignment) for read_id, alignment in
+                            obs_alns.iteritems() if read_id in sample)
+        (num_observed, tp, fp, fn, p, r, f, accuracies,
+         intervals) = sample_accuracy(self.exp_alns_1_fp,
+                                      self.obs_sam_alns_1_fp, fraction=0.5,
+                                      seed=3)
+        self.assertEqual(2 * len(sampled_alns), num_observed)
+        self.assertEqual(2 * len([read_id for read_id in exp_alns
+                                  if read_id in sample]), tp + fn)
+        self.assertEqual(1, len(sampled_alns))
+        self.assertAlmostEqual(compute_accuracy(exp_alns, sampled_alns),
+                               accuracies[0])
+        low, high = intervals['accuracy_0']
+        self.assertTrue(0 <= low <= accuracies[0] <= high <= 100)
+
+        self.assertRaises(ValueError, sample_accuracy, self.exp_alns_1_fp,
+                          self.obs_sam_alns_1_fp, fraction=0)
+
+    def test_sample_accuracy_descriptions(self):
+        """ Read names with a description are sampled by their read id, the
+            same in the ground truth and the observed alignments
+        """
+        output_dir = mkdtemp(prefix='sample_accuracy_')
+        try:
+            dataset = write_dataset(output_dir, num_reads=4000,
+                                    hits_per_read=2)
+            obs_fp = join(output_dir, 'described.sam')
+            with open(dataset['observed_sam']) as sam_f:
+                with open(obs_fp, 'w') as described_f:
+                    for line in sam_f:
+                        if not line.startswith('@'):
+                            line = line.replace('\t', ' desc=x\t', 1)
+                        described_f.write(line)
+
+            results = sample_accuracy(dataset['ground_truth'], obs_fp,
+                                      fraction=1)
+            self.assertEqual(0, results[2])
+            estimates = sample_accuracy(dataset['ground_truth'], obs_fp,
+                                        fraction=0.3, seed=1)
+            self.assertEqual(0, estimates[2])
+            for name, exact, estimate in [
+                    ('precision', results[4], estimates[4]),
+                    ('recall', results[5], estimates[5]),
+                    ('accuracy_0', results[7][0], estimates[7][0])]:
+                low, high = estimates[8][name]
+                self.assertTrue(low <= exact <= high, name)
+                self.assertTrue(low <= estimate <= high, name)
+        finally:
+            shutil.rmtree(output_dir)
+
+    def test_stream_accuracy_resume(self):
+        """ A streamed run interrupted after any checkpoint and resumed from
+            it must give exactly the result of an uninterrupted run
+        """
+        f, obs_fp = mkstemp(prefix='obs_alns_sorted_', suffix='.blast')
+        close(f)
+        f, checkpoint_fp = mkstemp(prefix='checkpoint_', suffix='.json')
+        close(f)
+        remove_files([checkpoint_fp])
+        self.files_to_remove.append(obs_fp)
+        with open(obs_fp, 'w') as tmp:
+            tmp.write(observed_blast_alignments_sorted)
+
+        write_checkpoint = suppl_compute_accuracy.write_checkpoint
+        check_records = suppl_compute_accuracy._CHECKPOINT_CHECK_RECORDS
+
+        def interrupt_after(num_checkpoints):
+            def write(*args):
+                write.calls += 1
+                write_checkpoint(*args)
+                if write.calls == num_checkpoints:
+                    raise KeyboardInterrupt
+            write.calls = 0
+            return write
+
+        suppl_compute_accuracy._CHECKPOINT_CHECK_RECORDS = 1
+        try:
+            for offsets in [[0], [150], [0, 150, 1500]]:
+                expected = stream_accuracy(self.exp_alns_1_fp, obs_fp,
+                                           file_format="blast",
+                                           offsets=offsets)
+                for num_checkpoints in range(1, 4):
+                    suppl_compute_accuracy.write_checkpoint = \
+                        interrupt_after(num_checkpoints)
+                    with self.assertRaises(KeyboardInterrupt):
+                        stream_accuracy(self.exp_alns_1_fp, obs_fp,
+                                        file_format="blast", offsets=offsets,
+                                        checkpoint_fp=checkpoint_fp,
+                                        checkpoint_interval=0)
+                    self.assertTrue(exists(checkpoint_fp))
+                    suppl_compute_accuracy.write_checkpoint = \
+                        write_checkpoint
+                    self.assertEqual(expected, stream_accuracy(
+                        self.exp_alns_1_fp, obs_fp, file_format="blast",
+                        offsets=offsets, checkpoint_fp=checkpoint_fp,
+                        resume=True, checkpoint_interval=0))
+                    self.assertFalse(exists(checkpoint_fp))
+
+            # a checkpoint of other inputs cannot be resumed
+            suppl_compute_accuracy.write_checkpoint = interrupt_after(1)
+            with self.assertRaises(KeyboardInterrupt):
+                stream_accuracy(self.exp_alns_1_fp, obs_fp,
+                                file_format="blast",
+                                checkpoint_fp=checkpoint_fp,
+                                checkpoint_interval=0)
+            self.files_to_remove.append(checkpoint_fp)
+            with open(obs_fp, 'a') as tmp:
+                tmp.write(observed_blast_alignments_sorted.replace(
+                    'seq.0000', 'seq.1000'))
+            with self.assertRaises(ValueError):
+                stream_accuracy(self.exp_alns_1_fp, obs_fp,
+                                file_format="blast",
+                                checkpoint_fp=checkpoint_fp, resume=True)
+        finally:
+            suppl_compute_accuracy.write_checkpoint = write_checkpoint
+            suppl_compute_accuracy._CHECKPOINT_CHECK_RECORDS = check_records
+
+    def test_main_stream(self):
+        """ The output row of --stream must be identical to the default
+        """
+        self.files_to_remove.append(self.exp_alns_1_fp +
+                                    GROUND_TRUTH_CACHE_SUFFIX)
+        runner = CliRunner()
+        args = [self.exp_alns_1_fp, self.obs_sam_alns_1_fp, '--tool', 'tool1',
+                '--total_reads', '5', '--offsets', '0,5,10']
+
+        result = runner.invoke(_main, args)
+        result_stream = runner.invoke(_main, args + ['--stream'])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output,
+                         "3\t0.60\t3\t0\t0\t1.000\t1.000\t1.000\t"
+                         "100.00\t100.00\t100.00\t")
+        self.assertEqual(result.output, result_stream.output)
+
+    def test_main_sample(self):
+        """ The output row of --sample of every read must be identical to
+            the default, with confidence intervals on stderr
+        """
+        runner = CliRunner()
+        args = [self.exp_alns_1_fp, self.obs_sam_alns_1_fp, '--tool', 'tool1',
+                '--total_reads', '5', '--offsets', '0,5', '--no_cache']
+
+        result = runner.invoke(_main, args)
+        result_sample = runner.invoke(_main, args + ['--sample', '1'])
+
+        self.assertEqual(result_sample.exit_code, 0)
+        self.assertTrue(result_sample.output.endswith(result.output))
+        self.assertTrue("precision\t1.000\t1.000\t1.000\n" in
+                        result_sample.output)
+        result = runner.invoke(_main, args + ['--sample', '0.5', '--stream'])
+        self.assertTrue(isinstance(result.exception, ValueError))
+
+    def test_main_profile(self):
+        """ --profile writes a report of each stage and leaves the output
+            row unchanged
+        """
+        f, profile_fp = mkstemp(prefix='profile_', suffix='.json')
+        close(f)
+        self.files_to_remove.extend([profile_fp, self.exp_alns_1_fp +
+                                     GROUND_TRUTH_CACHE_SUFFIX])
+        runner = CliRunner()
+        args = [self.exp_alns_1_fp, self.obs_sam_alns_1_fp, '--tool', 'tool1',
+                '--total_reads', '5', '--offsets', '0,5,10']
+
+        result = runner.invoke(_main, args)
+        result_profile = runner.invoke(_main, args + ['--profile', profile_fp,
+                                                      '--profile_top', '5'])
+
+        self.assertEqual(result_profile.exit_code, 0)
+        self.assertEqual(result.output, result_profile.output)
+        with open(profile_fp) as profile_f:
+            report = json.load(profile_f)
+        self.assertEqual(['ground_truth', 'observed', 'accuracy', 'precision'],
+                         [stage['stage'] for stage in report['stages']])
+        ground_truth, observed = report['stages'][:2]
+        self.assertEqual({'reads': 3, 'alignments': 12, 'contigs': 1},
+                         ground_truth['counts'])
+        self.assertEqual(3, observed['records'])
+        self.assertTrue(all(len(stage['top_functions']) == 5
+                            for stage in report['stages']))
+        self.assertEqual('tool1', report['info']['tool'])
+
     def test_compute_precision_100(self):
         """Test functionality of compute_precision() method,
            expected to return 100% precision, recall and F-measure
@@ -402,10 +1003,27 @@ seq.000001004\t0\tref1\t525642\t255\t150M\t*\t0\t0\tAAGATGAGAATTCTAAGGTGAGCGAGCG
 seq.000001026\t0\tref1\t524183\t255\t110M3I37M\t*\t0\t0\tCCCGGAGGAAGAGAAAGAAAATTCGATTCCCTTAGTAGCGGCGAGCGAAATGGGAAGAGCCCAAACCAACAAGCTTGCTTGTTGGGGTTGTAGGACACTCTATACGGAGTCTCTACAAAGGACGACATTAGACGAATCATCTGGAAAGAT\t*\tAS:i:285\tNM:i:3
 """
 
+observed_sam_hits = """@HD\tVN:1.0\tSO:unsorted
+seq.000001026\t256\tref1\t9\t255\t150M\t*\t0\t0\t*\t*\tAS:i:100
+seq.000001026\t2048\tref1\t1\t255\t150M\t*\t0\t0\t*\t*\tAS:i:300
+seq.000001026\t256\tref1\t524183\t255\t150M\t*\t0\t0\t*\t*\tAS:i:280
+seq.000000828\t0\tref1\t999\t255\t150M\t*\t0\t0\t*\t*\tAS:i:149
+seq.000001026\t0\tref1\t568163\t255\t150M\t*\t0\t0\t*\t*\tAS:i:280
+seq.000000828\t256\tref1\t2428041\t255\t150M\t*\t0\t0\t*\t*\tAS:i:140
+seq.000001004\t0\tref1\t525642\t255\t150M\t*\t0\t0\t*\t*\tAS:i:295
+seq.000001004\t4\t*\t0\t0\t*\t*\t0\t0\t*\t*
+"""
+
 observed_blast_alignments_1 = """seq.000000828\tref1\t96.34\t82\t3\t0\t69\t150\t2428038\t2428119\t1e-32\t134
 seq.000001026\tref1\t98.00\t150\t0\t1\t1\t150\t524183\t524329\t4e-69\t255
 seq.000001004\tref1\t99.33\t150\t1\t0\t1\t150\t525642\t525791\t2e-72\t266
 """
 
+observed_blast_alignments_sorted = """seq.000000828\tref1\t98.61\t72\t1\t0\t1\t72\t2426641\t2426712\t5e-30\t125
+seq.000001004\tref1\t99.33\t150\t1\t0\t150\t1\t2172850\t2172701\t2e-72\t266
+seq.000001026\tref1\t97.33\t150\t1\t1\t1\t150\t568163\t568309\t5e-68\t251
+seq.000012323\tref1\t99.33\t150\t1\t0\t1\t150\t525642\t525791\t2e-72\t266
+"""
+
 if __name__ == '__main__':
     main()
\ No newline at end of file